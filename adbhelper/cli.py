@@ -1,33 +1,82 @@
 #!/usr/bin/env python3
 """Main CLI entry point for ADB Helper - Refactored with OoO"""
 
+import importlib
 import click
-from rich.console import Console
-from .core.adb import ADBError
-from .core.device import DeviceManager
-from .commands import register_commands
 
-console = Console()
+# rich is imported by the commands that print, not when the CLI starts
 
-@click.group()
+# Subcommands and the module/function that registers them. Modules are only
+# imported when one of their commands is invoked (or listed by --help).
+LAZY_COMMANDS = {
+    'check': ('adbhelper.commands.register', 'register_core_commands'),
+    'devices': ('adbhelper.commands.register', 'register_core_commands'),
+    'info': ('adbhelper.commands.register', 'register_core_commands'),
+    'shell': ('adbhelper.commands.register', 'register_core_commands'),
+    'enable-adb': ('adbhelper.commands.register', 'register_core_commands'),
+    'disconnect': ('adbhelper.commands.register', 'register_core_commands'),
+    'add-device': ('adbhelper.commands.register', 'register_core_commands'),
+    'capture': ('adbhelper.commands.capture_commands', 'register_capture_commands'),
+    'log': ('adbhelper.commands.log_commands', 'register_log_commands'),
+    'app': ('adbhelper.commands.app_commands', 'register_app_commands'),
+}
+
+
+class LazyGroup(click.Group):
+    """Click group that imports command modules on first use"""
+    
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+        self._loaded = set()
+    
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+    
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            module_name, func_name = self.lazy_commands[cmd_name]
+            if (module_name, func_name) not in self._loaded:
+                self._loaded.add((module_name, func_name))
+                register = getattr(importlib.import_module(module_name), func_name)
+                register(self)
+        return super().get_command(ctx, cmd_name)
+
+
+class LazyContextObject(dict):
+    """Context object that builds the DeviceManager on first access"""
+    
+    def __missing__(self, key):
+        if key != 'device_manager':
+            raise KeyError(key)
+        from rich.console import Console
+        from .core.adb import ADBError
+        from .core.device import DeviceManager
+        try:
+            self[key] = DeviceManager()
+        except ADBError as e:
+            Console().print(f"[red]Error: {e}[/red]")
+            raise click.exceptions.Exit(1)
+        return self[key]
+
+
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS)
 @click.version_option()
 @click.pass_context
 def main(ctx):
     """ADB Helper - Simplify Android device management"""
-    ctx.ensure_object(dict)
-    try:
-        ctx.obj['device_manager'] = DeviceManager()
-    except ADBError as e:
-        console.print(f"[red]Error: {e}[/red]")
-        ctx.exit(1)
+    if ctx.obj is None:
+        ctx.obj = LazyContextObject()
 
 # Add helpv command
 @main.command('helpv')
 def helpv():
     """Show verbose help with full command tree and examples"""
+    from rich.console import Console
     from rich.tree import Tree
     from rich.panel import Panel
     
+    console = Console()
     console.print("\n[bold]ADB Helper - Complete Command Reference[/bold]\n")
     
     # Create command tree
@@ -38,7 +87,7 @@ def helpv():
     basic.add("[cyan]check[/cyan] - Check system dependencies")
     basic.add("[cyan]devices[/cyan] - List connected devices")
     basic.add("[cyan]info[/cyan] - Show detailed device information\n  [dim]Example: adbh info -d device_id[/dim]")
-    basic.add("[cyan]shell[/cyan] - Run shell commands\n  [dim]Example: adbh shell ls /sdcard\n  Example: adbh shell -a whoami  # Run on all devices[/dim]")
+    basic.add("[cyan]shell[/cyan] - Run shell commands\n  [dim]Example: adbh shell ls /sdcard\n  Example: adbh shell -a whoami  # Run on all devices\n  Example: adbh shell -a -j 16 --fail-fast getprop ro.build.id  # Parallel, stop on first failure[/dim]")
     basic.add("[cyan]enable-adb[/cyan] - Interactive guide to enable ADB debugging")
     basic.add("[cyan]disconnect[/cyan] - Disconnect wireless devices\n  [dim]Example: adbh disconnect -d 192.168.1.100:5555[/dim]")
     
@@ -103,8 +152,5 @@ def helpv():
     console.print("  [cyan]--help[/cyan]        Show help for any command")
     console.print("  [cyan]--version[/cyan]     Show version information\n")
 
-# Register all commands with the main group
-register_commands(main)
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
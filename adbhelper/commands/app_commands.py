@@ -6,7 +6,8 @@ from datetime import datetime
 from rich.console import Console
 from rich.table import Table
 from rich.prompt import Prompt, Confirm
-from ..core.adb import ADBError
+from ..core.adb import ADBError, DEFAULT_TIMEOUT
+from ..core.scheduler import PRIORITY_BACKGROUND
 from .utils import DeviceSelector
 
 console = Console()
@@ -84,40 +85,38 @@ def register_app_commands(main_group):
             
             # Get detailed package info for all packages at once
             dump_cmd = "cmd package dump | grep -E 'Package \\[|versionName=|applicationLabel='"
-            dump_stdout, _, _ = device_manager.adb._run_command(
-                ["-s", device_id, "shell", dump_cmd]
-            )
             
-            # Parse the dump output to build a map of package info
+            # Parse the dump output as it streams in to build a map of package info
             package_info = {}
             current_package = None
             
-            for line in dump_stdout.split('\n'):
-                line = line.strip()
-                
-                # Check for package declaration
-                package_match = re.search(r'Package \[(.*?)\]', line)
-                if package_match:
-                    current_package = package_match.group(1)
-                    if current_package not in package_info:
-                        package_info[current_package] = {
-                            'name': '',
-                            'version': 'Unknown'
-                        }
-                
-                # Extract app label
-                elif current_package and 'applicationLabel=' in line:
-                    label_match = re.search(r'applicationLabel=(.*)', line)
-                    if label_match:
-                        label = label_match.group(1).strip()
-                        if label and label != "null":
-                            package_info[current_package]['name'] = label
-                
-                # Extract version
-                elif current_package and 'versionName=' in line:
-                    version_match = re.search(r'versionName=([\S]+)', line)
-                    if version_match:
-                        package_info[current_package]['version'] = version_match.group(1)
+            with device_manager.adb.stream(["-s", device_id, "shell", dump_cmd], timeout=DEFAULT_TIMEOUT) as dump:
+                for line in dump.lines():
+                    line = line.strip()
+                    
+                    # Check for package declaration
+                    package_match = re.search(r'Package \[(.*?)\]', line)
+                    if package_match:
+                        current_package = package_match.group(1)
+                        if current_package not in package_info:
+                            package_info[current_package] = {
+                                'name': '',
+                                'version': 'Unknown'
+                            }
+                    
+                    # Extract app label
+                    elif current_package and 'applicationLabel=' in line:
+                        label_match = re.search(r'applicationLabel=(.*)', line)
+                        if label_match:
+                            label = label_match.group(1).strip()
+                            if label and label != "null":
+                                package_info[current_package]['name'] = label
+                    
+                    # Extract version
+                    elif current_package and 'versionName=' in line:
+                        version_match = re.search(r'versionName=([\S]+)', line)
+                        if version_match:
+                            package_info[current_package]['version'] = version_match.group(1)
             
             # Display the results and build data for export
             app_data = []
@@ -565,31 +564,37 @@ def register_app_commands(main_group):
             if not device_id:
                 return
             
-            def get_current_app():
+            def get_current_app(timeout=DEFAULT_TIMEOUT):
                 """Get current foreground app using multiple methods for compatibility"""
                 
                 # Method 1: Try using dumpsys window (works on most Android versions)
-                stdout, _, code = device_manager.adb._run_command(
-                    ["-s", device_id, "shell", "dumpsys", "window", "windows", "|", "grep", "-E", "'mCurrentFocus|mFocusedApp'"]
-                )
-                
-                if code == 0 and stdout:
+                # Streamed so only the first match is kept, not the whole output
+                found = None
+                with device_manager.adb.stream(
+                    ["-s", device_id, "shell", "dumpsys", "window", "windows", "|", "grep", "-E", "'mCurrentFocus|mFocusedApp'"],
+                    timeout=timeout
+                ) as dump:
                     # Parse mCurrentFocus or mFocusedApp
-                    for line in stdout.split('\n'):
-                        if 'mCurrentFocus=' in line or 'mFocusedApp=' in line:
-                            # Extract package/activity from lines like:
-                            # mCurrentFocus=Window{... com.example.app/com.example.app.MainActivity}
-                            match = re.search(r'(\w+\.[\w\.]+)/(\w+\.[\w\.]+)', line)
-                            if match:
-                                return match.group(1), match.group(2)
-                            # Sometimes it's just the package
-                            match = re.search(r'(\w+\.[\w\.]+)}', line)
-                            if match:
-                                return match.group(1), None
+                    for line in dump.lines():
+                        if found or not ('mCurrentFocus=' in line or 'mFocusedApp=' in line):
+                            continue
+                        # Extract package/activity from lines like:
+                        # mCurrentFocus=Window{... com.example.app/com.example.app.MainActivity}
+                        match = re.search(r'(\w+\.[\w\.]+)/(\w+\.[\w\.]+)', line)
+                        if match:
+                            found = match.group(1), match.group(2)
+                            continue
+                        # Sometimes it's just the package
+                        match = re.search(r'(\w+\.[\w\.]+)}', line)
+                        if match:
+                            found = match.group(1), None
+                
+                if found and dump.returncode == 0:
+                    return found
                 
                 # Method 2: Try using dumpsys activity (for older Android versions)
                 stdout, _, code = device_manager.adb._run_command(
-                    ["-s", device_id, "shell", "dumpsys", "activity", "recents", "|", "grep", "'Recent #0'", "-A", "1"]
+                    ["-s", device_id, "shell", "dumpsys", "activity", "recents", "|", "grep", "'Recent #0'", "-A", "1"], timeout=timeout
                 )
                 
                 if code == 0 and stdout:
@@ -599,7 +604,7 @@ def register_app_commands(main_group):
                 
                 # Method 3: Try using dumpsys window displays (newer Android)
                 stdout, _, code = device_manager.adb._run_command(
-                    ["-s", device_id, "shell", "dumpsys", "window", "displays", "|", "grep", "'mCurrentFocus'"]
+                    ["-s", device_id, "shell", "dumpsys", "window", "displays", "|", "grep", "'mCurrentFocus'"], timeout=timeout
                 )
                 
                 if code == 0 and stdout:
@@ -609,7 +614,7 @@ def register_app_commands(main_group):
                 
                 # Method 4: Try using dumpsys activity activities (most reliable fallback)
                 stdout, _, code = device_manager.adb._run_command(
-                    ["-s", device_id, "shell", "dumpsys", "activity", "activities", "|", "grep", "mResumedActivity"]
+                    ["-s", device_id, "shell", "dumpsys", "activity", "activities", "|", "grep", "mResumedActivity"], timeout=timeout
                 )
                 
                 if code == 0 and stdout:
@@ -619,14 +624,14 @@ def register_app_commands(main_group):
                 
                 return None, None
             
-            def get_app_name(package):
+            def get_app_name(package, timeout=DEFAULT_TIMEOUT):
                 """Get the friendly app name for a package"""
                 if not package:
                     return "Unknown"
                 
                 # Try to get app label
                 stdout, _, _ = device_manager.adb._run_command(
-                    ["-s", device_id, "shell", "dumpsys", "package", package, "|", "grep", "applicationLabel="]
+                    ["-s", device_id, "shell", "dumpsys", "package", package, "|", "grep", "applicationLabel="], timeout=timeout
                 )
                 
                 if stdout:
@@ -645,13 +650,31 @@ def register_app_commands(main_group):
                 last_package = None
                 import time
                 
+                # Polls queue behind interactive commands on the device; a device that
+                # keeps failing is skipped by its circuit breaker until it recovers
+                scheduler = device_manager.scheduler
+                last_error = None
                 try:
                     while True:
-                        package, activity = get_current_app()
+                        try:
+                            package, activity = scheduler.submit_call(
+                                device_id, get_current_app, PRIORITY_BACKGROUND
+                            ).result()
+                            app_name = None
+                            if package and package != last_package:
+                                app_name = scheduler.submit_call(
+                                    device_id, lambda timeout: get_app_name(package, timeout), PRIORITY_BACKGROUND
+                                ).result()
+                        except ADBError as e:
+                            if str(e) != last_error:
+                                console.print(f"[red]Error: {e}[/red]")
+                                last_error = str(e)
+                            time.sleep(interval)
+                            continue
+                        last_error = None
                         
                         if package != last_package:
                             if package:
-                                app_name = get_app_name(package)
                                 timestamp = datetime.now().strftime("%H:%M:%S")
                                 
                                 console.print(f"[dim]{timestamp}[/dim] [bold green]{app_name}[/bold green]")
@@ -748,11 +771,6 @@ def register_app_commands(main_group):
             
             console.print(f"\n[bold]App Information for {package}[/bold]\n")
             
-            # Get package info
-            stdout, _, _ = device_manager.adb._run_command(
-                ["-s", device_id, "shell", "dumpsys", "package", package]
-            )
-            
             # Parse relevant information
             info = {
                 "Version": "Unknown",
@@ -766,49 +784,51 @@ def register_app_commands(main_group):
             
             # Extract information
             in_permissions = False
-            for line in stdout.split('\n'):
-                line = line.strip()
-                
-                if 'versionName=' in line:
-                    match = re.search(r'versionName=([\S]+)', line)
-                    if match:
-                        info["Version"] = match.group(1)
-                
-                if 'versionCode=' in line:
-                    match = re.search(r'versionCode=(\d+)', line)
-                    if match:
-                        info["Version Code"] = match.group(1)
-                
-                if 'firstInstallTime=' in line:
-                    match = re.search(r'firstInstallTime=(.*)', line)
-                    if match:
-                        info["Install Time"] = match.group(1)
-                
-                if 'lastUpdateTime=' in line:
-                    match = re.search(r'lastUpdateTime=(.*)', line)
-                    if match:
-                        info["Update Time"] = match.group(1)
-                
-                if 'dataDir=' in line:
-                    match = re.search(r'dataDir=(.*)', line)
-                    if match:
-                        info["Data Dir"] = match.group(1)
-                
-                if 'codePath=' in line:
-                    match = re.search(r'codePath=(.*)', line)
-                    if match:
-                        info["APK Path"] = match.group(1)
-                
-                # Parse permissions
-                if 'grantedPermissions:' in line or 'requested permissions:' in line:
-                    in_permissions = True
-                elif in_permissions and line and not line.startswith(' '):
-                    in_permissions = False
-                elif in_permissions and line:
-                    perm = line.strip()
-                    if perm.startswith('android.permission.'):
-                        perm = perm.replace('android.permission.', '')
-                    info["Permissions"].append(perm)
+            with device_manager.adb.stream(["-s", device_id, "shell", "dumpsys", "package", package],
+                                           timeout=DEFAULT_TIMEOUT) as dump:
+                for line in dump.lines():
+                    line = line.strip()
+                    
+                    if 'versionName=' in line:
+                        match = re.search(r'versionName=([\S]+)', line)
+                        if match:
+                            info["Version"] = match.group(1)
+                    
+                    if 'versionCode=' in line:
+                        match = re.search(r'versionCode=(\d+)', line)
+                        if match:
+                            info["Version Code"] = match.group(1)
+                    
+                    if 'firstInstallTime=' in line:
+                        match = re.search(r'firstInstallTime=(.*)', line)
+                        if match:
+                            info["Install Time"] = match.group(1)
+                    
+                    if 'lastUpdateTime=' in line:
+                        match = re.search(r'lastUpdateTime=(.*)', line)
+                        if match:
+                            info["Update Time"] = match.group(1)
+                    
+                    if 'dataDir=' in line:
+                        match = re.search(r'dataDir=(.*)', line)
+                        if match:
+                            info["Data Dir"] = match.group(1)
+                    
+                    if 'codePath=' in line:
+                        match = re.search(r'codePath=(.*)', line)
+                        if match:
+                            info["APK Path"] = match.group(1)
+                    
+                    # Parse permissions
+                    if 'grantedPermissions:' in line or 'requested permissions:' in line:
+                        in_permissions = True
+                    elif in_permissions and line and not line.startswith(' '):
+                        in_permissions = False
+                    elif in_permissions and line:
+                        perm = line.strip()
+                        if perm.startswith('android.permission.'):
+                            perm = perm.replace('android.permission.', '')
+                        info["Permissions"].append(perm)
             
             # Get app size
             size_stdout, _, _ = device_manager.adb._run_command(
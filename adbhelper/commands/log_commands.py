@@ -1,35 +1,45 @@
 """Log command registration"""
+import functools
+import json
 import os
 import subprocess
 import platform
 import sys
-import re
 import threading
-import queue
+import time
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple, Union
 import click
 from rich.console import Console
-from rich.text import Text
-from .utils import DeviceSelector
+from rich.live import Live
+from rich.markup import escape
+from rich.table import Table
+from .utils import DeviceSelector, DEVICE_COLORS
+from ..core.adb import ADBError, ADBTimeoutError
+from ..core.scheduler import PRIORITY_INTERACTIVE
+from ..core.logcat import iter_records, logcat_command, LogcatParser, LogRecord
+from ..core.log_filter import LogFilter, package_resolver
+from ..core.log_merge import LogMerger, REORDER_WINDOW, OVERFLOW_POLICIES
+from ..core.log_archive import LogArchive, LogArchiveWriter, ARCHIVE_SUFFIX, find_archives, parse_time
+from ..core.log_cursor import LogCursor, LogCursorStore, cursor_key
+from ..core.log_stats import LogStats, uid_packages
+from ..core.log_follow import LogcatFollower, StreamNotice
+from ..core.log_workers import LogWorkerPool
+from ..core.log_select import logcat_reader
+from ..core.log_trigger import TriggerCapture, compile_triggers, PRE_SECONDS, PRE_BYTES, POST_SECONDS
+from ..utils.log_renderer import LogRenderer
+from ..utils.log_writer import LogWriter, parse_size, parse_duration
 
 console = Console()
 
-# Color palette for different devices
-DEVICE_COLORS = [
-    "bright_blue",
-    "bright_green", 
-    "bright_yellow",
-    "bright_magenta",
-    "bright_cyan",
-    "bright_red",
-    "blue",
-    "green",
-    "yellow",
-    "magenta",
-    "cyan",
-    "red"
-]
+# Devices dumped at the same time by 'log dump'
+MAX_DUMP_WORKERS = 8
+
+# Seconds a device's dump may take, counted from when it is queued
+DUMP_DEADLINE = 300
+
+# Seconds between redraws of 'log stats'
+STATS_INTERVAL = 1.0
 
 
 def register_log_commands(main_group):
@@ -43,16 +53,35 @@ def register_log_commands(main_group):
             console.print("\n[bold]Log Options:[/bold]\n")
             console.print("  [cyan]adbh log view[/cyan]    - View live device logs (supports multiple devices with color coding)")
             console.print("  [cyan]adbh log dump[/cyan]    - Dump current logs and exit")
-            console.print("  [cyan]adbh log clear[/cyan]   - Clear device logs\n")
+            console.print("  [cyan]adbh log clear[/cyan]   - Clear device logs")
+            console.print("  [cyan]adbh log stats[/cyan]   - Live counts of who is logging the most")
+            console.print("  [cyan]adbh log query[/cyan]   - Search saved log archives\n")
             console.print("Use [cyan]adbh log --help[/cyan] for more information")
     
     @log.command('view')
-    @click.option('-f', '--filter', multiple=True, help='Filter log output (can be used multiple times)')
+    @click.option('-f', '--filter', multiple=True, help='Filter log output: text, re:REGEX, msg:REGEX, tag:, level:, pid:, uid:, package:, buffer:, !TERM to exclude (can be used multiple times)')
     @click.option('-s', '--save', is_flag=True, help='Save log output to file')
     @click.option('--device', help='Target device ID (skip all selection prompts)')
     @click.option('--separate', is_flag=True, help='Open separate windows for each device (old behavior)')
+    @click.option('--rotate-size', callback=_size_option, help='With --save, start a new file at this size (e.g. 100M)')
+    @click.option('--rotate-time', callback=_duration_option, help='With --save, start a new file after this long (e.g. 1h)')
+    @click.option('--compress', type=click.Choice(['gzip', 'zstd']), help='With --save, compress finished files')
+    @click.option('--reorder-window', type=float, default=REORDER_WINDOW, show_default=True,
+                  help='Seconds to hold lines so multiple devices are shown in timestamp order (0 = arrival order)')
+    @click.option('--archive', is_flag=True, help="With --save, write an indexed archive for 'adbh log query' instead of a text file")
+    @click.option('--overflow', type=click.Choice(OVERFLOW_POLICIES), default='drop-oldest', show_default=True,
+                  help='With multiple devices, what to do when a device logs faster than the output keeps up: '
+                       'block its reader (all readers with --workers), drop its oldest held lines or keep a sample')
+    @click.option('--trigger', multiple=True,
+                  help='Keep recent log in memory and save a snapshot when a line matches: crash, anr, tombstone or a regex (can be used multiple times)')
+    @click.option('--pre', callback=_duration_option, help=f'With --trigger, log time kept before the trigger (default {PRE_SECONDS:.0f}s)')
+    @click.option('--pre-size', callback=_size_option, help=f'With --trigger, most memory used for that history per device (default {PRE_BYTES // (1024 * 1024)}M)')
+    @click.option('--post', callback=_duration_option, help=f'With --trigger, seconds saved after the trigger (default {POST_SECONDS:.0f}s)')
+    @click.option('--workers', type=click.IntRange(min=0), default=0, show_default=True,
+                  help='With multiple devices, decode and filter logs in this many worker processes (0 = in this process)')
     @click.pass_context
-    def log_view(ctx, filter, save, device, separate):
+    def log_view(ctx, filter, save, device, separate, rotate_size, rotate_time, compress, reorder_window, archive, overflow,
+                 trigger, pre, pre_size, post, workers):
         """View live device logs (single or multiple devices with color coding)"""
         device_manager = ctx.obj['device_manager']
         
@@ -65,48 +94,72 @@ def register_log_commands(main_group):
             if len(target_devices) == 1:
                 device_id = target_devices[0]
                 
-                # Build logcat command
-                logcat_args = ["-s", device_id, "logcat"]
+                # These only shape how several devices' streams are merged
+                ignored = [f"--{name.replace('_', '-')}" for name in ('workers', 'overflow', 'reorder_window')
+                           if ctx.get_parameter_source(name) != click.core.ParameterSource.DEFAULT]
+                if ignored:
+                    console.print(f"[yellow]Warning: {', '.join(ignored)} only apply with multiple devices, ignoring[/yellow]")
                 
                 # Setup file saving if requested
                 log_file = None
-                if save:
-                    log_file = _setup_log_file(device_id)
+                log_archive = None
+                if save and archive:
+                    log_archive = _setup_log_archive(device_id)
+                elif save:
+                    log_file = _setup_log_file(device_id, rotate_size=rotate_size,
+                                               rotate_time=rotate_time, compress=compress)
+                
+                captures = _setup_trigger_captures([device_id], trigger, pre, pre_size, post)
+                capture = captures.get(device_id)
                 
                 # Live mode
                 console.print(f"[yellow]Starting live log view...[/yellow]")
                 console.print("[dim]Press Ctrl+C to stop[/dim]\n")
                 
+                logcat_args, log_filter = _compile_filter(device_manager, device_id, filter)
+                # Reconnects and resumes if the device drops, e.g. over Wi-Fi
+                follower = LogcatFollower(device_manager.adb, device_id, logcat_args,
+                                          _device_sdk(device_manager, device_id))
+                records = follower.records()
+                renderer = LogRenderer(console)
+                renderer.start()
                 try:
-                    # Start logcat process
-                    process = subprocess.Popen(
-                        [device_manager.adb.adb_path] + logcat_args,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        universal_newlines=True,
-                        errors='replace',  # Replace invalid UTF-8 characters
-                        bufsize=1
-                    )
-                    
-                    # Process output line by line
-                    for line in process.stdout:
+                    # Binary logcat is decoded locally and formatted like threadtime
+                    for record in records:
+                        if isinstance(record, StreamNotice):
+                            renderer.notice(str(record))
+                            if log_file:
+                                log_file.write(f"{record}\n")
+                            continue
+                        
                         # Apply filter if any
-                        if filter:
-                            if not _should_include_line(line, filter):
-                                continue
+                        line = log_filter.apply(record)
+                        if line is None:
+                            continue
                         
-                        # Output to console and file
-                        console.print(line.rstrip())
+                        if capture:
+                            snapshot = capture.add(record.timestamp, line)
+                            if snapshot:
+                                renderer.notice(f"Trigger matched, saving snapshot to: {snapshot}", "bold green")
+                        
+                        # Output to console (batched into frames) and file
+                        renderer.write(line)
                         if log_file:
-                            log_file.write(line)
-                            log_file.flush()  # Ensure it's written immediately
+                            log_file.write(line + "\n")
+                        if log_archive:
+                            log_archive.add(device_id, record)
                     
                 except KeyboardInterrupt:
+                    renderer.stop()
                     console.print("\n[yellow]Log viewing stopped[/yellow]")
-                    process.terminate()
                 finally:
+                    renderer.stop()
+                    records.close()
+                    _close_trigger_captures(captures)
                     if log_file:
                         log_file.close()
+                    if log_archive:
+                        log_archive.close()
                         
                 return
             
@@ -121,8 +174,24 @@ def register_log_commands(main_group):
                     
                     if save:
                         cmd_args.append("--save")
+                    if archive:
+                        cmd_args.append("--archive")
+                    if rotate_size:
+                        cmd_args.extend(["--rotate-size", str(rotate_size)])
+                    if rotate_time:
+                        cmd_args.extend(["--rotate-time", f"{rotate_time}s"])
+                    if compress:
+                        cmd_args.extend(["--compress", compress])
                     for f in filter:
                         cmd_args.extend(["--filter", f])
+                    for t in trigger:
+                        cmd_args.extend(["--trigger", t])
+                    if pre:
+                        cmd_args.extend(["--pre", f"{pre}s"])
+                    if pre_size:
+                        cmd_args.extend(["--pre-size", str(pre_size)])
+                    if post:
+                        cmd_args.extend(["--post", f"{post}s"])
                     
                     if platform.system() == "Darwin":  # macOS
                         terminal_cmd = [
@@ -140,17 +209,27 @@ def register_log_commands(main_group):
                     subprocess.Popen(terminal_cmd)
             else:
                 # New behavior - unified color-coded view
-                _view_multi_device_logs(device_manager, target_devices, filter, save)
+                log_file = None
+                if save and archive:
+                    log_file = _setup_log_archive("multi")
+                elif save:
+                    log_file = _setup_log_file("multi", rotate_size=rotate_size,
+                                               rotate_time=rotate_time, compress=compress)
+                captures = _setup_trigger_captures(target_devices, trigger, pre, pre_size, post)
+                _view_multi_device_logs(device_manager, target_devices, filter, log_file, reorder_window, overflow,
+                                        captures, workers)
             
         except Exception as e:
             console.print(f"[red]Error: {e}[/red]")
     
     @log.command('dump')
-    @click.option('-f', '--filter', multiple=True, help='Filter log output (can be used multiple times)')
+    @click.option('-f', '--filter', multiple=True, help='Filter log output: text, re:REGEX, msg:REGEX, tag:, level:, pid:, uid:, package:, buffer:, !TERM to exclude (can be used multiple times)')
     @click.option('-s', '--save', is_flag=True, help='Save log output to file')
     @click.option('--device', help='Target device ID (skip all selection prompts)')
+    @click.option('--archive', is_flag=True, help="With --save, write an indexed archive for 'adbh log query' instead of a text file")
+    @click.option('--since-last', is_flag=True, help='Only entries logged since the last --since-last dump of each device (and filter)')
     @click.pass_context
-    def log_dump(ctx, filter, save, device):
+    def log_dump(ctx, filter, save, device, archive, since_last):
         """Dump current device logs and exit"""
         device_manager = ctx.obj['device_manager']
         
@@ -159,45 +238,64 @@ def register_log_commands(main_group):
             if not target_devices:
                 return
             
-            # Process each device
+            # Set up files first so their paths are printed before any output
+            log_files = {}
             for device_id in target_devices:
-                if len(target_devices) > 1:
-                    console.print(f"\n[bold]Device: {device_id}[/bold]")
-                
-                # Setup file saving if requested
-                log_file = None
-                if save:
-                    log_file = _setup_log_file(device_id, dump=True)
-                
-                # Dump mode - get all at once
-                console.print("[yellow]Dumping current log...[/yellow]")
-                process = subprocess.run(
-                    [device_manager.adb.adb_path, "-s", device_id, "logcat", "-d"],
-                    capture_output=True,
-                    universal_newlines=True,
-                    errors='replace'  # Replace invalid UTF-8 characters
-                )
-                
-                output = process.stdout
-                
-                # Apply filters if any
-                if filter and output:
-                    lines = output.split('\n')
-                    filtered_lines = [line for line in lines if _should_include_line(line, filter)]
-                    output = '\n'.join(filtered_lines)
-                
-                # Output to console and/or file
-                if output:
-                    if not save:  # Only print to console if not saving
-                        console.print(output)
-                    if log_file:
-                        log_file.write(output)
-                        log_file.close()
-                        console.print(f"[green]✓ Log dump complete[/green]")
-                else:
-                    console.print("[yellow]No log entries found[/yellow]")
-                    if log_file:
-                        log_file.close()
+                if save and archive:
+                    log_files[device_id] = _setup_log_archive(device_id, dump=True)
+                elif save:
+                    log_files[device_id] = _setup_log_file(device_id, dump=True)
+            
+            # Incremental dumps resume from where each device's last one ended
+            cursor_store = None
+            cursors = {}
+            if since_last:
+                cursor_store = LogCursorStore()
+                for device_id in target_devices:
+                    cursors[device_id] = cursor_store.get(cursor_key(device_id, filter))
+            
+            console.print("[yellow]Dumping new log entries...[/yellow]" if since_last
+                          else "[yellow]Dumping current log...[/yellow]")
+            
+            # Dump all devices at once, streaming each record straight to its destination
+            multi = len(target_devices) > 1
+            renderer = LogRenderer(console, drop=False)
+            renderer.start()
+            counts = {}
+            try:
+                # Each dump is a job on its device's scheduler queue (deadline, circuit breaker)
+                calls = {
+                    device_id: functools.partial(
+                        _dump_device_log, device_manager, device_id, filter,
+                        log_files.get(device_id), renderer,
+                        f"[{device_id}] " if multi else "", DEVICE_COLORS[i % len(DEVICE_COLORS)],
+                        cursors.get(device_id)
+                    )
+                    for i, device_id in enumerate(target_devices)
+                }
+                for device_id, future in device_manager.scheduler.map_calls(
+                        calls, MAX_DUMP_WORKERS, PRIORITY_INTERACTIVE, DUMP_DEADLINE):
+                    try:
+                        counts[device_id] = future.result()
+                    except Exception as e:
+                        counts[device_id] = e
+                        continue
+                    # Only a complete dump moves the cursor
+                    if cursor_store is not None:
+                        cursor_store.put(cursor_key(device_id, filter), cursors[device_id])
+            finally:
+                renderer.stop()
+                for log_file in log_files.values():
+                    log_file.close()
+            
+            for device_id, count in counts.items():
+                name = f"{device_id}: " if multi else ""
+                if isinstance(count, Exception):
+                    console.print(f"[red]{name}Error: {count}[/red]")
+                elif count == 0:
+                    console.print(f"[yellow]{name}No {'new ' if since_last else ''}log entries found[/yellow]")
+                elif save:
+                    console.print(f"[green]✓ {name}Log dump complete ({count} entries)[/green]")
                         
         except Exception as e:
             console.print(f"[red]Error: {e}[/red]")
@@ -214,18 +312,224 @@ def register_log_commands(main_group):
             if not target_devices:
                 return
             
-            # Clear logs for each device
+            # Clear logs on all devices at once; a hung device only fails itself
+            console.print(f"[yellow]Clearing log for {', '.join(target_devices)}...[/yellow]")
+            futures = {
+                device_id: device_manager.scheduler.submit(
+                    device_id, ["logcat", "-c"], priority=PRIORITY_INTERACTIVE, deadline=10
+                )
+                for device_id in target_devices
+            }
+            for device_id, future in futures.items():
+                try:
+                    stdout, stderr, code = future.result()
+                except ADBError as e:
+                    console.print(f"[red]✗ Failed to clear log for {device_id}: {e}[/red]")
+                    continue
+                if code == 0:
+                    console.print(f"[green]✓ Log cleared for {device_id}[/green]")
+                else:
+                    console.print(f"[red]✗ Failed to clear log for {device_id}: {(stderr or stdout).strip()}[/red]")
+                
+        except Exception as e:
+            console.print(f"[red]Error: {e}[/red]")
+    
+    @log.command('stats')
+    @click.option('-f', '--filter', multiple=True, help='Only count matching entries (same terms as log view)')
+    @click.option('--device', help='Target device ID (skip all selection prompts)')
+    @click.option('--top', type=int, default=5, show_default=True, help='Entries shown per column')
+    @click.option('--include-buffer', is_flag=True, help='Also count entries already in the log buffer')
+    @click.option('--export', type=click.Path(dir_okay=False), help='Write a JSON summary to this file on exit')
+    @click.pass_context
+    def log_stats(ctx, filter, device, top, include_buffer, export):
+        """Show live log volume by tag, pid, package and level instead of the lines"""
+        device_manager = ctx.obj['device_manager']
+        
+        try:
+            target_devices = DeviceSelector.select_multiple_devices(device_manager, device)
+            if not target_devices:
+                return
+            
+            log_filters = {
+                device_id: _compile_filter(device_manager, device_id, filter)
+                for device_id in target_devices
+            }
+            device_stats = {device_id: LogStats(device_id) for device_id in target_devices}
+            streams = []
+            
+            def count_device_logs(device_id):
+                """Count a device's records a chunk at a time; nothing is formatted unless a text filter needs it"""
+                stats = device_stats[device_id]
+                try:
+                    logcat_args, log_filter = log_filters[device_id]
+                    if not include_buffer:
+                        logcat_args = ["-T", "1"] + logcat_args
+                    stream = device_manager.adb.stream(logcat_command(logcat_args), device_id)
+                    streams.append(stream)
+                    # Name packages while the first chunks queue up in the socket
+                    try:
+                        stats.uid_names = uid_packages(device_manager.adb, device_id)
+                    except ADBError:
+                        pass
+                    
+                    parser = LogcatParser()
+                    for chunk in stream.chunks():
+                        records = parser.feed(chunk)
+                        if log_filter:
+                            records = [record for record in records if log_filter.matches(record)]
+                        stats.add_batch(records)
+                except Exception as e:
+                    stats.error = str(e)
+            
+            threads = []
             for device_id in target_devices:
-                console.print(f"[yellow]Clearing log for {device_id}...[/yellow]")
-                device_manager.adb._run_command(["-s", device_id, "logcat", "-c"])
-                console.print(f"[green]✓ Log cleared for {device_id}[/green]")
+                thread = threading.Thread(target=count_device_logs, args=(device_id,), daemon=True)
+                thread.start()
+                threads.append(thread)
+            
+            console.print("[dim]Press Ctrl+C to stop[/dim]\n")
+            try:
+                with Live(_stats_table(device_stats, top), console=console, auto_refresh=False) as live:
+                    while True:
+                        time.sleep(STATS_INTERVAL)
+                        for stats in device_stats.values():
+                            stats.sample()
+                        live.update(_stats_table(device_stats, top), refresh=True)
+            except KeyboardInterrupt:
+                for stream in streams:
+                    stream.close()
+                for thread in threads:
+                    thread.join(timeout=1)
+            
+            if export:
+                summary = [stats.snapshot(max(top, 20)) for stats in device_stats.values()]
+                with open(export, 'w') as f:
+                    json.dump(summary, f, indent=2)
+                console.print(f"[green]✓ Statistics saved to: {export}[/green]")
                 
         except Exception as e:
             console.print(f"[red]Error: {e}[/red]")
     
+    @log.command('query')
+    @click.argument('archives', nargs=-1, type=click.Path(exists=True, file_okay=False))
+    @click.option('--since', help='Start time: age (15m, 2h), "YYYY-MM-DD HH:MM[:SS]", "MM-DD HH:MM:SS" or epoch')
+    @click.option('--until', help='End time, same formats as --since')
+    @click.option('-f', '--filter', multiple=True, help='Filter log output: text, re:REGEX, msg:REGEX, tag:, level:, pid:, uid:, buffer:, !TERM to exclude (can be used multiple times)')
+    @click.option('--device', multiple=True, help='Only records from this device (can be used multiple times)')
+    def log_query(archives, since, until, filter, device):
+        """Search saved log archives (default: all archives in ./logs)"""
+        try:
+            paths = list(archives) or find_archives(os.path.join(os.getcwd(), "logs"))
+            if not paths:
+                console.print("[yellow]No log archives found (save one with --save --archive)[/yellow]")
+                return
+            
+            since_time = parse_time(since) if since else None
+            until_time = parse_time(until) if until else None
+            log_filter = LogFilter(filter)
+            
+            matched = 0
+            blocks_read = blocks_total = 0
+            renderer = LogRenderer(console)
+            renderer.start()
+            try:
+                for path in paths:
+                    log_archive = LogArchive(path)
+                    # Prefix lines with the device when the archive holds several
+                    multi = len(log_archive.devices()) > 1
+                    for device_id, record, text in log_archive.query(since_time, until_time, log_filter, list(device)):
+                        prefix = f"[{device_id}] " if multi else ""
+                        for line in text.split("\n"):
+                            renderer.write(line, prefix, "bold")
+                        matched += 1
+                    blocks_read += log_archive.blocks_read
+                    blocks_total += log_archive.blocks_total
+            finally:
+                renderer.stop()
+            
+            console.print(f"[dim]{matched} record(s), read {blocks_read} of {blocks_total} block(s)[/dim]")
+            
+        except Exception as e:
+            console.print(f"[red]Error: {e}[/red]")
+    
+
+
+def _dump_device_log(device_manager, device_id: str, filter: tuple,
+                     log_file: Union[LogWriter, LogArchiveWriter, None], renderer: LogRenderer,
+                     prefix: str = "", color: str = "", cursor: Optional[LogCursor] = None,
+                     timeout: Optional[float] = None) -> int:
+    """Stream one device's log buffer to a file or the console, returning the entry count
+    
+    Records are handled as they arrive, so memory stays flat however large the buffer is.
+    With a cursor, only entries after it are fetched and the cursor is advanced.
+    Raises ADBTimeoutError if the dump is still running after ``timeout`` seconds.
+    """
+    logcat_args, log_filter = _compile_filter(device_manager, device_id, filter)
+    if cursor is not None:
+        logcat_args = cursor.logcat_args(_device_sdk(device_manager, device_id)) + logcat_args
+    count = 0
+    # The deadline also ends a dump from a device that went silent
+    stream = device_manager.adb.stream(logcat_command(["-d"] + logcat_args), device_id, timeout)
+    try:
+        for record in iter_records(stream.chunks()):
+            if cursor is not None:
+                # logcat -T repeats the entries at the cursor's own timestamp
+                if cursor.seen(record):
+                    continue
+                cursor.advance(record)
+            line = log_filter.apply(record)
+            if line is None:
+                continue
+            count += 1
+            if isinstance(log_file, LogArchiveWriter):
+                log_file.add(device_id, record)
+            elif log_file:
+                log_file.write(line + "\n")
+            else:
+                for part in line.split("\n"):
+                    renderer.write(part, prefix, f"bold {color}")
+    except ADBTimeoutError:
+        raise ADBTimeoutError(f"Log dump of {device_id} timed out after {timeout:.0f}s")
+    finally:
+        stream.close()
+    return count
+
+
+def _stats_table(device_stats: Dict[str, LogStats], top: int) -> Table:
+    """Build the 'log stats' table, one row per device"""
+    table = Table(title="Log statistics")
+    table.add_column("Device", style="cyan")
+    table.add_column("Lines", justify="right")
+    table.add_column("Lines/s", justify="right", style="bold")
+    table.add_column("Levels", no_wrap=True)
+    table.add_column("Top tags", no_wrap=True, overflow="ellipsis")
+    table.add_column("Top pids", no_wrap=True, overflow="ellipsis")
+    table.add_column("Top packages", no_wrap=True, overflow="ellipsis")
+    
+    def top_cell(entries):
+        # "~" marks counts that may include lines of keys evicted from the sketch
+        return "\n".join(f"{'~' if error else ''}{count} {escape(str(name))}" for name, count, error in entries)
+    
+    for device_id, stats in device_stats.items():
+        snapshot = stats.snapshot(top)
+        if snapshot["error"]:
+            table.add_row(device_id, str(snapshot["total"]), "", f"[red]{escape(snapshot['error'])}[/red]", "", "", "")
+            continue
+        levels = "\n".join(f"{letter} {count}" for letter, count in snapshot["priorities"].items())
+        table.add_row(
+            device_id,
+            str(snapshot["total"]),
+            f"{snapshot['rate']:.0f}",
+            levels,
+            top_cell(snapshot["tags"]),
+            top_cell(snapshot["pids"]),
+            top_cell(snapshot["packages"]),
+        )
+    return table
 
 
-def _setup_log_file(device_id: str, dump: bool = False) -> object:
+def _setup_log_file(device_id: str, dump: bool = False, rotate_size: Optional[int] = None,
+                    rotate_time: Optional[float] = None, compress: Optional[str] = None) -> LogWriter:
     """Setup log file for saving output"""
     # Create logs directory
     logs_dir = os.path.join(os.getcwd(), "logs")
@@ -240,24 +544,93 @@ def _setup_log_file(device_id: str, dump: bool = False) -> object:
     filename = f"logcat_{safe_device_id}_{timestamp}{suffix}.log"
     filepath = os.path.join(logs_dir, filename)
     
-    log_file = open(filepath, 'w')
+    # Lines are buffered and written by a background thread; close() flushes them
+    log_file = LogWriter(filepath, max_bytes=rotate_size, max_age=rotate_time, compress=compress)
     console.print(f"[green]✓ Saving log to: {filepath}[/green]")
     return log_file
 
 
-def _should_include_line(line: str, filters: tuple) -> bool:
-    """Check if a line should be included based on filters"""
-    if not filters:
-        return True
+def _setup_log_archive(device_id: str, dump: bool = False) -> LogArchiveWriter:
+    """Setup an indexed log archive for saving output"""
+    logs_dir = os.path.join(os.getcwd(), "logs")
+    os.makedirs(logs_dir, exist_ok=True)
     
-    if len(filters) == 1:
-        return filters[0] in line
-    else:
-        pattern = re.compile('|'.join(f"({re.escape(f)})" for f in filters))
-        return bool(pattern.search(line))
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_device_id = device_id.replace(":", "-").replace(".", "_")
+    suffix = "_dump" if dump else ""
+    path = os.path.join(logs_dir, f"logcat_{safe_device_id}_{timestamp}{suffix}{ARCHIVE_SUFFIX}")
+    
+    log_archive = LogArchiveWriter(path)
+    console.print(f"[green]✓ Saving log archive to: {path}[/green]")
+    return log_archive
+
+
+def _setup_trigger_captures(target_devices: List[str], trigger: tuple, pre: Optional[float],
+                            pre_size: Optional[int], post: Optional[float]) -> Dict[str, TriggerCapture]:
+    """Set up in-memory history and triggered snapshots per device (none without --trigger)"""
+    if not trigger:
+        return {}
+    pattern = compile_triggers(list(trigger))
+    logs_dir = os.path.join(os.getcwd(), "logs")
+    captures = {
+        device_id: TriggerCapture(
+            device_id, pattern, logs_dir,
+            pre_seconds=pre if pre is not None else PRE_SECONDS,
+            pre_bytes=pre_size if pre_size is not None else PRE_BYTES,
+            post_seconds=post if post is not None else POST_SECONDS,
+        )
+        for device_id in target_devices
+    }
+    console.print(f"[green]✓ Watching for {', '.join(trigger)}; snapshots go to {logs_dir}[/green]")
+    return captures
 
 
-def _view_multi_device_logs(device_manager, target_devices: List[str], filter: tuple, save: bool):
+def _close_trigger_captures(captures: Dict[str, TriggerCapture]):
+    """Finish snapshots still being written and list what was saved"""
+    for capture in captures.values():
+        capture.close()
+        for snapshot in capture.snapshots:
+            console.print(f"[green]✓ Snapshot saved: {snapshot}[/green]")
+
+
+def _size_option(ctx, param, value):
+    """Click callback parsing sizes like 100M"""
+    if value is None:
+        return None
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def _duration_option(ctx, param, value):
+    """Click callback parsing durations like 30m"""
+    if value is None:
+        return None
+    try:
+        return parse_duration(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def _compile_filter(device_manager, device_id: str, filter: tuple) -> Tuple[List[str], LogFilter]:
+    """Compile -f terms for a device, moving what logcat supports to the device side"""
+    log_filter = LogFilter(filter, package_resolver(device_manager.adb, device_id))
+    if not log_filter:
+        return [], log_filter
+    return log_filter.pushdown(_device_sdk(device_manager, device_id))
+
+
+def _device_sdk(device_manager, device_id: str) -> int:
+    """Android SDK level of a device (0 if unknown)"""
+    sdk = device_manager.properties.get(device_id, "ro.build.version.sdk")
+    return int(sdk) if sdk.isdigit() else 0
+
+
+def _view_multi_device_logs(device_manager, target_devices: List[str], filter: tuple,
+                            log_file: Union[LogWriter, LogArchiveWriter, None] = None,
+                            reorder_window: float = REORDER_WINDOW, overflow: str = "drop-oldest",
+                            captures: Optional[Dict[str, TriggerCapture]] = None, workers: int = 0):
     """View logs from multiple devices in a unified color-coded display"""
     # Get device information
     devices = device_manager.list_devices()
@@ -277,92 +650,143 @@ def _view_multi_device_logs(device_manager, target_devices: List[str], filter: t
         name = device_names[device_id]
         console.print(f"  [{color}]● {name}[/{color}] ({device_id})")
     
-    # Setup log file if requested
-    log_file = None
-    if save:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"logcat_multi_{timestamp}.log"
-        filepath = os.path.join(os.getcwd(), "logs", filename)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        log_file = open(filepath, 'w')
-        console.print(f"\n[green]✓ Saving combined log to: {filepath}[/green]")
-    
     console.print("\n[yellow]Starting multi-device log view...[/yellow]")
     console.print("[dim]Press Ctrl+C to stop[/dim]\n")
     
-    # Create queues and threads for each device
-    log_queue = queue.Queue()
-    threads = []
-    processes = []
+    # Create the renderer, the merge stage feeding it and readers for each device
+    renderer = LogRenderer(console)
+    renderer.start()
+    prefixes = {
+        device_id: (f"[{device_names[device_id]}] ", f"bold {device_colors[device_id]}")
+        for device_id in target_devices
+    }
+    captures = captures or {}
+    save_errors = []
     
-    def read_device_logs(device_id, color, name):
-        """Read logs from a device and put them in the queue"""
+    def save(write, *args):
+        """Write to the log file, reporting the first failure instead of raising
+        
+        This runs on the merge thread, which an exception would end silently.
+        """
+        if save_errors:
+            return
         try:
-            process = subprocess.Popen(
-                [device_manager.adb.adb_path, "-s", device_id, "logcat"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                errors='replace',  # Replace invalid UTF-8 characters
-                bufsize=1
-            )
-            processes.append(process)
-            
-            for line in process.stdout:
-                if line.strip():
-                    log_queue.put((device_id, color, name, line.rstrip()))
-                    
-        except Exception as e:
-            log_queue.put((device_id, color, name, f"[ERROR] {str(e)}"))
+            write(*args)
+        except IOError as e:
+            save_errors.append(e)
+            renderer.notice(f"[ERROR] Saving stopped: {e}", "bold red")
+    
+    def emit(device_id, item):
+        """Output one record, in timestamp order across devices"""
+        prefix, prefix_style = prefixes[device_id]
+        if isinstance(item, str):
+            # Stream notices and errors stand out from the log lines
+            renderer.notice(prefix + item)
+            if log_file is not None and not isinstance(log_file, LogArchiveWriter):
+                save(log_file.write, f"[{device_id}] {item}\n")
+            return
+        text, record = item
+        if isinstance(log_file, LogArchiveWriter):
+            if record is not None:
+                save(log_file.add, device_id, record)
+            log_lines = False
+        else:
+            log_lines = log_file is not None
+        for line in text.split("\n"):
+            renderer.write(line, prefix, prefix_style)
+            if log_lines:
+                save(log_file.write, f"[{device_id}] {line}\n")
+    
+    # Each device gets a bounded ring, so a flood never grows host memory
+    merger = LogMerger(emit, reorder_window, overflow=overflow)
+    merger.start()
     
-    # Start threads for each device
-    for device_id in target_devices:
-        thread = threading.Thread(
-            target=read_device_logs,
-            args=(device_id, device_colors[device_id], device_names[device_id]),
-            daemon=True
+    def push_line(device_id, timestamp, text, record):
+        """Hand a kept line to the merge stage, checking triggers on the way"""
+        capture = captures.get(device_id)
+        if capture:
+            snapshot = capture.add(timestamp, text)
+            if snapshot:
+                merger.push(device_id, timestamp, f"Trigger matched, saving snapshot to: {snapshot}")
+        merger.push(device_id, timestamp, (text, record))
+    
+    reader = None
+    pool = None
+    if workers:
+        # Decoding, filtering and formatting happen in worker processes
+        def on_records(device_id, items):
+            for timestamp, text, raw in items:
+                push_line(device_id, timestamp, text, LogRecord.from_bytes(raw) if raw else None)
+        
+        pool = LogWorkerPool(
+            {device_id: _device_sdk(device_manager, device_id) for device_id in target_devices},
+            filter, workers, on_records,
+            on_notice=lambda device_id, timestamp, text: merger.push(device_id, timestamp, text),
+            keep_raw=isinstance(log_file, LogArchiveWriter),
         )
-        thread.start()
-        threads.append(thread)
+        pool.start()
+    else:
+        # Compile filters up front (package: terms resolve to different pids per device)
+        log_filters = {
+            device_id: _compile_filter(device_manager, device_id, filter)
+            for device_id in target_devices
+        }
+        # Each device's stream reconnects and resumes by itself if the device drops
+        followers = [
+            LogcatFollower(device_manager.adb, device_id, log_filters[device_id][0],
+                           _device_sdk(device_manager, device_id))
+            for device_id in target_devices
+        ]
+        
+        def on_records(device_id, records):
+            """Filter a chunk's records on the reader thread so dropped lines are never rendered or saved"""
+            try:
+                log_filter = log_filters[device_id][1]
+                for record in records:
+                    text = log_filter.apply(record)
+                    if text is not None:
+                        push_line(device_id, record.timestamp, text, record)
+            except Exception as e:
+                merger.push(device_id, time.time(), f"[ERROR] {str(e)}")
+        
+        # One thread watches every device's stream, skipping devices the merge stage has no room for
+        reader = logcat_reader(followers, on_records,
+                               lambda device_id, notice: merger.push(device_id, notice.timestamp, str(notice)),
+                               merger.room)
+        reader.start()
     
-    # Main loop to display logs
+    # The readers feed the merge stage directly; report lost lines until Ctrl+C
+    reported = {}
     try:
         while True:
-            try:
-                device_id, color, name, line = log_queue.get(timeout=0.1)
-                
-                # Apply filters if any
-                if filter and not _should_include_line(line, filter):
-                    continue
-                
-                # Create formatted output with device identifier
-                text = Text()
-                text.append(f"[{name}] ", style=f"bold {color}")
-                text.append(line)
-                
-                console.print(text)
-                
-                # Save to file if requested
-                if log_file:
-                    log_file.write(f"[{device_id}] {line}\n")
-                    log_file.flush()
-                    
-            except queue.Empty:
-                continue
+            time.sleep(0.5)
+            for device_id, dropped in list(merger.dropped.items()):
+                if dropped > reported.get(device_id, 0):
+                    renderer.notice(f"[{device_names[device_id]}: {dropped - reported.get(device_id, 0)} lines "
+                                    f"dropped ({overflow}), {dropped} total]")
+                    reported[device_id] = dropped
                 
     except KeyboardInterrupt:
         console.print("\n[yellow]Stopping multi-device log view...[/yellow]")
-        
-        # Terminate all processes
-        for process in processes:
-            if process.poll() is None:
-                process.terminate()
-                
-        # Wait for threads to finish
-        for thread in threads:
-            thread.join(timeout=1)
             
     finally:
+        # Stop logcat on all devices, whichever way the loop ended
+        if reader is not None:
+            reader.stop()
+        if pool is not None:
+            pool.stop()
+        merger.stop()
+        renderer.stop()
+        for device_id, dropped in merger.dropped.items():
+            if dropped:
+                console.print(f"[yellow]{device_names[device_id]}: {dropped} lines dropped by the {overflow} policy[/yellow]")
         if log_file:
-            log_file.close()
-            console.print("[green]✓ Log file saved[/green]")
\ No newline at end of file
+            try:
+                log_file.close()
+            except IOError as e:
+                save_errors.append(e)
+            if save_errors:
+                console.print(f"[red]Error: Log file incomplete: {save_errors[0]}[/red]")
+            else:
+                console.print("[green]✓ Log file saved[/green]")
+        _close_trigger_captures(captures)
\ No newline at end of file
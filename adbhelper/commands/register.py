@@ -12,16 +12,26 @@ from rich.table import Table
 from rich.prompt import Prompt
 from ..core.adb import ADBWrapper, ADBError
 from ..core.device import DeviceManager
-from ..core.pairing import WiFiPairing
-from ..core.mdns_discovery import MDNSDiscovery
 from ..core.connection_history import ConnectionHistory
-from .utils import DeviceSelector
+from .utils import DeviceSelector, ParallelShellRunner
 
 console = Console()
 
 
 def register_commands(main_group):
     """Register all commands with the main CLI group"""
+    from .capture_commands import register_capture_commands
+    from .log_commands import register_log_commands
+    from .app_commands import register_app_commands
+    
+    register_core_commands(main_group)
+    register_capture_commands(main_group)
+    register_log_commands(main_group)
+    register_app_commands(main_group)
+
+
+def register_core_commands(main_group):
+    """Register the basic and add-device commands with the main CLI group"""
     
     # Basic commands
     @main_group.command()
@@ -119,8 +129,12 @@ def register_commands(main_group):
     @click.option('-d', '--device', help='Target specific device ID')
     @click.option('-a', '--all', 'all_devices', is_flag=True, help='Run on all connected devices')
     @click.option('-m', '--multi', is_flag=True, help='Select multiple devices interactively')
+    @click.option('-j', '--jobs', default=8, show_default=True, help='Maximum devices to run on at once')
+    @click.option('--fail-fast', is_flag=True, help='Stop all devices after the first failure')
+    @click.option('--group', is_flag=True, help='Print each device\'s output as a block when it finishes')
+    @click.option('--timeout', type=click.FloatRange(min=0, min_open=True), help='With several devices, seconds each one may take before its command is killed')
     @click.pass_context
-    def shell(ctx, shell_command, device, all_devices, multi):
+    def shell(ctx, shell_command, device, all_devices, multi, jobs, fail_fast, group, timeout):
         """Run shell commands on one or more devices"""
         device_manager = ctx.obj['device_manager']
         
@@ -180,7 +194,8 @@ def register_commands(main_group):
                 # Run the provided command on all target devices
                 cmd = ' '.join(shell_command)
                 
-                for device_id in target_devices:
+                if len(target_devices) == 1:
+                    device_id = target_devices[0]
                     console.print(f"\n[bold cyan]━━━ {device_id} ━━━[/bold cyan]")
                     console.print(f"[yellow]Running: {cmd}[/yellow]")
                     
@@ -193,9 +208,18 @@ def register_commands(main_group):
                     
                     if code != 0:
                         console.print(f"[red]Command failed with exit code {code}[/red]")
-                
-                if len(target_devices) > 1:
-                    console.print(f"\n[green]✓ Completed on {len(target_devices)} devices[/green]")
+                else:
+                    console.print(f"[yellow]Running: {cmd}[/yellow]")
+                    runner = ParallelShellRunner(device_manager.scheduler, jobs=jobs, fail_fast=fail_fast,
+                                                 group=group, timeout=timeout)
+                    results = runner.run(target_devices, cmd)
+                    runner.print_summary(results)
+                    
+                    succeeded = sum(1 for r in results if r["status"] == "ok")
+                    if succeeded == len(target_devices):
+                        console.print(f"\n[green]✓ Completed on {len(target_devices)} devices[/green]")
+                    else:
+                        console.print(f"\n[red]Succeeded on {succeeded} of {len(target_devices)} devices[/red]")
             else:
                 # Interactive shell only works with single device
                 if len(target_devices) > 1:
@@ -420,6 +444,9 @@ def register_commands(main_group):
         device_manager = ctx.obj['device_manager']
         
         try:
+            from ..core.pairing import WiFiPairing
+            from ..core.mdns_discovery import MDNSDiscovery
+            
             pairing = WiFiPairing(device_manager.adb)
             history = ConnectionHistory()
             
@@ -566,6 +593,7 @@ def register_commands(main_group):
             
             if Prompt.ask("Continue with experimental pairing?", choices=["y", "n"], default="n") == "y":
                 try:
+                    from ..core.pairing import WiFiPairing
                     from ..core.spake2_pairing import SPAKE2PairingServer
                     from ..core.mdns_pairing import MDNSPairingService
                     
@@ -632,6 +660,8 @@ def register_commands(main_group):
             
             if Prompt.ask("\nShow QR code for reference?", choices=["y", "n"], default="n") == "y":
                 try:
+                    from ..core.pairing import WiFiPairing
+                    
                     adb = ADBWrapper()
                     pairing = WiFiPairing(adb)
                     pairing_info = pairing.start_pairing_session(use_mdns=False)
@@ -641,12 +671,3 @@ def register_commands(main_group):
                     
                 except Exception as e:
                     console.print(f"[red]Error: {e}[/red]")
-    
-    # Register capture and log command groups
-    from .capture_commands import register_capture_commands
-    from .log_commands import register_log_commands
-    from .app_commands import register_app_commands
-    
-    register_capture_commands(main_group)
-    register_log_commands(main_group)
-    register_app_commands(main_group)
\ No newline at end of file
@@ -1,11 +1,34 @@
 """Utility functions for command operations"""
+import functools
+import threading
+import time
 from typing import List, Optional
 from rich.console import Console
 from rich.prompt import Prompt
+from rich.table import Table
+from rich.text import Text
+from ..core.adb import ADBError, ADBTimeoutError
 from ..core.device import DeviceManager
+from ..core.scheduler import DeviceScheduler, PRIORITY_INTERACTIVE
 
 console = Console()
 
+# Color palette for different devices
+DEVICE_COLORS = [
+    "bright_blue",
+    "bright_green", 
+    "bright_yellow",
+    "bright_magenta",
+    "bright_cyan",
+    "bright_red",
+    "blue",
+    "green",
+    "yellow",
+    "magenta",
+    "cyan",
+    "red"
+]
+
 
 class DeviceSelector:
     """Handles device selection logic for commands"""
@@ -87,4 +110,199 @@ class DeviceSelector:
         else:  # mode == "3"
             # All devices
             console.print(f"[green]Using all {len(devices)} device(s)[/green]")
-            return [d['id'] for d in devices]
\ No newline at end of file
+            return [d['id'] for d in devices]
+
+class ParallelShellRunner:
+    """Runs one shell command on many devices at once through the device scheduler
+    
+    Each device's command is an interactive job on that device's scheduler
+    queue, so it gets a deadline and the device's circuit breaker; at most
+    ``jobs`` devices run at the same time.
+    """
+    
+    def __init__(self, scheduler: DeviceScheduler, jobs: int = 8, fail_fast: bool = False,
+                 group: bool = False, timeout: Optional[float] = None):
+        """
+        Args:
+            scheduler: Device scheduler the commands are queued on
+            jobs: Maximum number of devices running at the same time
+            fail_fast: Stop starting new devices and kill running ones after the first failure
+            group: Print each device's output as one block when it finishes instead of live
+            timeout: Seconds each device may take, including time queued (None = no limit)
+        """
+        self.scheduler = scheduler
+        self.adb = scheduler.adb
+        self.jobs = max(1, jobs)
+        self.fail_fast = fail_fast
+        self.group = group
+        self.timeout = timeout
+        self._stop = threading.Event()
+        self._running = {}
+        self._killed = set()
+        self._timed_out = set()
+        self._lock = threading.Lock()
+    
+    def run(self, device_ids: List[str], command: str) -> List[dict]:
+        """Run the command on every device and return per-device results in completion order"""
+        labels = {
+            device_id: (device_id, DEVICE_COLORS[i % len(DEVICE_COLORS)])
+            for i, device_id in enumerate(device_ids)
+        }
+        results = {
+            device_id: {"device": device_id, "code": None, "duration": 0.0, "status": "skipped", "error": None}
+            for device_id in device_ids
+        }
+        calls = {
+            device_id: functools.partial(self._run_one, results[device_id], command, *labels[device_id])
+            for device_id in device_ids
+        }
+        finished = []
+        
+        for device_id, future in self.scheduler.map_calls(calls, self.jobs, PRIORITY_INTERACTIVE,
+                                                          self.timeout, self._stop):
+            result = results[device_id]
+            try:
+                future.result()
+            except ADBError as e:
+                # Not started (deadline passed, breaker open), failed to start, or timed out
+                result["status"] = "timeout" if isinstance(e, ADBTimeoutError) else "error"
+                result["error"] = str(e)
+                name, color = labels[device_id]
+                if not self.group:
+                    self._print_line(name, color, result["error"], style="red")
+                elif result["code"] is None:
+                    self._print_block(name, color, result, [], [])
+            finished.append(result)
+            if self.fail_fast and result["status"] in ("failed", "error", "timeout"):
+                self._abort()
+        
+        # Devices never started after a fail-fast abort stay "skipped"
+        started = {result["device"] for result in finished}
+        finished.extend(result for device_id, result in results.items() if device_id not in started)
+        return finished
+    
+    def _abort(self):
+        """Stop queued devices and kill the commands still running"""
+        with self._lock:
+            if self._stop.is_set():
+                return
+            # Set under the lock so a command starting now either sees it or is killed here
+            self._stop.set()
+            for device_id, process in self._running.items():
+                if process.poll() is None:
+                    self._killed.add(device_id)
+                    process.terminate()
+    
+    def _expire(self, device_id: str):
+        """Kill a device's command that ran past its deadline"""
+        with self._lock:
+            process = self._running.get(device_id)
+            if process is not None and process.poll() is None:
+                self._timed_out.add(device_id)
+                process.terminate()
+    
+    def _run_one(self, result: dict, command: str, name: str, color: str, timeout: Optional[float]):
+        """Run the command on one device (a scheduler job), streaming or buffering its output
+        
+        Fills in ``result``; raises ADBTimeoutError if the command was killed at its deadline.
+        """
+        if self._stop.is_set():
+            return
+        self._run_process(result, command, name, color,
+                          None if timeout is None else time.monotonic() + timeout)
+        if result["status"] == "timeout":
+            raise ADBTimeoutError(f"Command timed out on {result['device']} after {result['duration']:.1f}s")
+    
+    def _run_process(self, result: dict, command: str, name: str, color: str, end: Optional[float]):
+        device_id = result["device"]
+        start = time.monotonic()
+        stdout_lines = []
+        stderr_lines = []
+        timer = None
+        try:
+            process = self.adb._run_command_async(["-s", device_id, "shell", command])
+            with self._lock:
+                self._running[device_id] = process
+                if self._stop.is_set():
+                    # _abort ran while this command was starting
+                    self._killed.add(device_id)
+                    process.terminate()
+            if end is not None:
+                timer = threading.Timer(max(0.0, end - time.monotonic()), self._expire, args=(device_id,))
+                timer.daemon = True
+                timer.start()
+            
+            # Drain stderr on the side so neither pipe can fill up and stall the command
+            stderr_reader = threading.Thread(
+                target=lambda: stderr_lines.extend(process.stderr), daemon=True
+            )
+            stderr_reader.start()
+            
+            for line in process.stdout:
+                if self.group:
+                    stdout_lines.append(line)
+                else:
+                    self._print_line(name, color, line)
+            
+            stderr_reader.join()
+            result["code"] = process.wait()
+            if not self.group:
+                for line in stderr_lines:
+                    self._print_line(name, color, line, style="red")
+            
+            if device_id in self._timed_out:
+                result["status"] = "timeout"
+            elif device_id in self._killed:
+                result["status"] = "killed"
+            else:
+                result["status"] = "ok" if result["code"] == 0 else "failed"
+        finally:
+            if timer is not None:
+                timer.cancel()
+            with self._lock:
+                self._running.pop(device_id, None)
+            result["duration"] = time.monotonic() - start
+        
+        if self.group:
+            self._print_block(name, color, result, stdout_lines, stderr_lines)
+    
+    @staticmethod
+    def _print_line(name: str, color: str, line: str, style: str = ""):
+        """Print one output line with a colored device prefix"""
+        text = Text()
+        text.append(f"[{name}] ", style=f"bold {color}")
+        text.append(line.rstrip("\n"), style=style)
+        console.print(text)
+    
+    @staticmethod
+    def _print_block(name: str, color: str, result: dict, stdout_lines: List[str], stderr_lines: List[str]):
+        """Print a finished device's output as one block"""
+        console.print(f"\n[bold {color}]━━━ {name} ━━━[/bold {color}]")
+        output = "".join(stdout_lines).rstrip()
+        if output:
+            console.print(Text(output))
+        errors = "".join(stderr_lines).rstrip() or result["error"]
+        if errors:
+            console.print(Text(errors, style="red"))
+    
+    @staticmethod
+    def print_summary(results: List[dict]):
+        """Print a table of exit codes and durations per device"""
+        styles = {"ok": "green", "failed": "red", "error": "red", "timeout": "red", "killed": "yellow", "skipped": "dim"}
+        table = Table(title="Summary")
+        table.add_column("Device ID", style="cyan")
+        table.add_column("Status")
+        table.add_column("Exit Code", justify="right")
+        table.add_column("Duration", justify="right")
+        
+        for result in results:
+            style = styles.get(result["status"], "")
+            table.add_row(
+                result["device"],
+                f"[{style}]{result['status']}[/{style}]",
+                "" if result["code"] is None else str(result["code"]),
+                f"{result['duration']:.2f}s" if result["status"] != "skipped" else "",
+            )
+        
+        console.print()
+        console.print(table)
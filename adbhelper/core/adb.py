@@ -1,9 +1,16 @@
 """Core ADB wrapper functionality"""
 
+import os
 import subprocess
-import shutil
+import socket
 from typing import List, Optional, Tuple
 from rich.console import Console
+from .adb_socket import (
+    ADBServerClient, ADBServerError, ADBServerCommandError, ADBServerLostError, ADBServerProcess,
+)
+from .shell_session import ShellSessionPool
+from .toolchain import ToolchainCache
+from .stream import CommandStream, ShellSocketStream, ExecSocketStream, ProcessStream
 
 console = Console()
 
@@ -11,21 +18,101 @@ class ADBError(Exception):
     """Custom exception for ADB-related errors"""
     pass
 
+class ADBTimeoutError(ADBError):
+    """An ADB command did not finish within its timeout"""
+    pass
+
+# Default per-command timeout in seconds
+DEFAULT_TIMEOUT = 30
+
 class ADBWrapper:
     """Wrapper for Android Debug Bridge commands"""
     
-    def __init__(self):
+    def __init__(self, use_server: bool = True, persistent_shell: bool = True):
+        self.toolchain = ToolchainCache()
         self.adb_path = self._find_adb()
+        # Talk to the adb server directly when possible; the adb binary is the fallback
+        self.server = ADBServerClient()
+        self.use_server = use_server and not os.environ.get("ADBH_NO_SERVER")
+        # Shell commands share one long-lived shell per device
+        self.shell_sessions = ShellSessionPool(self.server) if persistent_shell else None
         
     def _find_adb(self) -> str:
         """Find ADB executable in system PATH"""
-        adb_path = shutil.which("adb")
+        adb_path = self.toolchain.find_adb()
         if not adb_path:
             raise ADBError("ADB not found in PATH. Please install Android SDK Platform Tools.")
         return adb_path
     
-    def _run_command(self, args: List[str], device_id: Optional[str] = None) -> Tuple[str, str, int]:
+    @staticmethod
+    def _split_args(args: List[str], device_id: Optional[str] = None) -> Tuple[Optional[str], List[str]]:
+        """Split a leading "-s <serial>" out of an argument list"""
+        args = list(args)
+        if len(args) >= 2 and args[0] == "-s":
+            device_id = args[1]
+            args = args[2:]
+        return device_id or os.environ.get("ANDROID_SERIAL") or None, args
+    
+    def _run_server_command(self, args: List[str], device_id: Optional[str] = None,
+                            timeout: Optional[float] = DEFAULT_TIMEOUT) -> Optional[Tuple[str, str, int]]:
+        """Run a command through the adb server socket
+        
+        Returns None when the command has no socket equivalent and should go
+        through the adb binary instead.
+        """
+        serial, args = self._split_args(args, device_id)
+        if not args or args[0].startswith("-"):
+            return None
+        
+        command, rest = args[0], args[1:]
+        if command == "devices" and rest in ([], ["-l"]):
+            listing = self.server.devices(long=bool(rest))
+            return f"List of devices attached\n{listing}\n", "", 0
+        
+        if command == "shell" and rest and not rest[0].startswith("-"):
+            if not self.server.supports_shell_v2(serial):
+                return None
+            if self.shell_sessions:
+                stdout, stderr, code = self.shell_sessions.run(" ".join(rest), serial, timeout)
+            else:
+                stdout, stderr, code = self.server.shell(" ".join(rest), serial, timeout)
+            return stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace"), code
+        
+        if command == "exec-out" and rest:
+            # exec: carries no exit status; a raw (no pty) shell v2 is just as binary-safe
+            # and reports it, otherwise the adb binary gives the usual answer
+            if not self.server.supports_shell_v2(serial):
+                return None
+            stdout, stderr, code = self.server.shell(" ".join(rest), serial, timeout)
+            return stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace"), code
+        
+        return None
+    
+    def _run_command(self, args: List[str], device_id: Optional[str] = None,
+                     timeout: Optional[float] = DEFAULT_TIMEOUT) -> Tuple[str, str, int]:
         """Run an ADB command and return output"""
+        if self.use_server:
+            try:
+                result = self._run_server_command(args, device_id, timeout)
+                if result is not None:
+                    return result
+            except ADBServerCommandError as e:
+                # Same shape as the adb binary reporting a server-side failure
+                return "", f"adb: error: {e}\n", 1
+            except socket.timeout:
+                raise ADBTimeoutError(f"ADB command timed out: adb {' '.join(args)}")
+            except ADBServerLostError as e:
+                # The command was sent and may have run; running it again is not safe
+                raise ADBError(f"Connection lost during 'adb {' '.join(args)}', it may have run: {e}")
+            except (ADBServerError, OSError):
+                # Server not running yet or unreachable - the adb binary will start it
+                pass
+        
+        return self._run_subprocess(args, device_id, timeout)
+    
+    def _run_subprocess(self, args: List[str], device_id: Optional[str] = None,
+                        timeout: Optional[float] = DEFAULT_TIMEOUT) -> Tuple[str, str, int]:
+        """Run an ADB command by spawning the adb binary"""
         cmd = [self.adb_path]
         
         if device_id:
@@ -38,16 +125,26 @@ class ADBWrapper:
                 cmd,
                 capture_output=True,
                 text=True,
-                timeout=30
+                timeout=timeout
             )
             return process.stdout, process.stderr, process.returncode
         except subprocess.TimeoutExpired:
-            raise ADBError(f"ADB command timed out: {' '.join(cmd)}")
+            raise ADBTimeoutError(f"ADB command timed out: {' '.join(cmd)}")
         except Exception as e:
             raise ADBError(f"Failed to run ADB command: {e}")
     
-    def _run_command_async(self, args: List[str], device_id: Optional[str] = None) -> subprocess.Popen:
-        """Run an ADB command asynchronously and return the process"""
+    def _run_command_async(self, args: List[str], device_id: Optional[str] = None):
+        """Run an ADB command asynchronously and return a Popen-like process"""
+        if self.use_server:
+            serial, command = self._split_args(args, device_id)
+            if len(command) > 1 and command[0] == "shell" and not command[1].startswith("-"):
+                try:
+                    if self.server.supports_shell_v2(serial):
+                        sock = self.server.open_shell(" ".join(command[1:]), serial)
+                        return ADBServerProcess(sock, [self.adb_path] + list(args))
+                except (ADBServerError, OSError):
+                    pass
+        
         cmd = [self.adb_path]
         
         if device_id:
@@ -66,6 +163,47 @@ class ADBWrapper:
         except Exception as e:
             raise ADBError(f"Failed to run ADB command: {e}")
     
+    def stream(self, args: List[str], device_id: Optional[str] = None,
+               timeout: Optional[float] = None) -> CommandStream:
+        """Run an ADB command and stream its stdout as it is produced
+        
+        Use as a context manager and iterate ``.lines()`` or ``.chunks()``;
+        leaving the block early stops the command on the device. With a
+        timeout, the command is stopped after that many seconds and reading
+        raises ADBTimeoutError; without one it may run indefinitely.
+        """
+        stream = self._open_stream(args, device_id)
+        if timeout is not None:
+            stream.set_deadline(timeout, ADBTimeoutError(f"ADB command timed out: adb {' '.join(args)}"))
+        return stream
+    
+    def _open_stream(self, args: List[str], device_id: Optional[str]) -> CommandStream:
+        """Start a streamed command over the server socket, or an adb subprocess"""
+        if self.use_server:
+            serial, command = self._split_args(args, device_id)
+            try:
+                if len(command) > 1 and command[0] == "shell" and not command[1].startswith("-"):
+                    if self.server.supports_shell_v2(serial):
+                        sock = self.server.open_shell(" ".join(command[1:]), serial)
+                        return ShellSocketStream(sock, [self.adb_path] + list(args))
+                elif len(command) > 1 and command[0] == "exec-out":
+                    sock = self.server.open_service(f"exec:{' '.join(command[1:])}", serial)
+                    return ExecSocketStream(sock, [self.adb_path] + list(args))
+            except ADBServerCommandError as e:
+                raise ADBError(f"Failed to run ADB command: {e}")
+            except (ADBServerError, OSError):
+                pass
+        
+        cmd = [self.adb_path]
+        if device_id:
+            cmd.extend(["-s", device_id])
+        cmd.extend(args)
+        
+        try:
+            return ProcessStream(cmd)
+        except Exception as e:
+            raise ADBError(f"Failed to run ADB command: {e}")
+    
     def get_devices(self) -> List[dict]:
         """Get list of connected devices"""
         stdout, stderr, code = self._run_command(["devices", "-l"])
@@ -73,6 +211,11 @@ class ADBWrapper:
         if code != 0:
             raise ADBError(f"Failed to get devices: {stderr}")
         
+        return self._parse_devices(stdout)
+    
+    @staticmethod
+    def _parse_devices(stdout: str) -> List[dict]:
+        """Parse "adb devices -l" output into device dicts"""
         devices = []
         lines = stdout.strip().split('\n')[1:]  # Skip header
         
@@ -150,38 +293,89 @@ class ADBWrapper:
     
     def is_available(self) -> bool:
         """Check if ADB is available and working"""
+        if self.toolchain.get(self.adb_path, "version"):
+            # This exact binary has run successfully before
+            return True
         try:
             stdout, stderr, code = self._run_command(["version"])
+            if code == 0:
+                self._cache_version(stdout)
             return code == 0
         except:
             return False
     
+    def _cache_version(self, stdout: str) -> Optional[str]:
+        """Parse "adb version" output and remember the result for this binary"""
+        # Parse version from output like "Android Debug Bridge version 1.0.41\nVersion 34.0.4-10411341"
+        version = None
+        lines = stdout.strip().split('\n')
+        for line in lines:
+            if "Version" in line and not "Bridge" in line:
+                # Extract version number like "34.0.4-10411341"
+                parts = line.split()
+                if len(parts) >= 2:
+                    version = parts[1].split('-')[0]  # "34.0.4"
+                    break
+        
+        if version:
+            try:
+                major = int(version.split('.')[0])
+            except ValueError:
+                major = 0
+            self.toolchain.set(
+                self.adb_path,
+                version=version,
+                # Wireless pairing needs 30.0.0+, streamed installs 29.0.0+
+                supports_pairing=major >= 30,
+                supports_streaming_install=major >= 29,
+            )
+        return version
+    
     def get_version(self) -> Optional[str]:
         """Get ADB version number"""
+        cached = self.toolchain.get(self.adb_path, "version")
+        if cached:
+            return cached
         try:
             stdout, stderr, code = self._run_command(["version"])
             if code == 0:
-                # Parse version from output like "Android Debug Bridge version 1.0.41\nVersion 34.0.4-10411341"
-                lines = stdout.strip().split('\n')
-                for line in lines:
-                    if "Version" in line and not "Bridge" in line:
-                        # Extract version number like "34.0.4-10411341"
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            return parts[1].split('-')[0]  # Return "34.0.4"
+                return self._cache_version(stdout)
             return None
         except:
             return None
     
     def supports_pairing(self) -> bool:
         """Check if ADB version supports wireless pairing (30.0.0+)"""
-        version = self.get_version()
-        if not version:
+        if self.get_version() is None:
+            return False
+        return bool(self.toolchain.get(self.adb_path, "supports_pairing"))
+    
+    def supports_streaming_install(self) -> bool:
+        """Check if ADB version supports streamed installs (29.0.0+)"""
+        if self.get_version() is None:
             return False
+        return bool(self.toolchain.get(self.adb_path, "supports_streaming_install"))
+    
+    def get_host_features(self) -> List[str]:
+        """Get the feature list of the adb host (adb host-features)"""
+        cached = self.toolchain.get(self.adb_path, "host_features")
+        if cached is not None:
+            return cached
         
-        try:
-            # Parse version like "34.0.4" to compare
-            major = int(version.split('.')[0])
-            return major >= 30
-        except:
-            return False
\ No newline at end of file
+        output = None
+        if self.use_server:
+            try:
+                output = self.server.host_command("host:host-features")
+            except (ADBServerError, OSError):
+                pass
+        if output is None:
+            try:
+                output, _, code = self._run_subprocess(["host-features"])
+            except ADBError:
+                return []
+            if code != 0:
+                return []
+        
+        features = [f for f in output.strip().split(',') if f]
+        self.toolchain.set(self.adb_path, host_features=features)
+        return features
@@ -0,0 +1,331 @@
+"""Client for the adb server smart-socket protocol
+
+Talks directly to the local adb server (normally 127.0.0.1:5037) instead of
+spawning the ``adb`` binary for every command. Requests are framed as a
+4-digit hex length followed by the service name; the server answers with
+``OKAY`` or ``FAIL`` plus a hex-length-prefixed message.
+"""
+
+import os
+import signal
+import socket
+import struct
+import subprocess
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5037
+
+# Shell protocol v2 packet ids (see adb/shell_protocol.h)
+SHELL_ID_STDIN = 0
+SHELL_ID_STDOUT = 1
+SHELL_ID_STDERR = 2
+SHELL_ID_EXIT = 3
+SHELL_ID_CLOSE_STDIN = 4
+SHELL_HEADER = struct.Struct("<BI")
+
+
+class ADBServerError(Exception):
+    """The adb server could not be reached or spoke an unexpected protocol"""
+    pass
+
+
+class ADBServerCommandError(ADBServerError):
+    """The adb server answered a request with FAIL"""
+    pass
+
+
+class ADBServerLostError(ADBServerError):
+    """The connection dropped after a command was sent, so it may have run
+
+    Unlike other ADBServerErrors, retrying through the adb binary is not safe.
+    """
+    pass
+
+
+def _read_exactly(sock: socket.socket, size: int) -> bytes:
+    """Read exactly ``size`` bytes from the socket"""
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            raise ADBServerError("Connection closed by adb server")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_all(sock: socket.socket) -> bytes:
+    """Read from the socket until the server closes it"""
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+class ADBServerClient:
+    """Minimal client for the adb server's host and device services"""
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None,
+                 timeout: Optional[float] = 30):
+        """Initialize the client
+
+        Args:
+            host: Server address. Defaults to ANDROID_ADB_SERVER_ADDRESS or 127.0.0.1
+            port: Server port. Defaults to ANDROID_ADB_SERVER_PORT or 5037
+            timeout: Socket timeout in seconds (None blocks forever)
+        """
+        self.host = host or os.environ.get("ANDROID_ADB_SERVER_ADDRESS", DEFAULT_HOST)
+        self.port = port or int(os.environ.get("ANDROID_ADB_SERVER_PORT", DEFAULT_PORT))
+        self.timeout = timeout
+        self._features: Dict[Optional[str], Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def connect(self, timeout: Optional[float] = None) -> socket.socket:
+        """Open a new connection to the adb server"""
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise ADBServerError(f"Cannot connect to adb server at {self.host}:{self.port}: {e}")
+        # Requests and shell packets are small; don't let Nagle hold them back
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(timeout if timeout is not None else self.timeout)
+        return sock
+
+    def _send_request(self, sock: socket.socket, service: str):
+        """Send a length-prefixed service request and check the status reply"""
+        payload = service.encode("utf-8")
+        sock.sendall(b"%04x" % len(payload) + payload)
+        self._read_status(sock)
+
+    def _read_status(self, sock: socket.socket):
+        """Read an OKAY/FAIL status, raising on FAIL"""
+        status = _read_exactly(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise ADBServerCommandError(self._read_block(sock).decode("utf-8", "replace"))
+        raise ADBServerError(f"Unexpected reply from adb server: {status!r}")
+
+    def _read_block(self, sock: socket.socket) -> bytes:
+        """Read a hex-length-prefixed block"""
+        header = _read_exactly(sock, 4)
+        try:
+            length = int(header, 16)
+        except ValueError:
+            raise ADBServerError(f"Invalid length header from adb server: {header!r}")
+        return _read_exactly(sock, length)
+
+    def host_command(self, service: str) -> str:
+        """Run a host service that replies with a single block (e.g. host:devices-l)"""
+        with self.connect() as sock:
+            self._send_request(sock, service)
+            return self._read_block(sock).decode("utf-8", "replace")
+
+    def version(self) -> int:
+        """Get the adb server protocol version (host:version)"""
+        return int(self.host_command("host:version"), 16)
+
+    def devices(self, long: bool = True) -> str:
+        """Get the raw device listing (host:devices / host:devices-l)"""
+        return self.host_command("host:devices-l" if long else "host:devices")
+
+    def open_tracker(self) -> socket.socket:
+        """Subscribe to device list updates (host:track-devices-l)
+
+        The returned socket blocks until the next update; read each one with
+        read_tracker_update().
+        """
+        sock = self.connect(timeout=None)
+        try:
+            self._send_request(sock, "host:track-devices-l")
+        except BaseException:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return sock
+
+    def read_tracker_update(self, sock: socket.socket) -> str:
+        """Block until the tracker sends the next full device listing"""
+        return self._read_block(sock).decode("utf-8", "replace")
+
+    def features(self, serial: Optional[str] = None) -> Set[str]:
+        """Get the feature set shared by the server and a device (cached per serial)"""
+        with self._lock:
+            if serial in self._features:
+                return self._features[serial]
+        service = f"host-serial:{serial}:features" if serial else "host:features"
+        features = set(filter(None, self.host_command(service).strip().split(",")))
+        with self._lock:
+            self._features[serial] = features
+        return features
+
+    def open_service(self, service: str, serial: Optional[str] = None,
+                     timeout: Optional[float] = None) -> socket.socket:
+        """Switch a new connection to a device transport and open a service on it
+
+        Returns the connected socket, positioned at the start of the service stream.
+        """
+        sock = self.connect(timeout)
+        try:
+            self._send_request(sock, f"host:transport:{serial}" if serial else "host:transport-any")
+            self._send_request(sock, service)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def supports_shell_v2(self, serial: Optional[str] = None) -> bool:
+        """Check whether exit codes can be obtained through shell protocol v2"""
+        return "shell_v2" in self.features(serial)
+
+    def open_shell(self, command: str, serial: Optional[str] = None,
+                   timeout: Optional[float] = None) -> socket.socket:
+        """Open a raw (no pty) shell v2 session running ``command``"""
+        return self.open_service(f"shell,v2,raw:{command}", serial, timeout)
+
+    def shell(self, command: str, serial: Optional[str] = None,
+              timeout: Optional[float] = None) -> Tuple[bytes, bytes, int]:
+        """Run a shell command and return (stdout, stderr, exit code)"""
+        stdout = bytearray()
+        stderr = bytearray()
+        exit_code = None
+        with self.open_shell(command, serial, timeout) as sock:
+            try:
+                for packet_id, data in iter_shell_packets(sock):
+                    if packet_id == SHELL_ID_STDOUT:
+                        stdout += data
+                    elif packet_id == SHELL_ID_STDERR:
+                        stderr += data
+                    elif packet_id == SHELL_ID_EXIT:
+                        exit_code = data[0] if data else 1
+                        break
+            except socket.timeout:
+                raise
+            except (OSError, ADBServerError) as e:
+                raise ADBServerLostError(f"Connection lost while running '{command}': {e}")
+        if exit_code is None:
+            # adbd always ends with an exit packet; without one the device went away
+            raise ADBServerLostError(f"Connection lost while running '{command}': no exit status")
+        return bytes(stdout), bytes(stderr), exit_code
+
+    def exec_out(self, command: str, serial: Optional[str] = None) -> bytes:
+        """Run a command through exec: and return its raw stdout"""
+        with self.open_service(f"exec:{command}", serial) as sock:
+            try:
+                return _read_all(sock)
+            except socket.timeout:
+                raise
+            except OSError as e:
+                raise ADBServerLostError(f"Connection lost while running '{command}': {e}")
+
+
+def iter_shell_packets(sock: socket.socket):
+    """Yield (packet id, payload) pairs from a shell v2 stream until it closes"""
+    while True:
+        header = sock.recv(SHELL_HEADER.size)
+        if not header:
+            return
+        if len(header) < SHELL_HEADER.size:
+            header += _read_exactly(sock, SHELL_HEADER.size - len(header))
+        packet_id, length = SHELL_HEADER.unpack(header)
+        yield packet_id, _read_exactly(sock, length) if length else b""
+
+
+class ADBServerProcess:
+    """Popen-like handle for a shell command running over an adb server socket
+
+    A pump thread demultiplexes the shell v2 stream into ordinary pipes so that
+    callers written against ``subprocess.Popen`` (iterating ``stdout``, ``wait``,
+    ``poll``, ``terminate``) keep working unchanged.
+    """
+
+    def __init__(self, sock: socket.socket, args: List[str], text: bool = True):
+        self.args = args
+        self.returncode: Optional[int] = None
+        self._sock = sock
+        self._terminated = False
+        self._done = threading.Event()
+        
+        out_r, self._out_w = os.pipe()
+        err_r, self._err_w = os.pipe()
+        if text:
+            self.stdout = open(out_r, "r", errors="replace")
+            self.stderr = open(err_r, "r", errors="replace")
+        else:
+            self.stdout = open(out_r, "rb")
+            self.stderr = open(err_r, "rb")
+        
+        sock.settimeout(None)
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def _pump(self):
+        """Copy shell packets into the stdout/stderr pipes"""
+        try:
+            for packet_id, data in iter_shell_packets(self._sock):
+                if packet_id == SHELL_ID_STDOUT:
+                    self._write(self._out_w, data)
+                elif packet_id == SHELL_ID_STDERR:
+                    self._write(self._err_w, data)
+                elif packet_id == SHELL_ID_EXIT:
+                    self.returncode = data[0] if data else 1
+                    break
+        except (OSError, ADBServerError):
+            pass
+        finally:
+            if self.returncode is None:
+                self.returncode = -signal.SIGTERM if self._terminated else 1
+            for fd in (self._out_w, self._err_w):
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            self._sock.close()
+            self._done.set()
+
+    @staticmethod
+    def _write(fd: int, data: bytes):
+        """Write all of ``data`` to a pipe, ignoring a closed reader"""
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[os.write(fd, view):]
+        except BrokenPipeError:
+            pass
+
+    def poll(self) -> Optional[int]:
+        """Return the exit code if the command has finished, else None"""
+        return self.returncode if self._done.is_set() else None
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """Wait for the command to finish and return its exit code"""
+        if not self._done.wait(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def communicate(self, timeout: Optional[float] = None):
+        """Read stdout and stderr to the end and wait for the command to finish"""
+        stderr_data = []
+        reader = threading.Thread(target=lambda: stderr_data.append(self.stderr.read()), daemon=True)
+        reader.start()
+        stdout_data = self.stdout.read()
+        reader.join(timeout)
+        self.wait(timeout)
+        return stdout_data, stderr_data[0] if stderr_data else None
+
+    def terminate(self):
+        """Close the session; the adb daemon kills the remote process"""
+        if self._done.is_set():
+            return
+        self._terminated = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    kill = terminate
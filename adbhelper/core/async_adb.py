@@ -0,0 +1,300 @@
+"""Asyncio API for the core ADB layer
+
+AsyncADBWrapper mirrors ADBWrapper with coroutine methods so many devices can
+be driven from a single event loop. Device and shell commands talk to the adb
+server socket directly; everything else (push, pull, ...) runs the adb binary
+through asyncio subprocesses. Concurrency is bounded globally and per device.
+"""
+
+import asyncio
+import contextlib
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from .adb import ADBError, ADBTimeoutError, ADBWrapper
+from .adb_socket import (
+    DEFAULT_HOST, DEFAULT_PORT, SHELL_HEADER, SHELL_ID_STDOUT, SHELL_ID_STDERR, SHELL_ID_EXIT,
+    ADBServerError, ADBServerCommandError, ADBServerLostError,
+)
+from .toolchain import ToolchainCache
+
+T = TypeVar("T")
+
+# Default for per-call timeouts: use the wrapper's timeout (None disables it)
+_DEFAULT_TIMEOUT = object()
+
+
+class AsyncADBWrapper:
+    """Async wrapper for Android Debug Bridge commands"""
+
+    def __init__(self, max_concurrency: int = 64, per_device_concurrency: int = 4,
+                 timeout: Optional[float] = 30, use_server: bool = True):
+        """Initialize the wrapper
+
+        Args:
+            max_concurrency: Maximum commands in flight across all devices
+            per_device_concurrency: Maximum commands in flight per device
+            timeout: Default per-command timeout in seconds (None disables it)
+            use_server: Talk to the adb server socket instead of spawning adb
+        """
+        self.adb_path = ToolchainCache().find_adb()
+        if not self.adb_path:
+            raise ADBError("ADB not found in PATH. Please install Android SDK Platform Tools.")
+        self.host = os.environ.get("ANDROID_ADB_SERVER_ADDRESS", DEFAULT_HOST)
+        self.port = int(os.environ.get("ANDROID_ADB_SERVER_PORT", DEFAULT_PORT))
+        self.timeout = timeout
+        self.use_server = use_server and not os.environ.get("ADBH_NO_SERVER")
+        self.max_concurrency = max_concurrency
+        self.per_device_concurrency = per_device_concurrency
+        # Semaphores are created lazily so they bind to the running loop
+        self._global_slots: Optional[asyncio.Semaphore] = None
+        self._device_slots: Dict[Optional[str], asyncio.Semaphore] = {}
+        self._features: Dict[Optional[str], set] = {}
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, device_id: Optional[str]):
+        """Hold one per-device and one global concurrency slot
+
+        The device slot is taken first, so calls queued for a busy device do
+        not hold global slots that other devices could use.
+        """
+        if self._global_slots is None:
+            self._global_slots = asyncio.Semaphore(self.max_concurrency)
+        device_slots = self._device_slots.get(device_id)
+        if device_slots is None:
+            device_slots = self._device_slots[device_id] = asyncio.Semaphore(self.per_device_concurrency)
+        async with device_slots:
+            async with self._global_slots:
+                yield
+
+    # --- adb server socket ---------------------------------------------------
+
+    async def _open_server(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Open a connection to the adb server"""
+        try:
+            return await asyncio.open_connection(self.host, self.port)
+        except OSError as e:
+            raise ADBServerError(f"Cannot connect to adb server at {self.host}:{self.port}: {e}")
+
+    @staticmethod
+    async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, service: str):
+        """Send a service request and check the OKAY/FAIL reply"""
+        payload = service.encode("utf-8")
+        writer.write(b"%04x" % len(payload) + payload)
+        await writer.drain()
+        try:
+            status = await reader.readexactly(4)
+            if status == b"OKAY":
+                return
+            if status == b"FAIL":
+                length = int(await reader.readexactly(4), 16)
+                message = await reader.readexactly(length)
+                raise ADBServerCommandError(message.decode("utf-8", "replace"))
+        except asyncio.IncompleteReadError:
+            raise ADBServerError("Connection closed by adb server")
+        raise ADBServerError(f"Unexpected reply from adb server: {status!r}")
+
+    async def _host_command(self, service: str) -> str:
+        """Run a host service that replies with a single block"""
+        reader, writer = await self._open_server()
+        try:
+            await self._request(reader, writer, service)
+            length = int(await reader.readexactly(4), 16)
+            return (await reader.readexactly(length)).decode("utf-8", "replace")
+        finally:
+            writer.close()
+
+    async def _open_service(self, service: str, serial: Optional[str]
+                            ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Open a device service on a new server connection"""
+        reader, writer = await self._open_server()
+        try:
+            await self._request(reader, writer, f"host:transport:{serial}" if serial else "host:transport-any")
+            await self._request(reader, writer, service)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def _supports_shell_v2(self, serial: Optional[str]) -> bool:
+        """Check whether the device supports shell protocol v2 (cached)"""
+        if serial not in self._features:
+            service = f"host-serial:{serial}:features" if serial else "host:features"
+            self._features[serial] = set((await self._host_command(service)).strip().split(","))
+        return "shell_v2" in self._features[serial]
+
+    @staticmethod
+    async def _iter_shell_packets(reader: asyncio.StreamReader):
+        """Yield (packet id, payload) pairs from a shell v2 stream"""
+        while True:
+            try:
+                header = await reader.readexactly(SHELL_HEADER.size)
+            except asyncio.IncompleteReadError:
+                return
+            packet_id, length = SHELL_HEADER.unpack(header)
+            yield packet_id, await reader.readexactly(length) if length else b""
+
+    async def _server_shell(self, command: str, serial: Optional[str]) -> Optional[Tuple[str, str, int]]:
+        """Run a shell command over the server socket, or None if unsupported"""
+        if not await self._supports_shell_v2(serial):
+            return None
+        stdout = bytearray()
+        stderr = bytearray()
+        exit_code = 1
+        reader, writer = await self._open_service(f"shell,v2,raw:{command}", serial)
+        try:
+            async for packet_id, data in self._iter_shell_packets(reader):
+                if packet_id == SHELL_ID_STDOUT:
+                    stdout += data
+                elif packet_id == SHELL_ID_STDERR:
+                    stderr += data
+                elif packet_id == SHELL_ID_EXIT:
+                    exit_code = data[0] if data else 1
+                    break
+        except (OSError, asyncio.IncompleteReadError) as e:
+            # The command was already sent, so it must not be retried through adb
+            raise ADBServerLostError(f"Connection lost while running '{command}': {e}")
+        finally:
+            writer.close()
+        return stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace"), exit_code
+
+    # --- command execution ---------------------------------------------------
+
+    async def _run_subprocess(self, args: List[str], device_id: Optional[str]) -> Tuple[str, str, int]:
+        """Run an ADB command by spawning the adb binary"""
+        cmd = [self.adb_path]
+        if device_id:
+            cmd.extend(["-s", device_id])
+        cmd.extend(args)
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+        except Exception as e:
+            raise ADBError(f"Failed to run ADB command: {e}")
+
+        try:
+            stdout, stderr = await process.communicate()
+        except BaseException:
+            # Timeout or cancellation - don't leave adb running
+            if process.returncode is None:
+                with contextlib.suppress(ProcessLookupError):
+                    process.kill()
+                await process.wait()
+            raise
+        return stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace"), process.returncode
+
+    async def _dispatch(self, args: List[str], device_id: Optional[str]) -> Tuple[str, str, int]:
+        """Route a command to the server socket when possible, else to adb"""
+        if self.use_server:
+            serial, command = ADBWrapper._split_args(args, device_id)
+            try:
+                if command[:1] == ["devices"] and command[1:] in ([], ["-l"]):
+                    listing = await self._host_command("host:devices-l" if command[1:] else "host:devices")
+                    return f"List of devices attached\n{listing}\n", "", 0
+                if command[:1] == ["shell"] and len(command) > 1 and not command[1].startswith("-"):
+                    result = await self._server_shell(" ".join(command[1:]), serial)
+                    if result is not None:
+                        return result
+            except ADBServerCommandError as e:
+                return "", f"adb: error: {e}\n", 1
+            except ADBServerLostError as e:
+                raise ADBError(f"Connection lost during 'adb {' '.join(args)}', it may have run: {e}")
+            except (ADBServerError, OSError, asyncio.IncompleteReadError):
+                # Connect or handshake failed, nothing was run - the adb binary will start the server
+                pass
+        return await self._run_subprocess(args, device_id)
+
+    async def _run_command(self, args: List[str], device_id: Optional[str] = None,
+                           timeout=_DEFAULT_TIMEOUT) -> Tuple[str, str, int]:
+        """Run an ADB command and return output
+
+        Args:
+            args: adb arguments, optionally starting with "-s <serial>"
+            device_id: Target device
+            timeout: Override the default timeout for this call (None disables it)
+        """
+        serial, _ = ADBWrapper._split_args(args, device_id)
+        timeout = self.timeout if timeout is _DEFAULT_TIMEOUT else timeout
+        async with self._slot(serial):
+            try:
+                return await asyncio.wait_for(self._dispatch(args, device_id), timeout)
+            except asyncio.TimeoutError:
+                raise ADBTimeoutError(f"ADB command timed out: adb {' '.join(args)}")
+
+    async def stream(self, args: List[str], device_id: Optional[str] = None) -> AsyncIterator[str]:
+        """Run a long-lived ADB command (e.g. logcat) and yield its output lines
+
+        Closing the iterator or cancelling the consuming task kills the command.
+        Streams do not take a concurrency slot since they run until stopped.
+        """
+        cmd = [self.adb_path]
+        if device_id:
+            cmd.extend(["-s", device_id])
+        cmd.extend(args)
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+            )
+        except Exception as e:
+            raise ADBError(f"Failed to run ADB command: {e}")
+
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                yield line.decode("utf-8", "replace")
+            await process.wait()
+        finally:
+            if process.returncode is None:
+                with contextlib.suppress(ProcessLookupError):
+                    process.kill()
+                await process.wait()
+
+    # --- ADBWrapper API ------------------------------------------------------
+
+    async def get_devices(self) -> List[dict]:
+        """Get list of connected devices"""
+        stdout, stderr, code = await self._run_command(["devices", "-l"])
+
+        if code != 0:
+            raise ADBError(f"Failed to get devices: {stderr}")
+
+        return ADBWrapper._parse_devices(stdout)
+
+    async def get_device_property(self, property_name: str, device_id: Optional[str] = None) -> str:
+        """Get a device property"""
+        stdout, stderr, code = await self._run_command(["shell", "getprop", property_name], device_id)
+
+        if code != 0:
+            raise ADBError(f"Failed to get property {property_name}: {stderr}")
+
+        return stdout.strip()
+
+    async def shell(self, command: str, device_id: Optional[str] = None,
+                    timeout=_DEFAULT_TIMEOUT) -> Tuple[str, str, int]:
+        """Execute shell command on device"""
+        return await self._run_command(["shell", command], device_id, timeout)
+
+    async def push(self, local_path: str, remote_path: str, device_id: Optional[str] = None,
+                   timeout=_DEFAULT_TIMEOUT) -> bool:
+        """Push file to device"""
+        _, _, code = await self._run_command(["push", local_path, remote_path], device_id, timeout)
+        return code == 0
+
+    async def pull(self, remote_path: str, local_path: str, device_id: Optional[str] = None,
+                   timeout=_DEFAULT_TIMEOUT) -> bool:
+        """Pull file from device"""
+        _, _, code = await self._run_command(["pull", remote_path, local_path], device_id, timeout)
+        return code == 0
+
+    async def map_devices(self, device_ids: List[str],
+                          func: Callable[[str], Awaitable[T]]) -> Dict[str, object]:
+        """Run ``func(device_id)`` for every device concurrently
+
+        Returns a dict of device ID to result, or to the exception it raised.
+        """
+        results = await asyncio.gather(*(func(d) for d in device_ids), return_exceptions=True)
+        return dict(zip(device_ids, results))
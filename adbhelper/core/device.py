@@ -1,23 +1,162 @@
 """Device management and selection"""
 
-from typing import List, Optional
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
 from rich.console import Console
 from rich.table import Table
 from rich.prompt import Prompt
 from .adb import ADBWrapper, ADBError
+from .adb_socket import ADBServerError
+from .properties import DevicePropertyCache
+from .scheduler import DeviceScheduler
 
 console = Console()
 
+
+class DeviceRegistry:
+    """In-memory device table kept current by the adb server's track-devices stream
+    
+    The first lookup subscribes to ``host:track-devices-l``; after that every
+    ``list_devices()`` call is answered from memory. Listeners registered with
+    ``subscribe()`` are called with ("added" | "removed" | "changed", device)
+    as devices come and go. When tracking is unavailable, lookups fall back to
+    ``adb devices -l`` cached for ``ttl`` seconds.
+    """
+    
+    def __init__(self, adb: ADBWrapper, ttl: float = 2.0, track: bool = True):
+        self.adb = adb
+        self.ttl = ttl
+        self.track = track and adb.use_server
+        self._devices: Dict[str, dict] = {}
+        self._tracking = False
+        self._track_attempted = False
+        self._fetched_at: Optional[float] = None
+        self._listeners: List[Callable[[str, dict], None]] = []
+        self._lock = threading.Lock()
+        self._snapshot = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._sock: Optional[socket.socket] = None
+    
+    def subscribe(self, listener: Callable[[str, dict], None]):
+        """Register a callback for device change events"""
+        with self._lock:
+            self._listeners.append(listener)
+        self._start_tracking()
+    
+    def unsubscribe(self, listener: Callable[[str, dict], None]):
+        """Remove a previously registered callback"""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+    
+    def list_devices(self) -> List[dict]:
+        """Get the current device list without a round trip when tracking"""
+        self._start_tracking()
+        with self._lock:
+            if self._tracking or (self._fetched_at is not None and
+                                  time.monotonic() - self._fetched_at < self.ttl):
+                return [dict(d) for d in self._devices.values()]
+        
+        devices = self.adb.get_devices()
+        self._update(devices, fetched=True)
+        return [dict(d) for d in devices]
+    
+    def invalidate(self):
+        """Forget the cached list so the next lookup asks adb again (unless tracking)"""
+        with self._lock:
+            self._fetched_at = None
+    
+    def stop(self):
+        """Stop tracking devices"""
+        self.track = False
+        sock = self._sock
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    
+    def _start_tracking(self, wait: float = 1.0):
+        """Start the tracking thread and wait briefly for its first snapshot"""
+        if not self.track:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._track_loop, daemon=True)
+                self._thread.start()
+                self._snapshot.wait_for(lambda: self._tracking or self._track_attempted, timeout=wait)
+    
+    def _track_loop(self):
+        """Read device list updates from the server, reconnecting with backoff"""
+        backoff = 0.5
+        while self.track:
+            try:
+                self._sock = self.adb.server.open_tracker()
+                backoff = 0.5
+                while self.track:
+                    listing = self.adb.server.read_tracker_update(self._sock)
+                    self._update(ADBWrapper._parse_devices(f"List of devices attached\n{listing}"),
+                                 tracking=True)
+            except (ADBServerError, OSError):
+                pass
+            finally:
+                with self._lock:
+                    self._tracking = False
+                    self._track_attempted = True
+                    self._snapshot.notify_all()
+                if self._sock:
+                    self._sock.close()
+                    self._sock = None
+            
+            # Until the stream is back, lookups use the TTL-cached adb devices path
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 10)
+    
+    def _update(self, devices: List[dict], tracking: bool = False, fetched: bool = False):
+        """Replace the device table and notify listeners of the differences"""
+        events = []
+        with self._lock:
+            new = {d["id"]: d for d in devices}
+            for device_id, device in new.items():
+                old = self._devices.get(device_id)
+                if old is None:
+                    events.append(("added", device))
+                elif old != device:
+                    events.append(("changed", device))
+            for device_id, device in self._devices.items():
+                if device_id not in new:
+                    events.append(("removed", device))
+            
+            self._devices = new
+            if tracking:
+                self._tracking = True
+                self._snapshot.notify_all()
+            if fetched:
+                self._fetched_at = time.monotonic()
+            listeners = list(self._listeners)
+        
+        for event, device in events:
+            for listener in listeners:
+                try:
+                    listener(event, dict(device))
+                except Exception:
+                    pass
+
 class DeviceManager:
     """Manage multiple Android devices"""
     
     def __init__(self):
         self.adb = ADBWrapper()
+        self.registry = DeviceRegistry(self.adb)
+        self.properties = DevicePropertyCache(self.adb)
+        self.scheduler = DeviceScheduler(self.adb)
         self._selected_device = None
     
     def list_devices(self) -> List[dict]:
         """Get list of all connected devices"""
-        return self.adb.get_devices()
+        return self.registry.list_devices()
     
     def get_device_count(self) -> int:
         """Get number of connected devices"""
@@ -98,15 +237,16 @@ class DeviceManager:
         except:
             device_name = None
         
+        props = self.properties.get_properties(device_id)
         info = {
             "id": device_id,
             "device_name": device_name,
-            "serial": self.adb.get_device_property("ro.serialno", device_id),
-            "manufacturer": self.adb.get_device_property("ro.product.manufacturer", device_id),
-            "model": self.adb.get_device_property("ro.product.model", device_id),
-            "android_version": self.adb.get_device_property("ro.build.version.release", device_id),
-            "sdk_version": self.adb.get_device_property("ro.build.version.sdk", device_id),
-            "build_type": self.adb.get_device_property("ro.build.type", device_id),
+            "serial": props.get("ro.serialno", ""),
+            "manufacturer": props.get("ro.product.manufacturer", ""),
+            "model": props.get("ro.product.model", ""),
+            "android_version": props.get("ro.build.version.release", ""),
+            "sdk_version": props.get("ro.build.version.sdk", ""),
+            "build_type": props.get("ro.build.type", ""),
         }
         
         return info
@@ -0,0 +1,340 @@
+"""Indexed on-disk log archive
+
+An archive is a directory (``*.adbhlog``) of segments. Each segment has a
+data file of zlib-compressed blocks, holding raw ``logger_entry`` records
+exactly as ``logcat -B`` produced them, and an index file with one JSON line
+per block:
+
+    {"o": offset, "n": length, "c": records, "d": device,
+     "t0": first time, "t1": last time, "p0": min priority, "p1": max priority,
+     "tags": [...] or null, "pids": [...] or null}
+
+``tags`` and ``pids`` are null when a block holds too many distinct values
+to be worth listing. A query reads the small index files, skips every block
+whose summary rules it out, and decompresses only the rest.
+"""
+
+import heapq
+import json
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from .logcat import LogRecord, LogcatParser
+from .log_filter import LogFilter
+from ..utils.log_writer import parse_duration
+
+ARCHIVE_SUFFIX = ".adbhlog"
+
+# Uncompressed bytes collected per device before a block is written
+BLOCK_SIZE = 256 * 1024
+
+# Compressed bytes per segment before a new one is started
+SEGMENT_SIZE = 64 * 1024 * 1024
+
+# Distinct tags/pids listed in a block summary; more than this is stored as null
+MAX_INDEXED_VALUES = 64
+
+
+def parse_time(value: str) -> float:
+    """Parse a query time into seconds since the epoch
+
+    Accepts an age ("15m", "2h"), an epoch timestamp, "YYYY-MM-DD HH:MM[:SS]"
+    or logcat's "MM-DD HH:MM:SS[.mmm]" (current year), all in local time.
+    """
+    value = value.strip()
+    if value and value[-1] in "smhd" and value[:-1].replace(".", "", 1).isdigit():
+        return time.time() - parse_duration(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            pass
+    for fmt in ("%m-%d %H:%M:%S.%f", "%m-%d %H:%M:%S", "%m-%d %H:%M"):
+        try:
+            parsed = datetime.strptime(value, fmt).replace(year=datetime.now().year)
+            return parsed.timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid time: {value}")
+
+
+class _Block:
+    """Records of one device waiting to be compressed"""
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self.parts: List[bytes] = []
+        self.size = 0
+        self.count = 0
+        self.t0 = float("inf")
+        self.t1 = float("-inf")
+        self.p0 = 255
+        self.p1 = 0
+        self.tags = set()
+        self.pids = set()
+
+    def add(self, record: LogRecord):
+        raw = bytes(record.raw)
+        self.parts.append(raw)
+        self.size += len(raw)
+        self.count += 1
+        timestamp = record.timestamp
+        self.t0 = min(self.t0, timestamp)
+        self.t1 = max(self.t1, timestamp)
+        priority = record.priority
+        self.p0 = min(self.p0, priority)
+        self.p1 = max(self.p1, priority)
+        if self.tags is not None:
+            self.tags.add(record.tag)
+            if len(self.tags) > MAX_INDEXED_VALUES:
+                self.tags = None
+        if self.pids is not None:
+            self.pids.add(record.pid)
+            if len(self.pids) > MAX_INDEXED_VALUES:
+                self.pids = None
+
+    def summary(self) -> dict:
+        return {
+            "c": self.count, "d": self.device_id,
+            "t0": self.t0, "t1": self.t1, "p0": self.p0, "p1": self.p1,
+            "tags": sorted(self.tags) if self.tags is not None else None,
+            "pids": sorted(self.pids) if self.pids is not None else None,
+        }
+
+
+class LogArchiveWriter:
+    """Appends records to an archive, compressing blocks on a background thread"""
+
+    def __init__(self, path: str, block_size: int = BLOCK_SIZE, segment_size: int = SEGMENT_SIZE):
+        """Create (or append to) an archive directory
+
+        Args:
+            path: Archive directory, usually ending in .adbhlog
+            block_size: Uncompressed bytes per block
+            segment_size: Compressed bytes per segment file
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.block_size = block_size
+        self.segment_size = segment_size
+        self.records = 0
+
+        self._blocks: Dict[str, _Block] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[_Block]]" = queue.Queue(maxsize=16)
+        self._closed = False
+        self._error: Optional[BaseException] = None
+
+        existing = sorted(self.path.glob("seg-*.dat"))
+        self._segment = int(existing[-1].stem[4:]) if existing else 0
+        self._data = None
+        self._index = None
+        self._open_segment(new=not existing)
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def name(self) -> str:
+        return str(self.path)
+
+    def _open_segment(self, new: bool = True):
+        if new:
+            self._segment += 1
+        stem = self.path / f"seg-{self._segment:06d}"
+        self._data = open(stem.with_suffix(".dat"), "ab")
+        self._index = open(stem.with_suffix(".idx"), "a")
+
+    def add(self, device_id: str, record: LogRecord):
+        """Queue a record for the archive"""
+        if self._error is not None:
+            raise IOError(f"Log archive failed: {self._error}")
+        with self._lock:
+            if self._closed:
+                return
+            block = self._blocks.get(device_id)
+            if block is None:
+                block = self._blocks[device_id] = _Block(device_id)
+            block.add(record)
+            self.records += 1
+            if block.size < self.block_size:
+                return
+            del self._blocks[device_id]
+        self._queue.put(block)
+
+    def _write_block(self, block: _Block):
+        data = zlib.compress(b"".join(block.parts), 6)
+        if self._data.tell() and self._data.tell() + len(data) > self.segment_size:
+            self._data.close()
+            self._index.close()
+            self._open_segment()
+        entry = {"o": self._data.tell(), "n": len(data)}
+        entry.update(block.summary())
+        self._data.write(data)
+        self._data.flush()
+        # The index line goes last, so a crash never indexes a partial block
+        self._index.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._index.flush()
+
+    def _run(self):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                return
+            try:
+                self._write_block(block)
+            except BaseException as e:
+                self._error = e
+
+    def close(self):
+        """Write all partially filled blocks and close the archive
+
+        Raises IOError if any block could not be written.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            blocks = list(self._blocks.values())
+            self._blocks.clear()
+        for block in blocks:
+            self._queue.put(block)
+        self._queue.put(None)
+        self._thread.join()
+        self._data.close()
+        self._index.close()
+        if self._error is not None:
+            raise IOError(f"Log archive failed: {self._error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class LogArchive:
+    """Read side of an archive"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        if not self.path.is_dir():
+            raise FileNotFoundError(f"Log archive not found: {path}")
+        # Block counts of the last query, to show how much the index saved
+        self.blocks_total = 0
+        self.blocks_read = 0
+
+    def blocks(self) -> Iterator[Tuple[Path, dict]]:
+        """Yield (data file, block summary) for every indexed block"""
+        for index_file in sorted(self.path.glob("seg-*.idx")):
+            data_file = index_file.with_suffix(".dat")
+            with open(index_file) as f:
+                for line in f:
+                    try:
+                        yield data_file, json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn last line from an interrupted write
+                        continue
+
+    def devices(self) -> List[str]:
+        """Devices with records in the archive"""
+        return sorted({entry["d"] for _, entry in self.blocks()})
+
+    @staticmethod
+    def _read_block(data_file: Path, entry: dict) -> List[LogRecord]:
+        with open(data_file, "rb") as f:
+            f.seek(entry["o"])
+            data = zlib.decompress(f.read(entry["n"]))
+        return LogcatParser().feed(data)
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None,
+              log_filter: Optional[LogFilter] = None,
+              devices: Optional[List[str]] = None) -> Iterator[Tuple[str, LogRecord, str]]:
+        """Yield (device, record, formatted text) for matching records in time order
+
+        Only blocks whose index summary could match are read. Blocks whose
+        time ranges overlap (e.g. from different devices) are merged.
+        """
+        log_filter = log_filter or LogFilter()
+        hints = log_filter.index_hints()
+        candidates = []
+        self.blocks_total = 0
+        for data_file, entry in self.blocks():
+            self.blocks_total += 1
+            if since is not None and entry["t1"] < since:
+                continue
+            if until is not None and entry["t0"] > until:
+                continue
+            if devices and entry["d"] not in devices:
+                continue
+            if not _block_may_match(entry, hints):
+                continue
+            candidates.append((entry["t0"], entry["t1"], data_file, entry))
+        candidates.sort(key=lambda c: (c[0], c[1]))
+        self.blocks_read = len(candidates)
+
+        # Sweep over groups of blocks whose time ranges overlap
+        group: List[tuple] = []
+        group_end = float("-inf")
+        for candidate in candidates + [None]:
+            if candidate is not None and (not group or candidate[0] <= group_end):
+                group.append(candidate)
+                group_end = max(group_end, candidate[1])
+                continue
+            streams = [self._block_matches(c[2], c[3], since, until, log_filter) for c in group]
+            yield from heapq.merge(*streams, key=_match_time)
+            if candidate is not None:
+                group = [candidate]
+                group_end = candidate[1]
+
+    def _block_matches(self, data_file: Path, entry: dict, since: Optional[float],
+                       until: Optional[float], log_filter: LogFilter) -> List[Tuple[str, LogRecord, str]]:
+        """A block's matching records, sorted by timestamp
+
+        Blocks hold records in arrival order, which interleaves logcat
+        buffers slightly out of time order; the merge needs sorted input.
+        """
+        device_id = entry["d"]
+        matches = []
+        for record in self._read_block(data_file, entry):
+            timestamp = record.timestamp
+            if since is not None and timestamp < since:
+                continue
+            if until is not None and timestamp > until:
+                continue
+            text = log_filter.apply(record)
+            if text is not None:
+                matches.append((device_id, record, text))
+        matches.sort(key=_match_time)
+        return matches
+
+
+def _match_time(match: Tuple[str, LogRecord, str]) -> float:
+    return match[1].timestamp
+
+
+def _block_may_match(entry: dict, hints: dict) -> bool:
+    """Check a block summary against the filter's index hints"""
+    tags = hints.get("tags")
+    if tags and entry["tags"] is not None and not tags.intersection(entry["tags"]):
+        return False
+    min_priority = hints.get("min_priority")
+    if min_priority is not None and entry["p1"] < min_priority:
+        return False
+    pids = hints.get("pids")
+    if pids and entry["pids"] is not None and not pids.intersection(entry["pids"]):
+        return False
+    return True
+
+
+def find_archives(directory: str) -> List[Path]:
+    """List archives in a directory, oldest first"""
+    return sorted(Path(directory).glob(f"*{ARCHIVE_SUFFIX}"))
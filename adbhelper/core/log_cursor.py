@@ -0,0 +1,175 @@
+"""Per-device log cursors for incremental dumps
+
+A cursor records where the last ``log dump --since-last`` of a device ended:
+the timestamp of its newest entry plus hashes of every entry logged at that
+exact timestamp. The next dump asks logcat for entries from that time on
+(``-T``), and the entries at the boundary, which logcat sends again, are
+recognised by their hash and dropped. Only what is new crosses the wire.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from .logcat import LogRecord
+
+# Devices (and filter combinations) remembered before the oldest are dropped
+MAX_CURSORS = 200
+
+# First SDK whose logcat accepts -T as seconds since the epoch
+EPOCH_TIME_SDK = 24
+
+
+def record_hash(record: LogRecord) -> str:
+    """Stable short hash of a raw entry"""
+    return hashlib.blake2b(record.raw, digest_size=8).hexdigest()
+
+
+def cursor_key(device_id: str, filter: Iterable[str] = ()) -> str:
+    """Cursor name for a device and filter combination
+
+    A filtered dump only advances its own cursor, so it never hides entries
+    from a later dump with different filters.
+    """
+    terms = sorted(filter)
+    return f"{device_id} {' '.join(terms)}" if terms else device_id
+
+
+class LogCursor:
+    """Position after the last entry of a dump, and tracking of the next one"""
+
+    def __init__(self, position: Tuple[int, int] = (0, 0), hashes: Iterable[str] = ()):
+        """Initialize the cursor
+
+        Args:
+            position: (sec, nsec) of the newest entry already dumped
+            hashes: Hashes of the entries logged at exactly that time
+        """
+        self.position = tuple(position)
+        self.hashes = set(hashes)
+        self.skipped = 0
+        self._last = self.position
+        self._boundary: List[LogRecord] = []
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogCursor":
+        return cls((data.get("sec", 0), data.get("nsec", 0)), data.get("hashes", ()))
+
+    def to_dict(self) -> dict:
+        """The cursor after every record passed to ``advance``"""
+        if self._boundary:
+            hashes = sorted({record_hash(record) for record in self._boundary})
+            if self._last == self.position:
+                hashes = sorted(self.hashes.union(hashes))
+        else:
+            hashes = sorted(self.hashes)
+        return {"sec": self._last[0], "nsec": self._last[1], "hashes": hashes}
+
+    def checkpoint(self):
+        """Make everything passed to ``advance`` the new starting point
+
+        Used to resume a live stream: the next ``seen`` checks run against
+        the newest record so far instead of the position the cursor was
+        created with.
+        """
+        data = self.to_dict()
+        self.position = (data["sec"], data["nsec"])
+        self.hashes = set(data["hashes"])
+        self._last = self.position
+        self._boundary = []
+
+    def logcat_args(self, sdk: int) -> List[str]:
+        """logcat options starting the dump at the cursor
+
+        Older logcat only takes local "MM-DD hh:mm:ss" times, which depend on
+        the device's time zone; those devices dump everything and rely on
+        ``seen`` alone.
+        """
+        if self.position == (0, 0) or sdk < EPOCH_TIME_SDK:
+            return []
+        return ["-T", f"{self.position[0]}.{self.position[1]:09d}"]
+
+    def seen(self, record: LogRecord) -> bool:
+        """Whether a record was already part of an earlier dump"""
+        position = (record.sec, record.nsec)
+        if position > self.position:
+            return False
+        if position < self.position or record_hash(record) in self.hashes:
+            self.skipped += 1
+            return True
+        return False
+
+    def advance(self, record: LogRecord):
+        """Move the cursor past a newly dumped record"""
+        position = (record.sec, record.nsec)
+        if position > self._last:
+            self._last = position
+            self._boundary = [record]
+        elif position == self._last:
+            self._boundary.append(record)
+
+
+class LogCursorStore:
+    """Log cursors kept in a JSON file on the host"""
+
+    def __init__(self, cache_file: Optional[str] = None):
+        """Initialize the store
+
+        Args:
+            cache_file: Path to cursor file. Defaults to ~/.adbhelper_log_cursors.json
+        """
+        if cache_file is None:
+            self.cache_file = Path.home() / ".adbhelper_log_cursors.json"
+        else:
+            self.cache_file = Path(cache_file)
+        self._cursors: Optional[Dict[str, dict]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, dict]:
+        """Load the cursor file (once per process)"""
+        if self._cursors is None:
+            try:
+                with open(self.cache_file, 'r') as f:
+                    data = json.load(f)
+                self._cursors = data if isinstance(data, dict) else {}
+            except (json.JSONDecodeError, IOError):
+                self._cursors = {}
+        return self._cursors
+
+    def _save(self):
+        """Write the cursor file, keeping only the most recently used cursors"""
+        cursors = self._load()
+        while len(cursors) > MAX_CURSORS:
+            cursors.pop(next(iter(cursors)))
+        tmp_file = None
+        try:
+            # A unique temp file, so concurrent CLI processes never write the same one
+            with tempfile.NamedTemporaryFile('w', dir=self.cache_file.parent, prefix=self.cache_file.name,
+                                             suffix=".tmp", delete=False) as f:
+                tmp_file = f.name
+                json.dump(cursors, f)
+            os.replace(tmp_file, self.cache_file)
+        except IOError:
+            if tmp_file:
+                try:
+                    os.remove(tmp_file)
+                except OSError:
+                    pass
+
+    def get(self, key: str) -> LogCursor:
+        """Cursor for a key (an empty cursor if there is none yet)"""
+        with self._lock:
+            data = self._load().get(key)
+        return LogCursor.from_dict(data) if isinstance(data, dict) else LogCursor()
+
+    def put(self, key: str, cursor: LogCursor):
+        """Store a cursor after a successful dump"""
+        with self._lock:
+            cursors = self._load()
+            # Re-insert so the most recently used cursors are trimmed last
+            cursors.pop(key, None)
+            cursors[key] = cursor.to_dict()
+            self._save()
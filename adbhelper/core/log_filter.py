@@ -0,0 +1,353 @@
+"""Log filters compiled once per session
+
+A filter is built from the ``-f`` values given on the command line:
+
+    text            line contains text
+    re:PATTERN      line matches a regular expression
+    msg:PATTERN     message (without the header) matches a regular expression
+    tag:NAME        record tag is NAME
+    level:W         record priority is W or higher (V, D, I, W, E, F)
+    pid:1234        record comes from process 1234
+    uid:10123       record comes from uid 10123
+    package:NAME    record comes from a running process of the package
+    buffer:main,crash
+                    record comes from one of these log buffers
+    !TERM           any of the above (except buffer:), negated
+
+Positive terms of the same kind are OR'd and different kinds are AND'd, so
+``-f tag:Wifi -f tag:Net -f level:W`` keeps warnings from either tag. Plain
+text and regex terms form one kind, which keeps the old behaviour of
+matching any of several ``-f`` strings. A negated term drops every line it
+matches.
+
+Structured terms are checked first against lazily decoded LogRecords, so
+most lines are rejected without ever being formatted. ``pushdown`` goes one
+step further and turns what logcat can evaluate itself (filterspecs,
+``--pid``, ``--uid``, ``-e`` and ``-b``) into device-side options, so those
+lines are never sent to the host at all.
+"""
+
+import copy
+import re
+from typing import Callable, Iterable, List, Optional, Pattern, Set, Tuple
+from .logcat import LogRecord, BUFFER_IDS, parse_priority, priority_letter
+
+
+class LogFilterError(ValueError):
+    """A filter term could not be parsed"""
+    pass
+
+
+class TextMatcher:
+    """Matches a line against a set of substrings and regexes in one pass
+
+    ``search(line)`` returns a truthy value if any of them occurs in the line.
+    """
+
+    def __init__(self, substrings: Iterable[str] = (), patterns: Iterable[str] = ()):
+        # Longest first so the alternation prefers the most specific literal
+        self.substrings = sorted(set(substrings), key=len, reverse=True)
+        self.patterns = list(patterns)
+        self._regex: Optional[Pattern] = None
+
+        # A single literal is fastest with ``in``; for anything more one compiled
+        # alternation scans the line once in C instead of once per substring
+        if len(self.substrings) == 1 and not self.patterns:
+            substring = self.substrings[0]
+            self.search = lambda line: substring in line
+        elif self:
+            parts = [re.escape(s) for s in self.substrings]
+            parts.extend(f"(?:{p})" for p in self.patterns)
+            try:
+                self._regex = re.compile("|".join(parts))
+            except re.error as e:
+                raise LogFilterError(f"Invalid regular expression: {e}")
+            self.search = self._regex.search
+        else:
+            self.search = lambda line: True
+
+    def __bool__(self) -> bool:
+        return bool(self.substrings or self.patterns)
+
+
+class _Terms:
+    """Parsed terms of one polarity (kept or dropped)"""
+
+    def __init__(self):
+        self.substrings: List[str] = []
+        self.patterns: List[str] = []
+        self.messages: List[str] = []
+        self.tags: Set[str] = set()
+        self.min_priority: Optional[int] = None
+        self.pids: Set[int] = set()
+        self.uids: Set[int] = set()
+        self.packages: List[str] = []
+        self.buffers: List[str] = []
+
+
+class LogFilter:
+    """A set of filter terms compiled for repeated matching"""
+
+    def __init__(self, terms: Iterable[str] = (),
+                 resolve_package: Optional[Callable[[str], Iterable[int]]] = None):
+        """Compile the filter
+
+        Args:
+            terms: ``-f`` values, see the module docstring for the syntax
+            resolve_package: Returns the pids of a package's running processes,
+                needed for ``package:`` terms
+        """
+        self.terms = tuple(terms)
+        include, exclude = _Terms(), _Terms()
+        for term in self.terms:
+            if term.startswith("!") and len(term) > 1:
+                self._parse(term[1:], exclude)
+            else:
+                self._parse(term, include)
+
+        for terms in (include, exclude):
+            if terms.packages:
+                if resolve_package is None:
+                    raise LogFilterError("package: filters need a device to resolve process ids")
+                for package in terms.packages:
+                    terms.pids.update(resolve_package(package))
+                if not terms.pids:
+                    # Package not running: match nothing rather than everything
+                    terms.pids.add(-1)
+        if exclude.buffers:
+            raise LogFilterError("buffer: filters cannot be negated")
+
+        self._tags = include.tags
+        self._min_priority = include.min_priority
+        self._pids = include.pids
+        self._uids = include.uids
+        self._lids = {BUFFER_IDS[name] for name in include.buffers}
+        self._buffers = include.buffers
+        self._text = TextMatcher(include.substrings, include.patterns)
+        self._message = TextMatcher(patterns=include.messages)
+        self._exclude_tags = exclude.tags
+        self._exclude_pids = exclude.pids
+        self._exclude_uids = exclude.uids
+        # "!level:W" drops W and above, i.e. keeps only lower priorities
+        self._max_priority = exclude.min_priority
+        self._exclude_text = TextMatcher(exclude.substrings, exclude.patterns)
+        self._exclude_message = TextMatcher(patterns=exclude.messages)
+        self._update_structured()
+
+    def _update_structured(self):
+        self.structured = bool(self._tags or self._pids or self._uids or self._lids
+                               or self._min_priority is not None or self._max_priority is not None
+                               or self._exclude_tags or self._exclude_pids or self._exclude_uids
+                               or self._message or self._exclude_message)
+
+    @staticmethod
+    def _parse(term: str, terms: _Terms):
+        kind, sep, value = term.partition(":")
+        if not sep or not value:
+            terms.substrings.append(term)
+        elif kind == "re":
+            terms.patterns.append(value)
+        elif kind == "msg":
+            terms.messages.append(value)
+        elif kind == "tag":
+            terms.tags.add(value)
+        elif kind in ("level", "priority"):
+            try:
+                priority = parse_priority(value)
+            except ValueError as e:
+                raise LogFilterError(str(e))
+            if terms.min_priority is None or priority < terms.min_priority:
+                terms.min_priority = priority
+        elif kind in ("pid", "uid"):
+            try:
+                (terms.pids if kind == "pid" else terms.uids).add(int(value))
+            except ValueError:
+                raise LogFilterError(f"Invalid {kind}: {value}")
+        elif kind == "package":
+            terms.packages.append(value)
+        elif kind == "buffer":
+            for name in value.split(","):
+                if name not in BUFFER_IDS:
+                    raise LogFilterError(f"Unknown log buffer: {name}")
+                terms.buffers.append(name)
+        else:
+            # Not a filter prefix (e.g. "http://..." or "Foo: bar"): plain text
+            terms.substrings.append(term)
+
+    def __bool__(self) -> bool:
+        return bool(self.terms)
+
+    def pushdown(self, sdk: int = 0) -> Tuple[List[str], "LogFilter"]:
+        """Split the filter into logcat options and what is left for the host
+
+        Args:
+            sdk: Device API level, which decides the logcat options available
+
+        Returns:
+            (logcat arguments, filter to apply to what the device sends)
+        """
+        args: List[str] = []
+        host = copy.copy(self)
+
+        for name in self._buffers:
+            args.extend(["-b", name])
+        host._lids = set()
+
+        # --pid takes a single pid (N+); several pids stay on the host
+        if len(self._pids) == 1 and sdk >= 24:
+            args.append(f"--pid={next(iter(self._pids))}")
+            host._pids = set()
+
+        if self._uids and sdk >= 29:
+            args.append("--uid=" + ",".join(str(uid) for uid in sorted(self._uids)))
+            host._uids = set()
+
+        # -e matches the message with std::regex (N+); only one is allowed
+        if self._message and not self._exclude_message and sdk >= 24:
+            args.extend(["-e", "|".join(f"(?:{p})" for p in self._message.patterns)])
+            host._message = TextMatcher()
+
+        # Filterspecs: "Tag:P ... *:S" for tags, "*:P" for a bare priority
+        specs = []
+        pushable_tags = all(_spec_safe(tag) for tag in self._tags | self._exclude_tags)
+        priority = priority_letter(self._min_priority) if self._min_priority is not None else "V"
+        if pushable_tags:
+            specs.extend(f"{tag}:S" for tag in sorted(self._exclude_tags))
+            if self._tags:
+                specs.extend(f"{tag}:{priority}" for tag in sorted(self._tags - self._exclude_tags))
+                specs.append("*:S")
+            elif self._exclude_tags or self._min_priority is not None:
+                specs.append(f"*:{priority}")
+            host._tags = set()
+            host._exclude_tags = set()
+            host._min_priority = None
+        elif self._min_priority is not None:
+            specs.append(f"*:{priority}")
+            host._min_priority = None
+        args.extend(specs)
+
+        host._update_structured()
+        return args, host
+
+    def index_hints(self) -> dict:
+        """Conditions every kept record must meet, for skipping indexed blocks
+
+        Returns a dict with "tags" and "pids" (sets, empty when unrestricted)
+        and "min_priority" (or None).
+        """
+        return {
+            "tags": set(self._tags - self._exclude_tags),
+            "pids": set(self._pids - self._exclude_pids),
+            "min_priority": self._min_priority,
+        }
+
+    def _record_allowed(self, record: LogRecord) -> bool:
+        """Check the structured terms, decoding only the fields they need"""
+        if self._lids and record.lid not in self._lids:
+            return False
+        if self._min_priority is not None or self._max_priority is not None:
+            priority = record.priority
+            if self._min_priority is not None and priority < self._min_priority:
+                return False
+            if self._max_priority is not None and priority >= self._max_priority:
+                return False
+        if self._pids or self._exclude_pids:
+            pid = record.pid
+            if self._pids and pid not in self._pids:
+                return False
+            if pid in self._exclude_pids:
+                return False
+        if self._uids or self._exclude_uids:
+            uid = record.uid
+            if self._uids and uid not in self._uids:
+                return False
+            if uid in self._exclude_uids:
+                return False
+        if self._tags or self._exclude_tags:
+            tag = record.tag
+            if self._tags and tag not in self._tags:
+                return False
+            if tag in self._exclude_tags:
+                return False
+        if self._message and not self._message.search(record.message):
+            return False
+        if self._exclude_message and self._exclude_message.search(record.message):
+            return False
+        return True
+
+    def match_line(self, line: str) -> bool:
+        """Check a plain text line (structured terms are ignored)"""
+        if self._text and not self._text.search(line):
+            return False
+        if self._exclude_text and self._exclude_text.search(line):
+            return False
+        return True
+
+    def matches(self, record: LogRecord) -> bool:
+        """Filter a record, formatting it only if text terms need the line"""
+        if self.structured and not self._record_allowed(record):
+            return False
+        if self._text or self._exclude_text:
+            return self.match_line(record.format())
+        return True
+
+    def apply(self, record: LogRecord) -> Optional[str]:
+        """Filter a record, returning its formatted text if kept or None if dropped"""
+        if self.structured and not self._record_allowed(record):
+            return None
+        line = record.format()
+        if not self.match_line(line):
+            return None
+        return line
+
+
+def _spec_safe(tag: str) -> bool:
+    """Check whether a tag can be written in a logcat filterspec"""
+    return bool(tag) and ":" not in tag and not any(c.isspace() for c in tag) and tag != "*"
+
+
+def package_resolver(adb, device_id: str) -> Callable[[str], List[int]]:
+    """Build a resolve_package callback that looks up pids with ``pidof``"""
+    def resolve(package: str) -> List[int]:
+        stdout, _, code = adb._run_command(["-s", device_id, "shell", f"pidof {package}"])
+        if code != 0:
+            return []
+        return [int(pid) for pid in stdout.split() if pid.isdigit()]
+    return resolve
+
+
+def benchmark(corpus: str, terms: Iterable[str], rounds: int = 3) -> dict:
+    """Measure filter throughput on a recorded ``adb exec-out logcat -B`` capture
+
+    Returns a dict with the record count, kept count and records per second
+    (best of ``rounds``).
+    """
+    import time
+    from .logcat import LogcatParser
+
+    with open(corpus, "rb") as f:
+        records = LogcatParser().feed(f.read())
+    log_filter = LogFilter(terms, resolve_package=lambda package: [])
+    best = None
+    kept = 0
+    for _ in range(rounds):
+        # Fresh records each round so lazily decoded fields are not reused
+        fresh = [LogRecord(r._data, r._start, r._end, r._header_size) for r in records]
+        start = time.perf_counter()
+        kept = sum(1 for record in fresh if log_filter.apply(record) is not None)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "records": len(records),
+        "kept": kept,
+        "records_per_second": len(records) / best if best else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m adbhelper.core.log_filter CORPUS [FILTER ...]")
+    result = benchmark(sys.argv[1], sys.argv[2:])
+    print(f"{result['records']} records, {result['kept']} kept, "
+          f"{result['records_per_second']:,.0f} records/s")
@@ -0,0 +1,205 @@
+"""Live logcat streams that survive disconnects
+
+A wireless device that drops off the network ends its logcat stream. A
+LogcatFollower notices this, retries with exponential backoff until the
+device answers again, and resumes with ``logcat -T`` from the newest entry
+it has seen. logcat repeats the entries at that timestamp; the LogCursor
+recognises them and drops them, so nothing is shown twice.
+
+If the device's buffer no longer holds that entry, because it wrapped while
+the device was away or because the device rebooted, the first entry after
+the reconnect is newer than the cursor. Entries between the two are gone,
+and a gap notice says so.
+"""
+
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple, Union
+from .adb import ADBWrapper, ADBError
+from .adb_socket import ADBServerError
+from .logcat import LogRecord, LogcatParser, LogcatFormatError, logcat_command
+from .log_cursor import LogCursor
+from .stream import CommandStream
+
+# Seconds before the first reconnect attempt, doubled up to MAX_RECONNECT_DELAY
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+
+
+def _clock(timestamp: float) -> str:
+    """"MM-DD HH:MM:SS.mmm" in local time, like logcat"""
+    return time.strftime("%m-%d %H:%M:%S", time.localtime(timestamp)) + f".{int(timestamp * 1000) % 1000:03d}"
+
+
+class StreamNotice:
+    """A change in a followed stream, delivered between its records
+
+    ``kind`` is "disconnected", "resumed" or "gap". For a gap, ``lost_from``
+    and ``lost_to`` bound the time whose entries were lost.
+    """
+
+    __slots__ = ("device_id", "kind", "timestamp", "lost_from", "lost_to", "detail")
+
+    def __init__(self, device_id: str, kind: str, lost_from: Optional[float] = None,
+                 lost_to: Optional[float] = None, detail: str = ""):
+        self.device_id = device_id
+        self.kind = kind
+        self.timestamp = time.time()
+        self.lost_from = lost_from
+        self.lost_to = lost_to
+        self.detail = detail
+
+    def __str__(self) -> str:
+        if self.kind == "disconnected":
+            reason = f" ({self.detail})" if self.detail else ""
+            return f"--- {self.device_id}: log stream lost{reason}, reconnecting ---"
+        if self.kind == "gap":
+            return (f"--- {self.device_id}: log stream resumed; entries between "
+                    f"{_clock(self.lost_from)} and {_clock(self.lost_to)} are lost ---")
+        return f"--- {self.device_id}: log stream resumed, no entries lost ---"
+
+
+class LogcatFollower:
+    """Follows one device's binary logcat across disconnects"""
+
+    def __init__(self, adb: ADBWrapper, device_id: str, args: Optional[List[str]] = None,
+                 sdk: int = 0, max_delay: float = MAX_RECONNECT_DELAY):
+        """Initialize the follower
+
+        Args:
+            adb: ADB wrapper used to open the stream
+            device_id: Device to follow
+            args: Extra logcat options (filters, buffers)
+            sdk: Device API level; -T resumes need 24+, older devices re-read
+                their buffer and rely on the cursor alone
+            max_delay: Longest wait between reconnect attempts
+        """
+        self.adb = adb
+        self.device_id = device_id
+        self.args = list(args or [])
+        self.sdk = sdk
+        self.max_delay = max_delay
+        self.cursor = LogCursor()
+        self.reconnects = 0
+        self._stopped = False
+        self._wake = threading.Event()
+        self._stream: Optional[CommandStream] = None
+        self._parser = LogcatParser()
+        self._received = False
+        self._lost_at: Optional[float] = None
+        self._delay = RECONNECT_DELAY
+
+    def stop(self):
+        """Stop following; a blocked ``records`` iteration ends shortly after"""
+        self._stopped = True
+        self._wake.set()
+        stream = self._stream
+        if stream is not None:
+            stream.close()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    @property
+    def stream(self) -> Optional[CommandStream]:
+        """The current logcat stream, if connected"""
+        return self._stream
+
+    def records(self) -> Iterator[Union[LogRecord, StreamNotice]]:
+        """Yield records, and StreamNotices when the stream drops or resumes
+
+        Only ends after ``stop``; closing the generator also stops logcat.
+        """
+        for batch in self.batches():
+            if isinstance(batch, StreamNotice):
+                yield batch
+            else:
+                yield from batch
+
+    def batches(self) -> Iterator[Union[List[LogRecord], StreamNotice]]:
+        """Like ``records``, but yield the new records of each chunk as one list"""
+        while not self._stopped:
+            error = ""
+            try:
+                stream = self.connect()
+                try:
+                    for chunk in stream.chunks():
+                        notice, records = self.process(chunk)
+                        if notice is not None:
+                            yield notice
+                        if records:
+                            yield records
+                finally:
+                    self._stream = None
+                    stream.close()
+            except (ADBError, ADBServerError, OSError, LogcatFormatError) as e:
+                error = str(e)
+            if self._stopped:
+                return
+            notice = self.disconnected(error)
+            if notice is not None:
+                yield notice
+            self._wake.wait(self.next_delay())
+
+    # The steps of ``batches``, also driven by a selector in LogcatSelector
+
+    def connect(self) -> CommandStream:
+        """Open logcat, resuming after the newest record seen so far"""
+        stream = self.adb.stream(logcat_command(self.cursor.logcat_args(self.sdk) + self.args), self.device_id)
+        self._stream = stream
+        self._parser = LogcatParser()
+        self._received = False
+        if self._stopped:
+            stream.close()
+        return stream
+
+    def process(self, chunk: bytes) -> Tuple[Optional[StreamNotice], List[LogRecord]]:
+        """Parse a chunk of the current stream
+
+        Returns a notice if this is the first data after a reconnect, and the
+        records not seen before.
+        """
+        records = self._parser.feed(chunk)
+        notice = None
+        if records and not self._received:
+            self._received = True
+            self._delay = RECONNECT_DELAY
+            if self._lost_at is not None:
+                notice = self._resume_notice(records[0])
+                self._lost_at = None
+        cursor = self.cursor
+        fresh = []
+        for record in records:
+            if not cursor.seen(record):
+                cursor.advance(record)
+                fresh.append(record)
+        return notice, fresh
+
+    def disconnected(self, error: str = "") -> Optional[StreamNotice]:
+        """Note that the stream ended on its own (the device went away or logcat died)
+
+        Returns a notice the first time for each outage.
+        """
+        self._stream = None
+        self.cursor.checkpoint()
+        if self._lost_at is None:
+            self._lost_at = time.time()
+            return StreamNotice(self.device_id, "disconnected", detail=error)
+        return None
+
+    def next_delay(self) -> float:
+        """Seconds to wait before the next reconnect attempt (backing off)"""
+        delay = self._delay
+        self._delay = min(delay * 2, self.max_delay)
+        self.reconnects += 1
+        return delay
+
+    def _resume_notice(self, record: LogRecord) -> StreamNotice:
+        """Notice for the first record after a reconnect"""
+        cursor = self.cursor
+        if cursor.position != (0, 0) and (record.sec, record.nsec) > cursor.position:
+            # logcat -T would have repeated our last entry if the device still had it
+            last = cursor.position[0] + cursor.position[1] / 1e9
+            return StreamNotice(self.device_id, "gap", lost_from=last, lost_to=record.timestamp)
+        return StreamNotice(self.device_id, "resumed")
@@ -0,0 +1,299 @@
+"""Timestamp-ordered merge of several devices' log streams
+
+Readers deliver lines in arrival order, which interleaves devices by
+whoever's USB or Wi-Fi link happened to be faster. LogMerger holds every
+entry for a short reorder window and releases entries in timestamp order, so
+the combined stream follows event time. A longer window tolerates more skew
+between devices at the cost of display latency; a window of 0 passes entries
+through in arrival order.
+
+Held entries live in a fixed-size ring per device, kept in timestamp order
+(an entry is inserted from the tail, which is cheap as logcat is nearly in
+order already). A heap keyed on each ring's head picks the next entry, so a
+release costs O(log devices). Since rings are bounded, a device that logs
+faster than the output can take never grows host memory. What happens when
+a ring is full is the overflow policy:
+
+    block         the reader waits, which pushes back through adb to logd
+    drop-oldest   the earliest held entry of that device is discarded
+    sample        only every SAMPLE_EVERY-th new entry is kept (replacing
+                  the earliest) until the ring has room again
+
+Discarded entries are counted per device in ``dropped``. A reader serving
+several devices from one thread asks ``room`` how much of a device it may
+read, so it never blocks in ``push`` and under block only that device waits.
+With decoding in worker processes all devices share one result queue, and a
+full ring there holds back every device.
+"""
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Seconds each entry is held back waiting for earlier entries from other devices
+REORDER_WINDOW = 0.05
+
+# Entries held per device before the overflow policy applies
+RING_CAPACITY = 10000
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "sample")
+
+# With the sample policy, one in this many entries is kept while a ring is full
+SAMPLE_EVERY = 10
+
+# With the block policy, ring slots ``room`` keeps back for notices pushed
+# alongside a device's lines (reconnects, trigger snapshots)
+BLOCK_RESERVE = 64
+
+
+class RingBuffer:
+    """Fixed-capacity FIFO over a list allocated up front
+
+    ``insort`` keeps tuples ordered by their first element instead.
+    """
+
+    __slots__ = ("capacity", "_slots", "_head", "_size")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._slots: List[Any] = [None] * capacity
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def full(self) -> bool:
+        return self._size == self.capacity
+
+    def append(self, item: Any):
+        """Add an item at the tail; the caller makes room first"""
+        if self._size == self.capacity:
+            raise IndexError("RingBuffer is full")
+        self._slots[(self._head + self._size) % self.capacity] = item
+        self._size += 1
+
+    def insort(self, item: Tuple) -> int:
+        """Insert a tuple after every item with a first element <= its own
+
+        Returns its position; 0 means it is the new head. Costs one step per
+        item it has to pass, so appending in order is O(1).
+        """
+        if self._size == self.capacity:
+            raise IndexError("RingBuffer is full")
+        slots = self._slots
+        capacity = self.capacity
+        key = item[0]
+        position = self._size
+        index = (self._head + position) % capacity
+        while position:
+            previous = (index - 1) % capacity
+            if slots[previous][0] <= key:
+                break
+            slots[index] = slots[previous]
+            index = previous
+            position -= 1
+        slots[index] = item
+        self._size += 1
+        return position
+
+    def peek(self) -> Any:
+        """The oldest item, without removing it"""
+        if not self._size:
+            raise IndexError("RingBuffer is empty")
+        return self._slots[self._head]
+
+    def popleft(self) -> Any:
+        """Remove and return the oldest item"""
+        if not self._size:
+            raise IndexError("RingBuffer is empty")
+        item = self._slots[self._head]
+        self._slots[self._head] = None
+        self._head = (self._head + 1) % self.capacity
+        self._size -= 1
+        return item
+
+
+class LogMerger:
+    """Releases entries pushed from many threads in timestamp order"""
+
+    def __init__(self, emit: Callable[[str, Any], None], window: float = REORDER_WINDOW,
+                 capacity: int = RING_CAPACITY, overflow: str = "drop-oldest"):
+        """Initialize the merger
+
+        Args:
+            emit: Called as ``emit(device_id, item)`` from the merge thread
+            window: Seconds to hold each entry before it may be released
+            capacity: Entries held per device
+            overflow: What to do when a device's ring is full ("block",
+                "drop-oldest" or "sample")
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.emit = emit
+        self.window = window
+        self.capacity = capacity
+        self.overflow = overflow
+        self.late = 0
+        # Entries discarded by the overflow policy, per device
+        self.dropped: Dict[str, int] = {}
+        self._rings: Dict[str, RingBuffer] = {}
+        # Heap of (head timestamp, key, device ID); an entry is current only
+        # while its key is the device's entry in _head_keys
+        self._heads: List[Tuple[float, int, str]] = []
+        self._head_keys: Dict[str, int] = {}
+        self._keys = itertools.count()
+        self._overflowed: Dict[str, int] = {}
+        self._held = 0
+        self._last_emitted = float("-inf")
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start releasing entries in the background"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def push(self, device_id: str, timestamp: float, item: Any):
+        """Add an entry; blocks only with the "block" policy while the device's ring is full"""
+        if self.window <= 0:
+            self.emit(device_id, item)
+            return
+        with self._cond:
+            ring = self._rings.get(device_id)
+            if ring is None:
+                ring = self._rings[device_id] = RingBuffer(self.capacity)
+                self.dropped[device_id] = 0
+            if ring.full:
+                if not self._make_room(device_id, ring):
+                    return
+            elif self._overflowed:
+                # Room again: sampling starts over at the next overflow
+                self._overflowed.pop(device_id, None)
+            if ring.insort((timestamp, time.monotonic(), item)) == 0:
+                self._update_head(device_id, ring)
+            self._held += 1
+            if self._held == 1:
+                self._cond.notify_all()
+
+    def room(self, device_id: str) -> int:
+        """How many more of a device's entries ``push`` takes without blocking
+
+        Unlimited (sys.maxsize) except with the "block" policy, where it is
+        the ring's free space less BLOCK_RESERVE.
+        """
+        if self.overflow != "block" or self.window <= 0:
+            return sys.maxsize
+        with self._cond:
+            ring = self._rings.get(device_id)
+            if self._stopped:
+                return sys.maxsize
+            return max(0, self.capacity - (len(ring) if ring is not None else 0) - BLOCK_RESERVE)
+
+    def _make_room(self, device_id: str, ring: RingBuffer) -> bool:
+        """Apply the overflow policy to a full ring (lock held); False drops the new entry"""
+        if self.overflow == "block":
+            while ring.full and not self._stopped:
+                self._cond.wait()
+            if self._stopped:
+                self.dropped[device_id] += 1
+                return False
+            return True
+        if self.overflow == "sample":
+            self._overflowed[device_id] = self._overflowed.get(device_id, 0) + 1
+            if self._overflowed[device_id] % SAMPLE_EVERY:
+                self.dropped[device_id] += 1
+                return False
+        ring.popleft()
+        self._update_head(device_id, ring)
+        self._held -= 1
+        self.dropped[device_id] += 1
+        return True
+
+    def _update_head(self, device_id: str, ring: RingBuffer):
+        """Record a device's new head in the heap (lock held)"""
+        if not ring:
+            self._head_keys.pop(device_id, None)
+            return
+        key = next(self._keys)
+        self._head_keys[device_id] = key
+        heapq.heappush(self._heads, (ring.peek()[0], key, device_id))
+        if len(self._heads) > 4 * len(self._head_keys) + 64:
+            # Drop superseded heads that have not surfaced yet
+            self._heads = [entry for entry in self._heads if self._head_keys.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heads)
+
+    def _next_ring(self) -> Optional[Tuple[str, RingBuffer]]:
+        """The device whose head has the earliest timestamp (lock held)"""
+        heads = self._heads
+        while heads:
+            _, key, device_id = heads[0]
+            if self._head_keys.get(device_id) == key:
+                return device_id, self._rings[device_id]
+            heapq.heappop(heads)
+        return None
+
+    def _ready(self, now: float) -> Tuple[List[Tuple[float, str, Any]], Optional[float]]:
+        """Pop every entry whose window has passed (lock held)
+
+        Returns the entries and, if some remain held, when the next one is due.
+        """
+        ready = []
+        while True:
+            best = self._next_ring()
+            if best is None:
+                return ready, None
+            device_id, ring = best
+            timestamp, arrived, item = ring.peek()
+            if arrived + self.window > now:
+                return ready, arrived + self.window
+            ring.popleft()
+            heapq.heappop(self._heads)
+            self._update_head(device_id, ring)
+            self._held -= 1
+            ready.append((timestamp, device_id, item))
+
+    def _release(self, entries):
+        for timestamp, device_id, item in entries:
+            if timestamp < self._last_emitted:
+                # Arrived after its window had already moved on
+                self.late += 1
+            else:
+                self._last_emitted = timestamp
+            self.emit(device_id, item)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._held and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                ready, due = self._ready(now)
+                if ready:
+                    # Wake readers blocked on a full ring
+                    self._cond.notify_all()
+                else:
+                    # Sleep until the next held entry's window runs out
+                    self._cond.wait(due - now)
+                    continue
+            self._release(ready)
+
+    def stop(self):
+        """Stop the merge thread and release everything still held, in order"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._cond:
+            remaining, _ = self._ready(float("inf"))
+        self._release(remaining)
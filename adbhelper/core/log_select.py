@@ -0,0 +1,272 @@
+"""One thread reading every device's logcat
+
+A reader thread per device spends nearly all its time blocked in recv and
+costs a context switch per chunk. LogcatSelector instead watches all
+streams with a ``selectors`` selector (epoll on Linux, kqueue on macOS) from
+a single thread. When a stream is readable it reads one large chunk, lets
+the device's LogcatFollower parse it (the parser keeps the partial entry at
+the end for the next chunk) and hands the new records straight to a
+callback. Follower logic is shared with the threaded path: dropped streams
+are reconnected with backoff and resumed without duplicates. Opening a
+stream can take seconds on a slow device, so connects run on a few helper
+threads and only the finished stream is handed to the reader thread.
+
+A consumer with limited room for a device (see ``room``) gets reads capped
+at what that room can hold, and the device's stream left unread while it
+has none, which pushes back through adb to logd without stalling the other
+devices.
+
+Selectors need sockets on Windows, so pipes to the adb binary (used when the
+adb server cannot be reached) only work elsewhere; see ``selector_supported``.
+"""
+
+import os
+import queue
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set
+from .adb import ADBError
+from .adb_socket import ADBServerError
+from .logcat import LogRecord, LogcatFormatError, V1_HEADER_SIZE
+from .log_follow import LogcatFollower, StreamNotice
+from .stream import READY_READ_SIZE
+
+# Threads opening streams, so one slow connect does not hold up the others
+CONNECT_WORKERS = 4
+
+# Seconds between checks whether a paused device may be read again
+PAUSE_POLL = 0.05
+
+
+def selector_supported() -> bool:
+    """Whether logcat streams can be watched by a selector on this platform"""
+    return os.name != "nt"
+
+
+class LogcatSelector:
+    """Drives many LogcatFollowers from one thread"""
+
+    def __init__(self, followers: List[LogcatFollower],
+                 on_records: Callable[[str, List[LogRecord]], None],
+                 on_notice: Callable[[str, StreamNotice], None],
+                 room: Optional[Callable[[str], int]] = None):
+        """Initialize the reader
+
+        Args:
+            followers: One follower per device
+            on_records: Called on the reader thread with each chunk's new records
+            on_notice: Called on the reader thread with stream notices
+            room: Called on the reader thread with a device ID for the most
+                records the next chunk may hold; at 0 the stream is not read
+        """
+        self.followers = followers
+        self.on_records = on_records
+        self.on_notice = on_notice
+        self.room = room
+        self._selector = selectors.DefaultSelector()
+        # Monotonic time of each disconnected follower's next connect attempt
+        self._retry_at: Dict[LogcatFollower, float] = {follower: 0.0 for follower in followers}
+        # (follower, stream or None, error) from the connect threads
+        self._connected: "queue.SimpleQueue" = queue.SimpleQueue()
+        # Connected followers whose streams are left unread for now
+        self._paused: Set[LogcatFollower] = set()
+        self._stopped = False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the reader thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop all streams and the reader thread"""
+        self._stopped = True
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _wake(self):
+        """Interrupt the reader thread's select"""
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _connect(self, follower: LogcatFollower):
+        """Open a follower's stream (connect thread); the reader thread watches it"""
+        try:
+            self._connected.put((follower, follower.connect(), ""))
+        except (ADBError, ADBServerError, OSError) as e:
+            self._connected.put((follower, None, str(e)))
+        self._wake()
+
+    def _register(self, now: float):
+        """Watch the streams opened since the last pass, or schedule retries"""
+        while True:
+            try:
+                follower, stream, error = self._connected.get_nowait()
+            except queue.Empty:
+                return
+            if stream is not None:
+                try:
+                    self._selector.register(stream.fileno(), selectors.EVENT_READ, follower)
+                    continue
+                except (ValueError, OSError) as e:
+                    # Closed by stop() before it could be watched
+                    error = str(e)
+            self._lost(follower, error, now)
+
+    def _pause(self, follower: LogcatFollower):
+        """Leave a follower's stream unread until ``room`` has space again"""
+        try:
+            self._selector.unregister(follower.stream.fileno())
+        except (KeyError, ValueError, OSError):
+            return
+        self._paused.add(follower)
+
+    def _resume(self):
+        """Watch paused streams again once their devices can be read"""
+        for follower in list(self._paused):
+            if self.room(follower.device_id) <= 0:
+                continue
+            self._paused.discard(follower)
+            stream = follower.stream
+            try:
+                self._selector.register(stream.fileno(), selectors.EVENT_READ, follower)
+            except (AttributeError, ValueError, OSError) as e:
+                self._lost(follower, str(e), time.monotonic())
+
+    def _lost(self, follower: LogcatFollower, error: str, now: float):
+        """Close a follower's stream and schedule its reconnect"""
+        stream = follower.stream
+        if stream is not None:
+            try:
+                self._selector.unregister(stream.fileno())
+            except (KeyError, ValueError, OSError):
+                pass
+            stream.close()
+        notice = follower.disconnected(error)
+        if notice is not None:
+            self.on_notice(follower.device_id, notice)
+        self._retry_at[follower] = now + follower.next_delay()
+
+    def _read(self, follower: LogcatFollower):
+        stream = follower.stream
+        size = READY_READ_SIZE
+        if self.room is not None:
+            # No chunk may complete more records than the consumer takes without blocking
+            size = min(size, self.room(follower.device_id) * V1_HEADER_SIZE)
+            if size <= 0:
+                self._pause(follower)
+                return
+        try:
+            chunk = stream.read_ready(size)
+            if not chunk:
+                self._lost(follower, "", time.monotonic())
+                return
+            notice, records = follower.process(chunk)
+        except (OSError, LogcatFormatError) as e:
+            self._lost(follower, str(e), time.monotonic())
+            return
+        if notice is not None:
+            self.on_notice(follower.device_id, notice)
+        if records:
+            self.on_records(follower.device_id, records)
+
+    def run(self):
+        """Read until ``stop`` (blocks; ``start`` runs this on a thread)"""
+        connector = ThreadPoolExecutor(max_workers=CONNECT_WORKERS, thread_name_prefix="logcat-connect")
+        try:
+            while not self._stopped:
+                now = time.monotonic()
+                self._register(now)
+                for follower, retry_at in list(self._retry_at.items()):
+                    if retry_at <= now:
+                        del self._retry_at[follower]
+                        connector.submit(self._connect, follower)
+                if self._paused:
+                    self._resume()
+                timeout = None
+                if self._retry_at:
+                    timeout = max(0.0, min(self._retry_at.values()) - time.monotonic())
+                if self._paused:
+                    timeout = PAUSE_POLL if timeout is None else min(timeout, PAUSE_POLL)
+                for key, _ in self._selector.select(timeout):
+                    if key.data is None:
+                        # Woken by stop()
+                        self._wake_r.recv(64)
+                        continue
+                    self._read(key.data)
+        finally:
+            for follower in self.followers:
+                follower.stop()
+            # A connect still in progress closes its stream when it sees the stop
+            connector.shutdown(wait=False)
+            self._selector.close()
+            self._wake_r.close()
+            self._wake_w.close()
+
+
+class ThreadedLogcatReader:
+    """Same interface as LogcatSelector, with a blocking reader thread per device
+
+    Used where streams cannot be watched by a selector.
+    """
+
+    def __init__(self, followers: List[LogcatFollower],
+                 on_records: Callable[[str, List[LogRecord]], None],
+                 on_notice: Callable[[str, StreamNotice], None]):
+        """Initialize the reader (arguments as for LogcatSelector)"""
+        self.followers = followers
+        self.on_records = on_records
+        self.on_notice = on_notice
+        self._threads: List[threading.Thread] = []
+
+    def _follow(self, follower: LogcatFollower):
+        for batch in follower.batches():
+            if isinstance(batch, StreamNotice):
+                self.on_notice(follower.device_id, batch)
+            else:
+                self.on_records(follower.device_id, batch)
+
+    def start(self):
+        """Start a reader thread per follower"""
+        for follower in self.followers:
+            thread = threading.Thread(target=self._follow, args=(follower,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop all streams and wait briefly for the threads"""
+        for follower in self.followers:
+            follower.stop()
+        for thread in self._threads:
+            thread.join(timeout=1)
+
+    def run(self):
+        """Read until ``stop`` (blocks)"""
+        self.start()
+        for thread in self._threads:
+            thread.join()
+
+
+def logcat_reader(followers: List[LogcatFollower],
+                  on_records: Callable[[str, List[LogRecord]], None],
+                  on_notice: Callable[[str, StreamNotice], None],
+                  room: Optional[Callable[[str], int]] = None):
+    """A LogcatSelector, or threaded readers where selectors cannot watch the streams
+
+    ``room`` only matters to the selector; threaded readers simply block
+    in ``on_records`` for their own device.
+    """
+    if selector_supported():
+        return LogcatSelector(followers, on_records, on_notice, room)
+    return ThreadedLogcatReader(followers, on_records, on_notice)
@@ -0,0 +1,162 @@
+"""Rolling log statistics per device
+
+For finding out who is flooding the log, counting is enough; nothing has to
+be formatted or printed. LogStats counts records by priority exactly and by
+tag, pid and uid with space-saving sketches, which keep a fixed number of
+keys however many distinct values a device produces. Records are counted a
+whole chunk at a time: each chunk is tallied exactly with a Counter first,
+so the sketches see one update per distinct value instead of one per record.
+"""
+
+import heapq
+import threading
+import time
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Hashable, List, Mapping, Optional, Tuple
+from .adb import ADBWrapper
+from .logcat import LogRecord, PRIORITY_LETTERS
+
+# Keys tracked per sketch; heavy hitters are exact well below this
+SKETCH_CAPACITY = 256
+
+# Well-known Android uids without a package
+SYSTEM_UIDS = {0: "root", 1000: "system", 1001: "radio", 1002: "bluetooth",
+               1010: "wifi", 1013: "media", 1041: "audioserver", 1047: "cameraserver",
+               2000: "shell"}
+
+
+class SpaceSaving:
+    """Approximate top-K counter (Metwally et al.'s space-saving algorithm)
+
+    At most ``capacity`` keys are kept. A new key arriving when the sketch is
+    full replaces the key with the smallest count and takes over that count
+    as its error bound, so counts are never under-estimated and any key
+    holding more than 1/capacity of the total is always present.
+    """
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+
+    def add(self, key: Hashable, count: int = 1):
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.capacity:
+            counts[key] = count
+            self.errors[key] = 0
+        else:
+            victim = min(counts, key=counts.__getitem__)
+            floor = counts.pop(victim)
+            del self.errors[victim]
+            counts[key] = floor + count
+            self.errors[key] = floor
+
+    def update(self, counts: Mapping[Hashable, int]):
+        """Add a batch of exact counts"""
+        for key, count in counts.items():
+            self.add(key, count)
+
+    def top(self, n: int) -> List[Tuple[Hashable, int, int]]:
+        """The n largest keys as (key, count, error), largest first"""
+        largest = heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+        return [(key, count, self.errors[key]) for key, count in largest]
+
+
+class LogStats:
+    """Counters for one device's log stream, safe to read while a reader updates them"""
+
+    def __init__(self, device_id: str, capacity: int = SKETCH_CAPACITY):
+        self.device_id = device_id
+        self.total = 0
+        self.bytes = 0
+        self.priorities = [0] * len(PRIORITY_LETTERS)
+        self.tags = SpaceSaving(capacity)
+        self.pids = SpaceSaving(capacity)
+        self.uids = SpaceSaving(capacity)
+        # uid -> package name, filled in once the device has been asked
+        self.uid_names: Dict[int, str] = {}
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_sample = (self._started, 0)
+        self.rate = 0.0
+
+    def add_batch(self, records: List[LogRecord]):
+        """Count a chunk of records"""
+        if not records:
+            return
+        priorities = Counter(record.priority for record in records)
+        tags = Counter(record.tag for record in records)
+        pids = Counter(record.pid for record in records)
+        uids = Counter(record.uid for record in records)
+        size = sum(len(record.raw) for record in records)
+        with self._lock:
+            self.total += len(records)
+            self.bytes += size
+            for priority, count in priorities.items():
+                if 0 <= priority < len(self.priorities):
+                    self.priorities[priority] += count
+            self.tags.update(tags)
+            self.pids.update(pids)
+            self.uids.update(uids)
+
+    def sample(self) -> float:
+        """Update and return the records per second since the previous sample"""
+        now = time.monotonic()
+        with self._lock:
+            total = self.total
+        last_time, last_total = self._last_sample
+        if now > last_time:
+            self.rate = (total - last_total) / (now - last_time)
+        self._last_sample = (now, total)
+        return self.rate
+
+    def uid_name(self, uid: Optional[int]) -> str:
+        """Package (or system user) name for a uid"""
+        if uid is None:
+            return "?"
+        # Shared system uids list dozens of packages; their user name says more
+        name = SYSTEM_UIDS.get(uid) or self.uid_names.get(uid)
+        return name if name else f"uid {uid}"
+
+    def snapshot(self, n: int = 10) -> dict:
+        """Totals and the n heaviest tags, pids and packages
+
+        Sketch entries are (name, count, error): the true count lies between
+        ``count - error`` and ``count``.
+        """
+        with self._lock:
+            return {
+                "device": self.device_id,
+                "total": self.total,
+                "bytes": self.bytes,
+                "seconds": round(time.monotonic() - self._started, 1),
+                "rate": round(self.rate, 1),
+                "priorities": {PRIORITY_LETTERS[p]: count for p, count in enumerate(self.priorities)
+                               if count and PRIORITY_LETTERS[p] != "?"},
+                "tags": self.tags.top(n),
+                "pids": self.pids.top(n),
+                "packages": [(self.uid_name(uid), count, error) for uid, count, error in self.uids.top(n)],
+                "error": self.error,
+            }
+
+
+def uid_packages(adb: ADBWrapper, device_id: str) -> Dict[int, str]:
+    """Map uids to package names with ``pm list packages -U``
+
+    Packages sharing a uid are joined with commas. Returns an empty dict if
+    the device does not support -U (before Android 8).
+    """
+    stdout, _, code = adb._run_command(["-s", device_id, "shell", "pm list packages -U"])
+    if code != 0:
+        return {}
+    names: Dict[int, List[str]] = {}
+    for line in stdout.splitlines():
+        # "package:com.example uid:10123"
+        package, _, uid = line.strip().partition(" uid:")
+        if package.startswith("package:") and uid.split(",")[0].isdigit():
+            names.setdefault(int(uid.split(",")[0]), []).append(package[len("package:"):])
+    return {uid: ",".join(sorted(packages)) for uid, packages in names.items()}
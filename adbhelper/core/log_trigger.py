@@ -0,0 +1,181 @@
+"""Triggered log capture
+
+Instead of writing everything to disk, a TriggerCapture keeps the last few
+seconds (and at most a few MB) of a device's log in memory and watches each
+line for a trigger such as a crash. When one matches, it writes a snapshot
+file: the history leading up to the trigger, then every line for a short
+tail afterwards. Triggers during the tail extend it into the same file.
+Nothing touches the disk until something interesting happens.
+"""
+
+import collections
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from ..utils.log_writer import LogWriter
+
+# Named triggers accepted by --trigger; anything else is a regular expression
+TRIGGERS = {
+    "crash": r"FATAL EXCEPTION|Fatal signal \d+",
+    "anr": r"ANR in ",
+    "tombstone": r"Tombstone written to|\*\*\* \*\*\* \*\*\* \*\*\* \*\*\*",
+}
+
+# Defaults for the history kept before a trigger and the tail written after it
+PRE_SECONDS = 30.0
+PRE_BYTES = 8 * 1024 * 1024
+POST_SECONDS = 10.0
+
+
+def compile_triggers(triggers: List[str]) -> "re.Pattern":
+    """Combine trigger names and regular expressions into one pattern"""
+    patterns = []
+    for trigger in triggers:
+        pattern = TRIGGERS.get(trigger.lower(), trigger)
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid trigger pattern '{trigger}': {e}")
+        patterns.append(f"(?:{pattern})")
+    return re.compile("|".join(patterns))
+
+
+class TriggerCapture:
+    """History window and snapshot writer for one device
+
+    ``add`` is called from the device's reader thread, which may be shared
+    by every device, so it never waits on the disk: finished snapshots are
+    closed on a background thread. A tail ends at the first line logged
+    after it, or on a timer if the device goes quiet.
+    """
+
+    def __init__(self, device_id: str, pattern: "re.Pattern", directory: str,
+                 pre_seconds: float = PRE_SECONDS, pre_bytes: int = PRE_BYTES,
+                 post_seconds: float = POST_SECONDS):
+        """Initialize the capture
+
+        Args:
+            device_id: Device whose lines are captured (used in file names)
+            pattern: Compiled trigger pattern, see compile_triggers
+            directory: Where snapshot files are written
+            pre_seconds: Log time kept before a trigger
+            pre_bytes: Upper bound on the history kept in memory
+            post_seconds: Seconds of log written after the last trigger
+        """
+        self.device_id = device_id
+        self.pattern = pattern
+        self.directory = Path(directory)
+        self.pre_seconds = pre_seconds
+        self.pre_bytes = pre_bytes
+        self.post_seconds = post_seconds
+        self.snapshots: List[Path] = []
+
+        self._history = collections.deque()
+        self._history_bytes = 0
+        self._lock = threading.Lock()
+        self._writer: Optional[LogWriter] = None
+        # Log time and host time at which the current tail ends
+        self._tail_until = 0.0
+        self._tail_deadline = 0.0
+        self._timer: Optional[threading.Timer] = None
+        # Threads closing finished snapshots, joined by close()
+        self._closers: List[threading.Thread] = []
+
+    def add(self, timestamp: float, text: str) -> Optional[Path]:
+        """Record a line, returning the snapshot path if it starts a new snapshot"""
+        started = None
+        finished = None
+        with self._lock:
+            match = self.pattern.search(text)
+            if self._writer is not None and timestamp > self._tail_until and not match:
+                finished = self._finish()
+            if self._writer is not None:
+                self._writer.write(text + "\n")
+            else:
+                self._remember(timestamp, text)
+                if match:
+                    started = self._start(match.group(0))
+            if match:
+                self._tail_until = timestamp + self.post_seconds
+                self._tail_deadline = time.monotonic() + self.post_seconds
+                self._schedule()
+        if finished is not None:
+            self._close_later(finished)
+        return started
+
+    def _remember(self, timestamp: float, text: str):
+        """Add a line to the history, dropping what falls outside the window"""
+        history = self._history
+        history.append((timestamp, text))
+        self._history_bytes += len(text) + 1
+        oldest = timestamp - self.pre_seconds
+        while history and (history[0][0] < oldest or self._history_bytes > self.pre_bytes):
+            self._history_bytes -= len(history.popleft()[1]) + 1
+
+    def _start(self, trigger: str) -> Path:
+        """Open a snapshot and write the history into it (lock held)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        safe_device_id = self.device_id.replace(":", "-").replace(".", "_")
+        safe_trigger = re.sub(r"[^A-Za-z0-9]+", "_", trigger).strip("_")[:40] or "trigger"
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = self.directory / f"trigger_{safe_device_id}_{timestamp}_{safe_trigger}.log"
+        self._writer = LogWriter(str(path))
+        self._writer.write("".join(text + "\n" for _, text in self._history))
+        self._history.clear()
+        self._history_bytes = 0
+        self.snapshots.append(path)
+        return path
+
+    def _finish(self) -> LogWriter:
+        """Detach the current snapshot's writer (lock held)
+
+        Closing flushes and joins the writer thread, so callers close the
+        returned writer after releasing the lock.
+        """
+        writer = self._writer
+        self._writer = None
+        return writer
+
+    def _close_later(self, writer: LogWriter):
+        """Close a finished snapshot on a background thread"""
+        closer = threading.Thread(target=writer.close, daemon=True)
+        closer.start()
+        with self._lock:
+            self._closers = [thread for thread in self._closers if thread.is_alive()]
+            self._closers.append(closer)
+
+    def _schedule(self):
+        """(Re)start the timer ending the tail on the host clock (lock held)"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.post_seconds, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self):
+        finished = None
+        with self._lock:
+            if self._writer is not None and time.monotonic() >= self._tail_deadline:
+                finished = self._finish()
+        if finished is not None:
+            finished.close()
+
+    def close(self):
+        """Finish any snapshot still being written"""
+        finished = None
+        with self._lock:
+            timer = self._timer
+            if timer is not None:
+                timer.cancel()
+            if self._writer is not None:
+                finished = self._finish()
+            closers, self._closers = self._closers, []
+        if finished is not None:
+            finished.close()
+        # An _expire already running may still be closing a snapshot
+        for thread in closers + ([timer] if timer is not None else []):
+            if thread is not threading.current_thread():
+                thread.join()
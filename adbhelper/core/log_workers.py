@@ -0,0 +1,155 @@
+"""Multi-process log decoding for many devices
+
+With a couple of dozen devices, decoding, filtering and formatting their
+logs in one process keeps one core busy and leaves the rest idle. A
+LogWorkerPool spreads the devices over worker processes. Each worker follows
+its devices' logcat streams from one selector thread, parses and filters
+every chunk and formats what survives. Only those lines go back to the
+parent, one pickled batch per chunk over a multiprocessing queue. The parent
+keeps the cheap parts: ordering, rendering and saving.
+
+The queue is bounded, so a parent that falls behind makes the workers wait,
+which in turn stops them reading from adb.
+"""
+
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from .adb import ADBWrapper
+from .log_filter import LogFilter, package_resolver
+from .log_follow import LogcatFollower, StreamNotice
+from .log_select import logcat_reader
+
+# Batches waiting for the parent before workers block
+QUEUE_SIZE = 256
+
+# Seconds to wait for workers to exit before they are terminated
+STOP_TIMEOUT = 2.0
+
+# One record sent to the parent: (timestamp, formatted text, raw entry or None)
+WorkerRecord = Tuple[float, str, Optional[bytes]]
+
+
+def _worker_main(devices: List[Tuple[str, int]], terms: Tuple[str, ...], keep_raw: bool,
+                 out: "multiprocessing.Queue", stop: "multiprocessing.Event"):
+    """Entry point of a worker process
+
+    Sends ("records", device_id, [WorkerRecord, ...]) for each chunk and
+    ("notice", device_id, timestamp, text) for stream notices and errors.
+    """
+    # Ctrl+C goes to the whole process group; the parent decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    adb = ADBWrapper()
+    followers: List[LogcatFollower] = []
+    log_filters: Dict[str, LogFilter] = {}
+    for device_id, sdk in devices:
+        try:
+            # Compiled here: package: terms resolve through this process's adb
+            log_filter = LogFilter(terms, package_resolver(adb, device_id))
+            logcat_args: List[str] = []
+            if log_filter:
+                logcat_args, log_filter = log_filter.pushdown(sdk)
+        except Exception as e:
+            out.put(("notice", device_id, time.time(), f"[ERROR] {e}"))
+            continue
+        log_filters[device_id] = log_filter
+        followers.append(LogcatFollower(adb, device_id, logcat_args, sdk))
+
+    def on_records(device_id: str, records):
+        try:
+            log_filter = log_filters[device_id]
+            items = []
+            for record in records:
+                text = log_filter.apply(record)
+                if text is not None:
+                    items.append((record.timestamp, text, bytes(record.raw) if keep_raw else None))
+            if items:
+                out.put(("records", device_id, items))
+        except Exception as e:
+            out.put(("notice", device_id, time.time(), f"[ERROR] {e}"))
+
+    def on_notice(device_id: str, notice: StreamNotice):
+        out.put(("notice", device_id, notice.timestamp, str(notice)))
+
+    reader = logcat_reader(followers, on_records, on_notice)
+    reader.start()
+    stop.wait()
+    reader.stop()
+
+
+class LogWorkerPool:
+    """Runs LogcatFollowers for groups of devices in worker processes"""
+
+    def __init__(self, devices: Dict[str, int], terms: Tuple[str, ...], workers: int,
+                 on_records: Callable[[str, List[WorkerRecord]], None],
+                 on_notice: Callable[[str, float, str], None], keep_raw: bool = False):
+        """Initialize the pool
+
+        Args:
+            devices: Device ID -> SDK level
+            terms: ``-f`` filter terms, compiled in each worker
+            workers: Number of worker processes (at most one per device)
+            on_records: Called from the receiving thread with each batch
+            on_notice: Called with stream notices and reader errors
+            keep_raw: Also send each record's raw bytes (for archives)
+        """
+        self.devices = devices
+        self.terms = tuple(terms)
+        self.workers = max(1, min(workers, len(devices)))
+        self.on_records = on_records
+        self.on_notice = on_notice
+        self.keep_raw = keep_raw
+        # spawn: forking a process that already runs render threads is unsafe
+        self._context = multiprocessing.get_context("spawn")
+        self._queue = self._context.Queue(QUEUE_SIZE)
+        self._stop = self._context.Event()
+        self._processes: List[multiprocessing.Process] = []
+        self._receiver: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def groups(self) -> List[List[Tuple[str, int]]]:
+        """Devices assigned to each worker, round-robin"""
+        groups: List[List[Tuple[str, int]]] = [[] for _ in range(self.workers)]
+        for i, device in enumerate(self.devices.items()):
+            groups[i % self.workers].append(device)
+        return groups
+
+    def start(self):
+        """Start the worker processes and the thread receiving their batches"""
+        for group in self.groups():
+            process = self._context.Process(
+                target=_worker_main, args=(group, self.terms, self.keep_raw, self._queue, self._stop),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        self._receiver = threading.Thread(target=self._receive, daemon=True)
+        self._receiver.start()
+
+    def _receive(self):
+        while not self._stopping:
+            try:
+                message = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            if message[0] == "records":
+                self.on_records(message[1], message[2])
+            else:
+                self.on_notice(message[1], message[2], message[3])
+
+    def stop(self):
+        """Stop the workers, terminating any that do not exit in time"""
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout=STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self._stopping = True
+        if self._receiver is not None:
+            self._receiver.join()
+            self._receiver = None
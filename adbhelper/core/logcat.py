@@ -0,0 +1,295 @@
+"""Binary logcat ingestion
+
+``logcat -B`` writes raw ``logger_entry`` records instead of formatted text:
+
+    uint16 len        payload length
+    uint16 hdr_size   header size (0 on v1, which is always 20 bytes)
+    int32  pid
+    uint32 tid
+    uint32 sec
+    uint32 nsec
+    uint32 lid        log buffer id (v3+)
+    uint32 uid        (v4+)
+    payload           priority byte, NUL-terminated tag, NUL-terminated message
+
+LogcatParser splits a byte stream into LogRecords that point into the chunk
+they arrived in and decode each field only when it is first accessed, so
+filtering on priority or pid never touches the tag or message text.
+"""
+
+import shlex
+import struct
+import time
+from typing import Iterator, List, Optional
+from .adb import ADBWrapper
+
+# Header size of v1 entries, which leave hdr_size as 0
+V1_HEADER_SIZE = 20
+
+# len, hdr_size, pid, tid, sec, nsec
+ENTRY_HEADER = struct.Struct("<HHiIII")
+PREFIX = struct.Struct("<HH")
+UINT32 = struct.Struct("<I")
+
+# Largest payload the kernel/logd will produce; anything bigger means we lost sync
+MAX_PAYLOAD = 5 * 1024
+
+# Android log priorities
+PRIORITY_VERBOSE = 2
+PRIORITY_DEBUG = 3
+PRIORITY_INFO = 4
+PRIORITY_WARN = 5
+PRIORITY_ERROR = 6
+PRIORITY_FATAL = 7
+
+PRIORITY_LETTERS = "??VDIWEFS"
+
+# Log buffer names as accepted by ``logcat -b``, and their ids in entry headers
+BUFFER_IDS = {
+    "main": 0, "radio": 1, "events": 2, "system": 3,
+    "crash": 4, "stats": 5, "security": 6, "kernel": 7,
+}
+
+# Log buffer ids whose payload is binary event data rather than tag/message text
+BINARY_BUFFERS = {2, 5, 6}  # events, stats, security
+
+
+def priority_letter(priority: int) -> str:
+    """Single-letter name of a priority, as shown by logcat"""
+    return PRIORITY_LETTERS[priority] if 0 <= priority < len(PRIORITY_LETTERS) else "?"
+
+
+def parse_priority(value: str) -> int:
+    """Parse a priority given as a letter (V/D/I/W/E/F) or a number"""
+    value = value.strip().upper()
+    if value.isdigit():
+        return int(value)
+    index = PRIORITY_LETTERS.find(value[:1], 2) if value else -1
+    if index < 0:
+        raise ValueError(f"Unknown log priority: {value}")
+    return index
+
+
+class LogcatFormatError(ValueError):
+    """The byte stream is not a valid sequence of logger entries"""
+    pass
+
+
+class LogRecord:
+    """One log entry, decoded lazily from the chunk it arrived in"""
+
+    __slots__ = ("_data", "_start", "_end", "_header_size", "_header",
+                 "_lid", "_tag_end", "_tag", "_message")
+
+    def __init__(self, data: bytes, start: int, end: int, header_size: int):
+        self._data = data
+        self._start = start
+        self._end = end
+        self._header_size = header_size
+        self._header = None
+        self._lid = None
+        self._tag_end = None
+        self._tag = None
+        self._message = None
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "LogRecord":
+        """A record from one complete entry, e.g. one sent from another process"""
+        header_size = PREFIX.unpack_from(raw)[1] or V1_HEADER_SIZE
+        return cls(raw, 0, len(raw), header_size)
+
+    @property
+    def raw(self) -> memoryview:
+        """The complete entry, header included"""
+        return memoryview(self._data)[self._start:self._end]
+
+    def _fields(self):
+        if self._header is None:
+            self._header = ENTRY_HEADER.unpack_from(self._data, self._start)
+        return self._header
+
+    @property
+    def pid(self) -> int:
+        return self._fields()[2]
+
+    @property
+    def tid(self) -> int:
+        return self._fields()[3]
+
+    @property
+    def sec(self) -> int:
+        return self._fields()[4]
+
+    @property
+    def nsec(self) -> int:
+        return self._fields()[5]
+
+    @property
+    def timestamp(self) -> float:
+        """Seconds since the epoch"""
+        fields = self._fields()
+        return fields[4] + fields[5] / 1e9
+
+    @property
+    def lid(self) -> int:
+        """Log buffer id (0 main, 1 radio, 2 events, 3 system, 4 crash, ...)"""
+        if self._lid is None:
+            if self._header_size >= 24:
+                self._lid = UINT32.unpack_from(self._data, self._start + 20)[0]
+            else:
+                self._lid = 0
+        return self._lid
+
+    @property
+    def uid(self) -> Optional[int]:
+        """Uid of the logging process (v4 entries only)"""
+        if self._header_size >= 28:
+            return UINT32.unpack_from(self._data, self._start + 24)[0]
+        return None
+
+    @property
+    def binary(self) -> bool:
+        """Whether the payload is binary event data rather than text"""
+        return self.lid in BINARY_BUFFERS
+
+    @property
+    def payload(self) -> memoryview:
+        return memoryview(self._data)[self._start + self._header_size:self._end]
+
+    @property
+    def priority(self) -> int:
+        if self.binary:
+            return PRIORITY_INFO
+        offset = self._start + self._header_size
+        return self._data[offset] if offset < self._end else 0
+
+    def _find_tag_end(self) -> int:
+        if self._tag_end is None:
+            end = self._data.find(b"\0", self._start + self._header_size + 1, self._end)
+            self._tag_end = self._end if end < 0 else end
+        return self._tag_end
+
+    @property
+    def tag_bytes(self) -> memoryview:
+        payload_start = self._start + self._header_size
+        if self.binary:
+            return memoryview(self._data)[payload_start:min(payload_start + 4, self._end)]
+        return memoryview(self._data)[payload_start + 1:self._find_tag_end()]
+
+    @property
+    def message_bytes(self) -> memoryview:
+        if self.binary:
+            return memoryview(self._data)[min(self._start + self._header_size + 4, self._end):self._end]
+        start = min(self._find_tag_end() + 1, self._end)
+        end = self._end
+        # Drop the terminating NUL and trailing newlines, like logcat does
+        while end > start and self._data[end - 1] in (0, 10):
+            end -= 1
+        return memoryview(self._data)[start:end]
+
+    @property
+    def tag(self) -> str:
+        if self._tag is None:
+            if self.binary:
+                tag = self.tag_bytes
+                self._tag = str(UINT32.unpack(tag)[0]) if len(tag) == 4 else ""
+            else:
+                self._tag = str(self.tag_bytes, "utf-8", "replace")
+        return self._tag
+
+    @property
+    def message(self) -> str:
+        if self._message is None:
+            if self.binary:
+                self._message = self.message_bytes.hex()
+            else:
+                self._message = str(self.message_bytes, "utf-8", "replace")
+        return self._message
+
+    def format(self) -> str:
+        """Format like ``logcat -v threadtime``, one header per message line"""
+        header = (f"{_format_time(self.sec)}.{self.nsec // 1000000:03d} "
+                  f"{self.pid:5d} {self.tid:5d} {priority_letter(self.priority)} {self.tag}: ")
+        return "\n".join(header + line for line in self.message.split("\n"))
+
+    def __str__(self) -> str:
+        return self.format()
+
+    def __repr__(self) -> str:
+        return (f"LogRecord(pid={self.pid}, tid={self.tid}, priority={priority_letter(self.priority)}, "
+                f"tag={self.tag!r}, message={self.message!r})")
+
+
+class LogcatParser:
+    """Incrementally splits a ``logcat -B`` byte stream into LogRecords"""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, chunk: bytes) -> List[LogRecord]:
+        """Parse a chunk, returning the records it completes
+
+        A partial entry at the end of the chunk is kept until the next feed.
+        Every entry is at least V1_HEADER_SIZE bytes, so a chunk of n bytes
+        completes at most n // V1_HEADER_SIZE records (one more at most when
+        a partial entry was kept).
+        """
+        data = self._pending + chunk if self._pending else bytes(chunk)
+        records = []
+        offset = 0
+        size = len(data)
+        unpack = PREFIX.unpack_from
+        while size - offset >= 4:
+            length, header_size = unpack(data, offset)
+            if header_size == 0:
+                header_size = V1_HEADER_SIZE
+            if header_size < V1_HEADER_SIZE or length > MAX_PAYLOAD:
+                raise LogcatFormatError(f"Corrupt logger entry at offset {offset}")
+            end = offset + header_size + length
+            if end > size:
+                break
+            records.append(LogRecord(data, offset, end, header_size))
+            offset = end
+        self._pending = data[offset:]
+        return records
+
+    @property
+    def pending(self) -> int:
+        """Bytes of an incomplete entry waiting for more data"""
+        return len(self._pending)
+
+
+def iter_records(chunks: Iterator[bytes]) -> Iterator[LogRecord]:
+    """Yield LogRecords from an iterable of ``logcat -B`` byte chunks"""
+    parser = LogcatParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+
+
+def logcat_command(args: Optional[List[str]] = None) -> List[str]:
+    """ADB arguments running binary logcat with extra logcat options
+
+    ``exec-out`` is used so the binary stream is not mangled by a pty. The
+    options are quoted because the device shell parses the command line.
+    """
+    return ["exec-out", "logcat", "-B"] + [shlex.quote(arg) for arg in args or []]
+
+
+def read_logcat(adb: ADBWrapper, device_id: str, args: Optional[List[str]] = None) -> Iterator[LogRecord]:
+    """Run binary logcat on a device and yield its records as they arrive
+
+    Closing the generator stops logcat on the device.
+    """
+    with adb.stream(logcat_command(args), device_id) as stream:
+        yield from iter_records(stream.chunks())
+
+
+_time_cache = (None, "")
+
+
+def _format_time(sec: int) -> str:
+    """Local "MM-DD HH:MM:SS" for a timestamp, cached per second"""
+    global _time_cache
+    if _time_cache[0] != sec:
+        _time_cache = (sec, time.strftime("%m-%d %H:%M:%S", time.localtime(sec)))
+    return _time_cache[1]
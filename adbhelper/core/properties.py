@@ -0,0 +1,185 @@
+"""Batched device property fetching with a per-boot on-disk cache"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from .adb import ADBWrapper, ADBError
+
+# "[ro.product.model]: [Pixel 6]" - values may span several lines
+GETPROP_LINE = re.compile(r'^\[(.+?)\]: \[(.*?)\]$', re.MULTILINE | re.DOTALL)
+
+# Separates the boot id from the property dump in the combined shell call
+DUMP_SEPARATOR = "__ADBH_GETPROP__"
+
+# Devices remembered in the cache file before the oldest are dropped
+MAX_CACHED_BOOTS = 50
+
+
+def parse_getprop(output: str) -> Dict[str, str]:
+    """Parse the output of a bare ``getprop`` into a dict"""
+    return {key: value for key, value in GETPROP_LINE.findall(output)}
+
+
+def _serialno(boot_serialno: str, serialno: str) -> str:
+    """Serial number used in cache keys; some devices only set ro.serialno"""
+    return boot_serialno.strip() or serialno.strip()
+
+
+def is_volatile(name: str) -> bool:
+    """Check whether a property can change while the device is running
+
+    ``ro.*`` properties are fixed for the lifetime of a boot; everything else
+    (``persist.*``, ``sys.*``, ``init.svc.*``, ...) may change at any time.
+    """
+    return not name.startswith("ro.")
+
+
+class DevicePropertyCache:
+    """Fetches all device properties in one call and caches the read-only ones
+
+    Read-only properties are stored in a JSON file keyed by the serial number
+    (``ro.boot.serialno``, else ``ro.serialno``) plus the kernel boot id, so they are fetched from a
+    device once per boot. Volatile properties are only served from the last
+    dump of the current process and can be refreshed on demand.
+    """
+
+    def __init__(self, adb: ADBWrapper, cache_file: Optional[str] = None):
+        """Initialize the cache
+
+        Args:
+            adb: ADB wrapper used to query devices
+            cache_file: Path to cache file. Defaults to ~/.adbhelper_props.json
+        """
+        self.adb = adb
+        if cache_file is None:
+            self.cache_file = Path.home() / ".adbhelper_props.json"
+        else:
+            self.cache_file = Path(cache_file)
+        self._disk: Optional[Dict[str, Dict[str, str]]] = None
+        # device ID -> merged properties fetched by this process
+        self._live: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        """Load the cache file (once per process)"""
+        if self._disk is None:
+            try:
+                with open(self.cache_file, 'r') as f:
+                    data = json.load(f)
+                self._disk = data if isinstance(data, dict) else {}
+            except (json.JSONDecodeError, IOError):
+                self._disk = {}
+        return self._disk
+
+    def _save(self):
+        """Write the cache file, keeping only the most recent boots"""
+        disk = self._load()
+        while len(disk) > MAX_CACHED_BOOTS:
+            disk.pop(next(iter(disk)))
+        tmp_file = None
+        try:
+            # A unique temp file, so concurrent CLI processes never write the same one
+            with tempfile.NamedTemporaryFile('w', dir=self.cache_file.parent, prefix=self.cache_file.name,
+                                             suffix=".tmp", delete=False) as f:
+                tmp_file = f.name
+                json.dump(disk, f)
+            os.replace(tmp_file, self.cache_file)
+        except IOError:
+            if tmp_file:
+                try:
+                    os.remove(tmp_file)
+                except OSError:
+                    pass
+
+    def _shell(self, device_id: str, command: str) -> str:
+        """Run a shell command on the device and return stdout"""
+        stdout, stderr, code = self.adb._run_command(["-s", device_id, "shell", command])
+        if code != 0:
+            raise ADBError(f"Failed to read properties from {device_id}: {stderr or stdout}")
+        return stdout
+
+    def _fetch_all(self, device_id: str) -> Dict[str, str]:
+        """Fetch the boot id and the full property dump in a single call"""
+        output = self._shell(
+            device_id, f"cat /proc/sys/kernel/random/boot_id; echo {DUMP_SEPARATOR}; getprop"
+        )
+        boot_id, _, dump = output.partition(f"{DUMP_SEPARATOR}\n")
+        properties = parse_getprop(dump)
+
+        serialno = _serialno(properties.get("ro.boot.serialno", ""), properties.get("ro.serialno", ""))
+        boot_id = boot_id.strip()
+        if serialno and boot_id:
+            stable = {k: v for k, v in properties.items() if not is_volatile(k)}
+            with self._lock:
+                disk = self._load()
+                disk.pop(f"{serialno}:{boot_id}", None)
+                disk[f"{serialno}:{boot_id}"] = stable
+                self._save()
+        return properties
+
+    def _cached_for_boot(self, device_id: str) -> Optional[Dict[str, str]]:
+        """Look up read-only properties cached for the device's current boot"""
+        output = self._shell(
+            device_id, "cat /proc/sys/kernel/random/boot_id; getprop ro.boot.serialno; getprop ro.serialno"
+        )
+        lines = output.split('\n')
+        if len(lines) < 3:
+            return None
+        boot_id, serialno = lines[0].strip(), _serialno(lines[1], lines[2])
+        if not boot_id or not serialno:
+            return None
+        with self._lock:
+            cached = self._load().get(f"{serialno}:{boot_id}")
+        return dict(cached) if cached else None
+
+    def get_properties(self, device_id: str, refresh: bool = False) -> Dict[str, str]:
+        """Get the device's properties
+
+        Args:
+            device_id: Target device
+            refresh: Fetch a fresh dump, updating volatile properties
+
+        Returns:
+            Dict of property name to value. Without ``refresh``, this may hold only
+            read-only properties when they were served from the on-disk cache.
+        """
+        with self._lock:
+            live = self._live.get(device_id)
+        if live is not None and not refresh:
+            return dict(live)
+
+        properties = None if refresh else self._cached_for_boot(device_id)
+        if properties is None:
+            properties = self._fetch_all(device_id)
+        with self._lock:
+            self._live[device_id] = properties
+        return dict(properties)
+
+    def get(self, device_id: str, name: str, refresh: bool = False) -> str:
+        """Get a single property, re-reading it from the device if volatile and requested
+
+        Returns an empty string for unset properties, like ``getprop``.
+        """
+        if refresh and is_volatile(name):
+            value = self.adb.get_device_property(name, device_id)
+            with self._lock:
+                self._live.setdefault(device_id, {})[name] = value
+            return value
+
+        properties = self.get_properties(device_id)
+        if name not in properties and is_volatile(name):
+            # Served from the on-disk cache, which has no volatile properties
+            return self.get(device_id, name, refresh=True)
+        return properties.get(name, "")
+
+    def invalidate(self, device_id: Optional[str] = None):
+        """Drop in-memory properties for one device, or all devices"""
+        with self._lock:
+            if device_id is None:
+                self._live.clear()
+            else:
+                self._live.pop(device_id, None)
@@ -0,0 +1,258 @@
+"""Per-device command scheduling with deadlines, priorities and circuit breakers
+
+Each device gets its own queue and worker thread, so a hung device only
+delays its own commands. Every call carries a deadline; commands whose
+deadline passes while queued are failed without being run. Interactive
+calls jump ahead of background polling, and a device that keeps timing out
+is fast-failed for a while instead of costing a full timeout per call.
+
+Fleet-wide commands (``log clear``, ``log dump``, multi-device ``shell``) all
+go through the DeviceManager's scheduler at PRIORITY_INTERACTIVE, and
+``app current --watch`` polls through it at PRIORITY_BACKGROUND.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from .adb import ADBWrapper, ADBError, ADBTimeoutError, DEFAULT_TIMEOUT
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BACKGROUND = 10
+
+# Seconds a device worker waits for new work before its thread exits
+IDLE_TIMEOUT = 30
+
+# Default for ``deadline`` arguments: use the scheduler's default (None means no deadline)
+_DEFAULT_DEADLINE = object()
+
+
+class DeadlineExceeded(ADBTimeoutError):
+    """A command's deadline passed before it could run"""
+    pass
+
+
+class DeviceUnavailable(ADBError):
+    """A device's circuit breaker is open after repeated failures"""
+    pass
+
+
+class CircuitBreaker:
+    """Opens after consecutive failed calls; allows one trial call after a cool-down
+
+    Timeouts and ADB errors (device gone, connection lost) count as failures.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_after: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state: closed, open or half-open"""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Check whether a call may go to the device right now"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """End a call that says nothing about the device (e.g. a bug in the caller)"""
+        with self._lock:
+            self._trial_running = False
+
+
+class _Job:
+    """A queued call with its deadline and result future"""
+
+    def __init__(self, func: Callable[[Optional[float]], object], deadline: Optional[float]):
+        self.func = func
+        self.deadline = deadline
+        self.future: Future = Future()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline (None means no deadline)"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+
+class _DeviceWorker:
+    """Priority queue and worker thread for one device"""
+
+    def __init__(self, device_id: str, breaker: CircuitBreaker):
+        self.device_id = device_id
+        self.breaker = breaker
+        self.queue: "queue.PriorityQueue[Tuple[int, int, _Job]]" = queue.PriorityQueue()
+        self.thread: Optional[threading.Thread] = None
+
+
+class DeviceScheduler:
+    """Runs ADB commands through one queue and worker per device"""
+
+    def __init__(self, adb: ADBWrapper, failure_threshold: int = 3, reset_after: float = 30.0,
+                 default_deadline: Optional[float] = DEFAULT_TIMEOUT):
+        """Initialize the scheduler
+
+        Args:
+            adb: ADB wrapper used to run commands
+            failure_threshold: Consecutive timeouts before a device is fast-failed
+            reset_after: Seconds before a fast-failed device gets a trial call
+            default_deadline: Deadline in seconds for calls that don't pass one
+        """
+        self.adb = adb
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.default_deadline = default_deadline
+        self._workers: Dict[str, _DeviceWorker] = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _enqueue(self, device_id: str, priority: int, job: _Job):
+        """Queue a job on the device's worker, starting its thread if it is not running
+
+        The put happens under the lock that an idle worker takes before it
+        exits, so the job is either seen by the running thread or by a new one.
+        """
+        with self._lock:
+            worker = self._workers.get(device_id)
+            if worker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_after)
+                worker = self._workers[device_id] = _DeviceWorker(device_id, breaker)
+            if worker.breaker.state == "open":
+                job.future.set_exception(self._unavailable(worker))
+                return
+            if worker.thread is None or not worker.thread.is_alive():
+                worker.thread = threading.Thread(target=self._work, args=(worker,), daemon=True)
+                worker.thread.start()
+            worker.queue.put((priority, next(self._counter), job))
+
+    def _work(self, worker: _DeviceWorker):
+        """Run a device's queued jobs in priority order"""
+        while True:
+            try:
+                _, _, job = worker.queue.get(timeout=IDLE_TIMEOUT)
+            except queue.Empty:
+                with self._lock:
+                    # Exit only if nothing slipped in while we were timing out
+                    if worker.queue.empty():
+                        worker.thread = None
+                        return
+                continue
+
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            remaining = job.remaining()
+            if remaining is not None and remaining <= 0:
+                job.future.set_exception(
+                    DeadlineExceeded(f"Deadline passed before the command ran on {worker.device_id}")
+                )
+                continue
+            if not worker.breaker.allow():
+                job.future.set_exception(self._unavailable(worker))
+                continue
+
+            try:
+                result = job.func(remaining)
+            except ADBError as e:
+                worker.breaker.record_failure()
+                job.future.set_exception(e)
+            except BaseException as e:
+                worker.breaker.release()
+                job.future.set_exception(e)
+            else:
+                worker.breaker.record_success()
+                job.future.set_result(result)
+
+    @staticmethod
+    def _unavailable(worker: _DeviceWorker) -> DeviceUnavailable:
+        return DeviceUnavailable(
+            f"Device {worker.device_id} skipped after {worker.breaker.failures} consecutive failures"
+        )
+
+    def submit_call(self, device_id: str, func: Callable[[Optional[float]], object],
+                    priority: int = PRIORITY_NORMAL, deadline=_DEFAULT_DEADLINE) -> Future:
+        """Queue ``func(timeout)`` on the device's worker
+
+        ``func`` receives the seconds left before the deadline (or None) and
+        should raise ADBTimeoutError when it runs out of time. ``deadline`` is
+        in seconds from now; None means no deadline.
+        """
+        deadline = self.default_deadline if deadline is _DEFAULT_DEADLINE else deadline
+        job = _Job(func, None if deadline is None else time.monotonic() + deadline)
+        self._enqueue(device_id, priority, job)
+        return job.future
+
+    def map_calls(self, calls: Dict[str, Callable[[Optional[float]], object]], limit: int,
+                  priority: int = PRIORITY_NORMAL, deadline=_DEFAULT_DEADLINE,
+                  stop: Optional[threading.Event] = None) -> Iterator[Tuple[str, Future]]:
+        """Run one call per device with at most ``limit`` of them queued or running
+
+        Yields (device ID, future) as calls finish. A call is only handed to
+        its device's worker when a slot frees up, so its deadline starts then.
+        Calls not handed over yet when ``stop`` is set are never run.
+        """
+        waiting = list(calls.items())
+        pending: Dict[Future, str] = {}
+        while waiting or pending:
+            while waiting and len(pending) < limit and not (stop is not None and stop.is_set()):
+                device_id, func = waiting.pop(0)
+                pending[self.submit_call(device_id, func, priority, deadline)] = device_id
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+
+    def submit(self, device_id: str, args: List[str], priority: int = PRIORITY_NORMAL,
+               deadline=_DEFAULT_DEADLINE) -> Future:
+        """Queue an ADB command on the device; the future resolves to (stdout, stderr, code)"""
+        return self.submit_call(
+            device_id,
+            lambda timeout: self.adb._run_command(args, device_id, timeout=timeout),
+            priority,
+            deadline,
+        )
+
+    def run(self, device_id: str, args: List[str], priority: int = PRIORITY_INTERACTIVE,
+            deadline=_DEFAULT_DEADLINE) -> Tuple[str, str, int]:
+        """Run an ADB command on the device and wait for its result"""
+        return self.submit(device_id, args, priority, deadline).result()
+
+    def breaker_state(self, device_id: str) -> str:
+        """Circuit breaker state for a device ("closed", "open" or "half-open")"""
+        with self._lock:
+            worker = self._workers.get(device_id)
+        return worker.breaker.state if worker else "closed"
@@ -0,0 +1,277 @@
+"""Persistent per-device shell sessions
+
+Instead of opening a new ``adb shell`` for every command, each device keeps one
+long-lived shell v2 session. Commands are written to the shell's stdin back to
+back and each one is followed by a unique marker on stdout (carrying the exit
+code) and on stderr, which lets the reader thread split the streams back into
+per-command results.
+
+Each command runs in the background of the session shell so that a timeout
+can stop just that command (its pid is kept in a small run directory on the
+device) while the commands queued behind it carry on.
+"""
+
+import atexit
+import collections
+import itertools
+import os
+import shlex
+import socket
+import threading
+from typing import Deque, Dict, Optional, Tuple
+from .adb_socket import (
+    ADBServerClient, ADBServerError, ADBServerLostError, SHELL_HEADER, SHELL_ID_STDIN,
+    SHELL_ID_STDOUT, SHELL_ID_STDERR, SHELL_ID_EXIT, iter_shell_packets,
+)
+
+# Writable by the shell user on every device; holds per-command pid files
+RUN_DIR = "/data/local/tmp"
+
+# Seconds allowed for stopping a timed-out command through a separate shell
+CANCEL_TIMEOUT = 5
+
+
+class ShellSessionClosed(ADBServerError):
+    """The persistent shell was closed before a command was sent to it"""
+    pass
+
+
+class ShellCommandLost(ADBServerLostError):
+    """The persistent shell went away after a command was sent to it"""
+    pass
+
+
+class _PendingCommand:
+    """A command written to the session that is waiting for its markers"""
+
+    def __init__(self, number: int, marker: bytes):
+        self.number = number
+        self.marker = marker
+        self.done = threading.Event()
+        self.result: Optional[Tuple[bytes, bytes, int]] = None
+        self.error: Optional[Exception] = None
+
+
+class ShellSession:
+    """One long-lived shell on a device, shared by pipelined commands"""
+
+    def __init__(self, server: ADBServerClient, serial: Optional[str] = None):
+        self.serial = serial
+        self._server = server
+        self._sock = server.open_service("shell,v2,raw:", serial, timeout=None)
+        self._write_lock = threading.Lock()
+        self._pending: Deque[_PendingCommand] = collections.deque()
+        self._counter = itertools.count()
+        self._token = os.urandom(6).hex()
+        self._run_dir = f"{RUN_DIR}/.adbh_{self._token}"
+        self._stdout = bytearray()
+        self._stderr = bytearray()
+        # Offsets before which the oldest pending command's marker is known
+        # not to start, so each packet only scans the bytes it added
+        self._stdout_scanned = 0
+        self._stderr_scanned = 0
+        self.closed = False
+        # A retired session takes no new commands and closes once drained
+        self.retired = False
+        try:
+            self._send_stdin(
+                f"mkdir -p {self._run_dir} 2>/dev/null; "
+                f"trap 'rm -rf {self._run_dir}' EXIT; trap exit HUP TERM\n".encode()
+            )
+        except OSError as e:
+            self._sock.close()
+            raise ShellSessionClosed(f"Shell session lost: {e}")
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        """Demultiplex the shell stream and resolve pending commands in order"""
+        error: Exception = ShellCommandLost("Shell session closed")
+        try:
+            for packet_id, data in iter_shell_packets(self._sock):
+                if packet_id == SHELL_ID_STDOUT:
+                    self._stdout += data
+                elif packet_id == SHELL_ID_STDERR:
+                    self._stderr += data
+                elif packet_id == SHELL_ID_EXIT:
+                    break
+                with self._write_lock:
+                    self._resolve_ready()
+                    if self.retired and not self._pending:
+                        break
+        except (OSError, ADBServerError) as e:
+            error = ShellCommandLost(f"Shell session lost: {e}")
+        finally:
+            self.close(error)
+
+    def _resolve_ready(self):
+        """Complete every pending command whose markers have both arrived"""
+        while self._pending:
+            pending = self._pending[0]
+            marker = pending.marker
+            out_end = self._stdout.find(marker, self._stdout_scanned)
+            if out_end < 0:
+                self._stdout_scanned = max(0, len(self._stdout) - len(marker) + 1)
+                return
+            self._stdout_scanned = out_end
+            # stdout marker is "<marker><exit code>\n"
+            newline = self._stdout.find(b"\n", out_end)
+            if newline < 0:
+                return
+            err_end = self._stderr.find(marker, self._stderr_scanned)
+            if err_end < 0:
+                self._stderr_scanned = max(0, len(self._stderr) - len(marker) + 1)
+                return
+            self._stderr_scanned = err_end
+
+            code_text = self._stdout[out_end + len(pending.marker):newline]
+            pending.result = (
+                bytes(self._stdout[:out_end]),
+                bytes(self._stderr[:err_end]),
+                int(code_text) if code_text.isdigit() else 1,
+            )
+            del self._stdout[:newline + 1]
+            del self._stderr[:err_end + len(marker) + 1]
+            self._stdout_scanned = 0
+            self._stderr_scanned = 0
+            self._pending.popleft()
+            pending.done.set()
+
+    def _command_path(self, pending: _PendingCommand) -> str:
+        """Prefix of the device files tracking one command"""
+        return f"{self._run_dir}/{pending.number}"
+
+    def _send_stdin(self, data: bytes):
+        """Write a stdin packet to the shell"""
+        self._sock.sendall(SHELL_HEADER.pack(SHELL_ID_STDIN, len(data)) + data)
+
+    def submit(self, command: str) -> _PendingCommand:
+        """Queue a command on the session without waiting for its result
+
+        Raises ShellSessionClosed if the command could not be sent at all, and
+        ShellCommandLost if the session broke while it was being sent.
+        """
+        number = next(self._counter)
+        pending = _PendingCommand(number, f"__ADBH_{self._token}_{number}__".encode())
+        path = self._command_path(pending)
+        marker = pending.marker.decode()
+        # eval in a subshell: cd/exit/exec and syntax errors (an unterminated
+        # quote) stay inside it. It runs in the background, off our stdin, with
+        # its pid recorded so cancel() can stop it; the cancel file check on
+        # both sides of the pid write means a cancel is never missed.
+        script = (
+            f"[ -e {path}.cancel ] || {{ ( eval {shlex.quote(command)} ) </dev/null & "
+            f"echo $! >{path}.pid 2>/dev/null; [ -e {path}.cancel ] && kill -9 $!; wait $!; }}; "
+            f"__adbh_rc=$?; rm -f {path}.pid {path}.cancel; "
+            f"printf '%s%d\\n' '{marker}' $__adbh_rc; "
+            f"printf '%s\\n' '{marker}' >&2\n"
+        ).encode("utf-8")
+        with self._write_lock:
+            if self.closed or self.retired:
+                raise ShellSessionClosed("Shell session closed")
+            self._pending.append(pending)
+            try:
+                self._send_stdin(script)
+            except OSError as e:
+                # Part of the script may have reached the shell
+                error = ShellCommandLost(f"Shell session lost: {e}")
+                self._close_locked(error)
+                raise error
+        return pending
+
+    def cancel(self, pending: _PendingCommand):
+        """Stop a submitted command on the device; its result is not waited for
+
+        Only this command is affected; if it cannot be stopped, the session is
+        retired so that new commands are not queued behind it.
+        """
+        if pending.done.is_set():
+            return
+        path = self._command_path(pending)
+        try:
+            self._server.shell(
+                f"touch {path}.cancel; p=$(cat {path}.pid 2>/dev/null) && "
+                f"{{ pkill -9 -P $p; kill -9 $p; }} 2>/dev/null; true",
+                self.serial, timeout=CANCEL_TIMEOUT,
+            )
+        except (OSError, ADBServerError):
+            self.retired = True
+
+    def wait(self, pending: _PendingCommand, command: str,
+             timeout: Optional[float] = 30) -> Tuple[bytes, bytes, int]:
+        """Wait for a submitted command and return (stdout, stderr, exit code)"""
+        if not pending.done.wait(timeout):
+            self.cancel(pending)
+            raise socket.timeout(f"Shell command timed out: {command}")
+        if pending.error:
+            raise pending.error
+        return pending.result
+
+    def run(self, command: str, timeout: Optional[float] = 30) -> Tuple[bytes, bytes, int]:
+        """Run a command and return (stdout, stderr, exit code)"""
+        return self.wait(self.submit(command), command, timeout)
+
+    def close(self, error: Optional[Exception] = None):
+        """Close the session and fail any commands still waiting on it"""
+        with self._write_lock:
+            self._close_locked(error)
+
+    def _close_locked(self, error: Optional[Exception] = None):
+        if not self.closed:
+            self.closed = True
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+        while self._pending:
+            pending = self._pending.popleft()
+            # These were sent, so they may have run
+            pending.error = error or ShellCommandLost("Shell session closed")
+            pending.done.set()
+
+
+class ShellSessionPool:
+    """Keeps one persistent shell session per device, restarting dead ones"""
+
+    def __init__(self, server: ADBServerClient):
+        self.server = server
+        self._sessions: Dict[Optional[str], ShellSession] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close_all)
+
+    def get(self, serial: Optional[str] = None) -> ShellSession:
+        """Get the live session for a device, opening a new one if needed"""
+        with self._lock:
+            session = self._sessions.get(serial)
+            if session is None or session.closed or session.retired:
+                session = ShellSession(self.server, serial)
+                self._sessions[serial] = session
+            return session
+
+    def run(self, command: str, serial: Optional[str] = None,
+            timeout: Optional[float] = 30) -> Tuple[bytes, bytes, int]:
+        """Run a command on the device's persistent shell"""
+        session = self.get(serial)
+        try:
+            pending = session.submit(command)
+        except ShellSessionClosed:
+            # The session died while idle; nothing was sent, so a fresh one is safe
+            session = self.get(serial)
+            pending = session.submit(command)
+        return session.wait(pending, command, timeout)
+
+    def close(self, serial: Optional[str] = None):
+        """Close the session for one device"""
+        with self._lock:
+            session = self._sessions.pop(serial, None)
+        if session:
+            session.close()
+
+    def close_all(self):
+        """Close every open session"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
@@ -0,0 +1,223 @@
+"""Streaming, bytes-native output of running ADB commands
+
+A CommandStream yields a command's stdout as raw byte chunks or as decoded
+lines while the command is still running, instead of buffering everything
+like ``ADBWrapper._run_command``. Closing the stream (or leaving its ``with``
+block) stops the command on the device.
+"""
+
+import codecs
+import collections
+import os
+import socket
+import subprocess
+import threading
+from typing import Iterator, List, Optional
+from .adb_socket import ADBServerError, SHELL_ID_STDOUT, SHELL_ID_STDERR, SHELL_ID_EXIT, iter_shell_packets
+
+CHUNK_SIZE = 65536
+
+# Largest read taken from a stream a selector reported ready
+READY_READ_SIZE = 256 * 1024
+
+# Longest partial line kept while waiting for a newline before it is emitted as is
+MAX_LINE = 1024 * 1024
+
+# Bytes of stderr kept for error reporting
+MAX_STDERR = 64 * 1024
+
+
+class CommandStream:
+    """Incremental stdout of a running command"""
+
+    def __init__(self, args: List[str]):
+        self.args = args
+        self.returncode: Optional[int] = None
+        self._stderr = collections.deque()
+        self._stderr_size = 0
+        self.closed = False
+        self._timer: Optional[threading.Timer] = None
+        # Raised by reads once the deadline has closed the stream
+        self._expired: Optional[Exception] = None
+
+    def _read_chunks(self) -> Iterator[bytes]:
+        """Yield stdout chunks until the command ends"""
+        raise NotImplementedError
+
+    def _close(self):
+        """Stop the command and release its resources"""
+        raise NotImplementedError
+
+    def fileno(self) -> int:
+        """File descriptor to watch with ``selectors`` before calling read_ready"""
+        raise NotImplementedError(f"{type(self).__name__} cannot be watched by a selector")
+
+    def read_ready(self, size: int = READY_READ_SIZE) -> bytes:
+        """Read up to ``size`` bytes a selector reported as available, without blocking
+
+        Returns b"" once the command's output has ended. Not to be mixed with
+        ``chunks`` or ``lines`` on the same stream.
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot be watched by a selector")
+
+    def set_deadline(self, timeout: float, error: Exception):
+        """Close the stream after ``timeout`` seconds; reading then raises ``error``
+
+        Closing also ends a read blocked on a device that went silent.
+        """
+        def expire():
+            self._expired = error
+            self.close()
+        self._timer = threading.Timer(max(0.0, timeout), expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _add_stderr(self, data: bytes):
+        """Keep the tail of stderr, bounded by MAX_STDERR"""
+        self._stderr.append(data)
+        self._stderr_size += len(data)
+        while self._stderr_size > MAX_STDERR and len(self._stderr) > 1:
+            self._stderr_size -= len(self._stderr.popleft())
+
+    @property
+    def stderr(self) -> bytes:
+        """The last MAX_STDERR bytes the command wrote to stderr"""
+        return b"".join(self._stderr)
+
+    def chunks(self) -> Iterator[bytes]:
+        """Yield raw stdout byte chunks as they arrive"""
+        if not self.closed:
+            try:
+                for chunk in self._read_chunks():
+                    if chunk:
+                        yield chunk
+            except (OSError, ADBServerError):
+                if not self.closed:
+                    raise
+            finally:
+                self.close()
+        if self._expired is not None:
+            raise self._expired
+
+    def lines(self, encoding: str = "utf-8", errors: str = "replace") -> Iterator[str]:
+        """Yield decoded stdout lines (without line endings) as they arrive
+
+        Decoding is incremental, so multi-byte characters split across chunks
+        are handled, and only the current partial line is held in memory.
+        """
+        decoder = codecs.getincrementaldecoder(encoding)(errors)
+        pending = ""
+        for chunk in self.chunks():
+            text = pending + decoder.decode(chunk)
+            lines = text.split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line[:-1] if line.endswith("\r") else line
+            if len(pending) > MAX_LINE:
+                yield pending
+                pending = ""
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending
+
+    __iter__ = lines
+
+    def close(self):
+        """Stop the command (killing it on the device if still running)"""
+        if not self.closed:
+            self.closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ShellSocketStream(CommandStream):
+    """Stream of a shell v2 session on the adb server socket"""
+
+    def __init__(self, sock: socket.socket, args: List[str]):
+        super().__init__(args)
+        self._sock = sock
+        sock.settimeout(None)
+
+    def _read_chunks(self) -> Iterator[bytes]:
+        for packet_id, data in iter_shell_packets(self._sock):
+            if packet_id == SHELL_ID_STDOUT:
+                yield data
+            elif packet_id == SHELL_ID_STDERR:
+                self._add_stderr(data)
+            elif packet_id == SHELL_ID_EXIT:
+                self.returncode = data[0] if data else 1
+                return
+
+    def _close(self):
+        # Closing the connection makes adbd kill the remote process
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+class ExecSocketStream(ShellSocketStream):
+    """Stream of a raw exec: service on the adb server socket"""
+
+    def fileno(self) -> int:
+        return self._sock.fileno()
+
+    def read_ready(self, size: int = READY_READ_SIZE) -> bytes:
+        chunk = self._sock.recv(size)
+        if not chunk:
+            self.returncode = 0
+        return chunk
+
+    def _read_chunks(self) -> Iterator[bytes]:
+        while True:
+            chunk = self._sock.recv(CHUNK_SIZE)
+            if not chunk:
+                self.returncode = 0
+                return
+            yield chunk
+
+
+class ProcessStream(CommandStream):
+    """Stream of an adb subprocess"""
+
+    def __init__(self, cmd: List[str]):
+        super().__init__(cmd)
+        self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stderr_reader = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_reader.start()
+
+    def _drain_stderr(self):
+        """Read stderr on the side so it can never fill up and stall stdout"""
+        for data in iter(lambda: self._process.stderr.read1(CHUNK_SIZE), b""):
+            self._add_stderr(data)
+
+    def fileno(self) -> int:
+        return self._process.stdout.fileno()
+
+    def read_ready(self, size: int = READY_READ_SIZE) -> bytes:
+        # Straight from the pipe: the buffered reader could hold data a selector cannot see
+        chunk = os.read(self._process.stdout.fileno(), size)
+        if not chunk:
+            self.returncode = self._process.wait()
+        return chunk
+
+    def _read_chunks(self) -> Iterator[bytes]:
+        stdout = self._process.stdout
+        for chunk in iter(lambda: stdout.read1(CHUNK_SIZE), b""):
+            yield chunk
+        self.returncode = self._process.wait()
+        self._stderr_reader.join(timeout=1)
+
+    def _close(self):
+        if self._process.poll() is None:
+            self._process.kill()
+        self.returncode = self._process.wait()
+        self._process.stdout.close()
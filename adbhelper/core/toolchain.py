@@ -0,0 +1,100 @@
+"""Persistent cache of adb toolchain facts (path, version, features)"""
+
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class ToolchainCache:
+    """Remembers where adb lives and what it supports between CLI runs
+
+    Entries are keyed by the adb binary's path, mtime and size, so upgrading
+    or replacing adb invalidates them automatically. The PATH lookup itself is
+    cached per PATH value and re-validated with a single stat.
+    """
+
+    def __init__(self, cache_file: Optional[str] = None):
+        """Initialize the cache
+
+        Args:
+            cache_file: Path to cache file. Defaults to ~/.adbhelper_toolchain.json
+        """
+        if cache_file is None:
+            self.cache_file = Path.home() / ".adbhelper_toolchain.json"
+        else:
+            self.cache_file = Path(cache_file)
+        self.data = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        """Load cache from file"""
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                return data
+        except (json.JSONDecodeError, IOError):
+            pass
+        return {}
+
+    def _save(self):
+        """Save cache to file"""
+        tmp_file = None
+        try:
+            # Written aside and renamed, so a concurrent run never reads a partial file
+            with tempfile.NamedTemporaryFile('w', dir=self.cache_file.parent, prefix=self.cache_file.name,
+                                             suffix=".tmp", delete=False) as f:
+                tmp_file = f.name
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp_file, self.cache_file)
+        except IOError:
+            if tmp_file:
+                try:
+                    os.remove(tmp_file)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _fingerprint(adb_path: str) -> Optional[str]:
+        """Identify a specific adb binary by mtime and size"""
+        try:
+            st = os.stat(adb_path)
+        except OSError:
+            return None
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def find_adb(self) -> Optional[str]:
+        """Find adb in PATH, reusing the previous answer while PATH is unchanged"""
+        path_env = os.environ.get("PATH", "")
+        cached = self.data.get("which", {})
+        if cached.get("PATH") == path_env and cached.get("adb"):
+            if os.access(cached["adb"], os.X_OK):
+                return cached["adb"]
+
+        adb_path = shutil.which("adb")
+        if adb_path:
+            self.data["which"] = {"PATH": path_env, "adb": adb_path}
+            self._save()
+        return adb_path
+
+    def get(self, adb_path: str, key: str) -> Any:
+        """Get a cached fact about this adb binary, or None if unknown or stale"""
+        entry = self.data.get("binaries", {}).get(adb_path)
+        if not entry or entry.get("fingerprint") != self._fingerprint(adb_path):
+            return None
+        return entry.get(key)
+
+    def set(self, adb_path: str, **facts):
+        """Store facts about this adb binary"""
+        fingerprint = self._fingerprint(adb_path)
+        if fingerprint is None:
+            return
+        binaries = self.data.setdefault("binaries", {})
+        entry = binaries.get(adb_path)
+        if not entry or entry.get("fingerprint") != fingerprint:
+            # Binary changed since the entry was written - start over
+            entry = binaries[adb_path] = {"fingerprint": fingerprint}
+        entry.update(facts)
+        self._save()
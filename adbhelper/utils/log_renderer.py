@@ -0,0 +1,172 @@
+"""Frame-based terminal output for live logs
+
+``console.print`` per line parses markup, wraps text and flushes the terminal
+for every line, which falls behind quickly on a busy device. LogRenderer
+queues lines without blocking the caller and writes them in frames: every
+``interval`` seconds everything queued is joined into one string and written
+with a single call. Log text is written as is (no markup or highlighting);
+only the optional per-line prefix is styled, with its escape codes rendered
+once.
+
+If the terminal still cannot keep up, the backlog is capped and the oldest
+lines are dropped; a status line reports how many were dropped and how far
+behind the output is.
+"""
+
+import collections
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from rich.console import Console
+from rich.text import Text
+
+# Seconds between frames (~30 fps)
+FRAME_INTERVAL = 0.033
+
+# Lines held for the next frame before the oldest are dropped
+MAX_BACKLOG = 20000
+
+# Show the status line once output is this many seconds behind
+LAG_WARNING = 0.5
+
+
+class LogRenderer:
+    """Batches log lines into frames written by a background thread"""
+
+    def __init__(self, console: Console, interval: float = FRAME_INTERVAL,
+                 max_backlog: int = MAX_BACKLOG, drop: bool = True):
+        """Initialize the renderer
+
+        Args:
+            console: Console whose file the frames are written to
+            interval: Seconds between frames
+            max_backlog: Lines kept between frames before the oldest are dropped
+            drop: Drop the oldest lines when the backlog is full; with False,
+                ``write`` waits for the next frame instead (for dumps, where
+                every line matters more than keeping up)
+        """
+        self.console = console
+        self.interval = interval
+        self.max_backlog = max_backlog
+        self.drop = drop
+        self.dropped = 0
+        self.lines = 0
+        self._pending = collections.deque(maxlen=max_backlog)
+        self._pending_since: Optional[float] = None
+        self._frame_dropped = 0
+        self._styles: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start writing frames in the background"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Write what is still queued and stop the background thread"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            with self._lock:
+                self._thread = None
+                # Writers waiting for space now go straight into the final frame
+                self._space.notify_all()
+        self._flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def write(self, line: str, prefix: str = "", prefix_style: str = ""):
+        """Queue a line for the next frame
+
+        Never blocks on the terminal, except to wait for space when ``drop`` is off.
+
+        Args:
+            line: Raw log text, written without markup processing
+            prefix: Text written before the line, e.g. a device name
+            prefix_style: Rich style for the prefix, e.g. "bold cyan"
+        """
+        with self._lock:
+            if not self.drop:
+                while len(self._pending) >= self.max_backlog and self._thread is not None:
+                    self._space.wait()
+            if len(self._pending) == self.max_backlog:
+                self._frame_dropped += 1
+            elif self._pending_since is None:
+                self._pending_since = time.monotonic()
+            self._pending.append((prefix, prefix_style, line))
+
+    def notice(self, text: str, style: str = "dim yellow"):
+        """Queue a styled status line, e.g. a report of lines lost upstream"""
+        with self._lock:
+            if len(self._pending) == self.max_backlog:
+                self._frame_dropped += 1
+            elif self._pending_since is None:
+                self._pending_since = time.monotonic()
+            # A None prefix marks a notice; its text is styled, not cached
+            self._pending.append((None, style, text))
+
+    def _render(self, text: str, style: str) -> str:
+        """Text wrapped in the escape codes for a style (none when not a terminal)"""
+        with self.console.capture() as capture:
+            self.console.print(Text(text, style=style), end="", soft_wrap=True)
+        return capture.get()
+
+    def _styled(self, text: str, style: str) -> str:
+        """Like _render, cached for prefixes that repeat on every line"""
+        key = (text, style)
+        rendered = self._styles.get(key)
+        if rendered is None:
+            rendered = self._styles[key] = self._render(text, style)
+        return rendered
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._flush()
+
+    def _flush(self):
+        """Write everything queued as one frame"""
+        with self._lock:
+            if not self._pending and not self._frame_dropped:
+                return
+            batch = self._pending
+            self._pending = collections.deque(maxlen=self.max_backlog)
+            dropped = self._frame_dropped
+            self._frame_dropped = 0
+            since = self._pending_since
+            self._pending_since = None
+            self._space.notify_all()
+
+        parts = []
+        for prefix, prefix_style, line in batch:
+            if prefix is None:
+                parts.append(self._render(line, prefix_style))
+                parts.append("\n")
+                continue
+            if prefix:
+                parts.append(self._styled(prefix, prefix_style))
+            parts.append(line)
+            parts.append("\n")
+        self.lines += len(batch)
+        self.dropped += dropped
+
+        lag = time.monotonic() - since if since is not None else 0.0
+        if dropped or lag > LAG_WARNING:
+            status = f"[display behind by {lag:.1f}s"
+            if dropped:
+                status += f", {dropped} lines dropped ({self.dropped} total)"
+            parts.append(self._render(status + "]", "dim yellow"))
+            parts.append("\n")
+
+        output = self.console.file
+        output.write("".join(parts))
+        output.flush()
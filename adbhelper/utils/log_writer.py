@@ -0,0 +1,273 @@
+"""Buffered log file writer with rotation and compression
+
+Saving a live log used to cost a write and a flush per line on the thread
+that reads the device. LogWriter takes lines without touching the disk and
+hands them to a writer thread, which writes them in large blocks, flushes on
+a timer and rotates the file by size or age. Finished parts are compressed
+on a separate thread so rotation never stalls writing. Closing the writer
+writes and flushes everything still buffered.
+"""
+
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+# Bytes buffered before the writer thread is woken early
+BUFFER_SIZE = 1024 * 1024
+
+# Buffered bytes at which write() waits for the writer thread to catch up
+MAX_PENDING = 16 * BUFFER_SIZE
+
+# Extra bytes per "\n" written by text-mode files ("\r\n" on Windows)
+_NEWLINE_EXTRA = len(os.linesep) - 1
+
+# Seconds between flushes while lines keep arriving
+FLUSH_INTERVAL = 1.0
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def parse_size(value: str) -> int:
+    """Parse a size such as "500K", "100M" or "2G" into bytes"""
+    value = value.strip().upper().rstrip("B")
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    try:
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid size: {value}")
+
+
+def parse_duration(value: str) -> float:
+    """Parse a duration such as "30s", "15m" or "1h" into seconds"""
+    value = value.strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    try:
+        if value and value[-1] in units:
+            return float(value[:-1]) * units[value[-1]]
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Invalid duration: {value}")
+
+
+def encoded_size(text: str) -> int:
+    """Bytes ``text`` takes in a UTF-8 text-mode file"""
+    size = len(text) if text.isascii() else len(text.encode("utf-8", "replace"))
+    if _NEWLINE_EXTRA:
+        size += text.count("\n") * _NEWLINE_EXTRA
+    return size
+
+
+def compress_file(path: Path, method: str) -> Path:
+    """Compress a finished log file next to itself and remove the original"""
+    target = path.with_name(path.name + COMPRESSION_SUFFIXES[method])
+    with open(path, "rb") as src:
+        if method == "gzip":
+            with gzip.open(target, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, BUFFER_SIZE)
+        else:
+            import zstandard
+            with open(target, "wb") as raw:
+                with zstandard.ZstdCompressor().stream_writer(raw) as dst:
+                    shutil.copyfileobj(src, dst, BUFFER_SIZE)
+    path.unlink()
+    return target
+
+
+class LogWriter:
+    """File-like log sink that writes on a background thread
+
+    ``write`` is safe to call from several threads and does not wait for the
+    disk unless the writer thread has fallen MAX_PENDING bytes behind.
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, max_age: Optional[float] = None,
+                 compress: Optional[str] = None, buffer_size: int = BUFFER_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING):
+        """Open the log file
+
+        Args:
+            path: File to write; rotated parts are numbered next to it
+                (``name.001.log``, ``name.002.log``, ...)
+            max_bytes: Start a new part once the current one reaches this size
+            max_age: Start a new part after this many seconds
+            compress: "gzip" or "zstd" to compress each part once it is finished
+            buffer_size: Buffered bytes that trigger a write before the next flush
+            flush_interval: Seconds between flushes
+            max_pending: Buffered bytes at which ``write`` waits for the writer thread
+        """
+        if compress is not None and compress not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression: {compress}")
+        if compress == "zstd":
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                raise ValueError("zstd compression needs the zstandard package (pip install zstandard)")
+
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, buffer_size)
+        self.parts: List[Path] = []
+
+        self._pending: List[str] = []
+        self._pending_size = 0
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._closing = False
+        self._error: Optional[BaseException] = None
+
+        self._part = 0
+        self._file = None
+        # Bytes in the current part (encoded, so non-ASCII logs rotate on time)
+        self._written = 0
+        self._opened_at = 0.0
+        self._open_part()
+
+        # Finished parts waiting for compression, as indexes into ``parts``
+        self._compress_queue: "queue.Queue[Optional[int]]" = queue.Queue()
+        self._compressor: Optional[threading.Thread] = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def name(self) -> str:
+        return str(self.path)
+
+    def _part_path(self) -> Path:
+        if self._part == 0:
+            return self.path
+        return self.path.with_name(f"{self.path.stem}.{self._part:03d}{self.path.suffix}")
+
+    def _open_part(self):
+        path = self._part_path()
+        self._file = open(path, "w", encoding="utf-8", errors="replace", buffering=self.buffer_size)
+        self.parts.append(path)
+        self._written = 0
+        self._opened_at = time.monotonic()
+
+    def _finish_part(self):
+        """Close the current part and queue it for compression if requested"""
+        self._file.close()
+        if self.compress:
+            if self._compressor is None:
+                self._compressor = threading.Thread(target=self._compress_parts, daemon=True)
+                self._compressor.start()
+            self._compress_queue.put(len(self.parts) - 1)
+
+    def _compress_parts(self):
+        """Compress finished parts off the writer thread, in order"""
+        while True:
+            index = self._compress_queue.get()
+            if index is None:
+                return
+            try:
+                self.parts[index] = compress_file(self.parts[index], self.compress)
+            except BaseException as e:
+                self._error = e
+
+    def _rotate_due(self) -> bool:
+        if self.max_bytes is not None and self._written >= self.max_bytes:
+            return True
+        if self.max_age is not None and time.monotonic() - self._opened_at >= self.max_age:
+            return True
+        return False
+
+    def write(self, text: str):
+        """Buffer text for the writer thread (text written after close is discarded)"""
+        if self._error is not None:
+            raise IOError(f"Log writer failed: {self._error}")
+        with self._lock:
+            if self._pending_size >= self.max_pending:
+                # The disk is far behind; wait rather than buffer without bound
+                self._wake.set()
+                while (self._pending_size >= self.max_pending and not self._closing
+                       and self._error is None and self._thread.is_alive()):
+                    self._drained.wait(self.flush_interval)
+            if self._closing:
+                # Late lines from readers that are still shutting down
+                return
+            self._pending.append(text)
+            self._pending_size += len(text)
+            full = self._pending_size >= self.buffer_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Ask the writer thread to write out what is buffered"""
+        self._wake.set()
+
+    def _drain(self):
+        """Write buffered text, rotating between blocks as needed"""
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+            self._pending_size = 0
+            self._drained.notify_all()
+        if not pending:
+            return
+        if self.max_bytes is None:
+            block = "".join(pending)
+            self._file.write(block)
+            self._written += encoded_size(block)
+            return
+        # Honour the size limit between lines rather than per block
+        for text in pending:
+            if self._rotate_due():
+                self._finish_part()
+                self._part += 1
+                self._open_part()
+            self._file.write(text)
+            self._written += encoded_size(text)
+
+    def _run(self):
+        try:
+            while True:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self._drain()
+                if self._closing:
+                    return
+                self._file.flush()
+                if self._rotate_due() and self._written:
+                    self._finish_part()
+                    self._part += 1
+                    self._open_part()
+        except BaseException as e:
+            self._error = e
+            with self._lock:
+                self._drained.notify_all()
+
+    def close(self):
+        """Write everything still buffered, then close (and compress) the file"""
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+            self._drained.notify_all()
+        self._wake.set()
+        self._thread.join()
+        # Anything left if the thread died, or written after its last drain
+        if self._error is None:
+            self._drain()
+        self._finish_part()
+        if self._compressor is not None:
+            self._compress_queue.put(None)
+            self._compressor.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,175 @@
+"""ADB server protocol against a local fake server
+
+The fake speaks just enough of the smart-socket protocol for ADBWrapper:
+hex-length framed requests, OKAY/FAIL replies, host:transport switching
+and shell v2 packets for a few scripted commands.
+"""
+
+import os
+import socket
+import threading
+
+import pytest
+
+from adbhelper.core.adb import ADBError, ADBWrapper
+from adbhelper.core.adb_socket import (
+    ADBServerClient, ADBServerCommandError, SHELL_HEADER, SHELL_ID_STDOUT, SHELL_ID_STDERR, SHELL_ID_EXIT,
+)
+
+SERIAL = "emulator-5554"
+DEVICES = f"{SERIAL}\tdevice product:sdk_gphone64 model:Pixel_6 device:emu64 transport_id:1\n"
+
+# Shell commands the fake device knows: command -> (stdout, stderr, exit code).
+# None drops the connection after the command was accepted.
+COMMANDS = {
+    "echo hi": (b"hi\n", b"", 0),
+    "ls /missing": (b"", b"ls: /missing: No such file or directory\n", 2),
+    "false": (b"", b"", 1),
+    "reboot": None,
+}
+
+
+def _recv_exactly(conn: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("client closed the connection")
+        data += chunk
+    return data
+
+
+class FakeADBServer:
+    """Serves host and device services on an ephemeral local port"""
+
+    def __init__(self):
+        self._sock = socket.socket()
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(8)
+        self.port = self._sock.getsockname()[1]
+        self.requests = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def close(self):
+        self._sock.close()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _read_request(self, conn: socket.socket) -> str:
+        length = int(_recv_exactly(conn, 4), 16)
+        request = _recv_exactly(conn, length).decode()
+        self.requests.append(request)
+        return request
+
+    @staticmethod
+    def _reply(conn: socket.socket, status: bytes, message: bytes):
+        conn.sendall(status + b"%04x" % len(message) + message)
+
+    def _handle(self, conn: socket.socket):
+        with conn:
+            try:
+                request = self._read_request(conn)
+                if request == "host:version":
+                    self._reply(conn, b"OKAY", b"0029")
+                elif request in ("host:devices", "host:devices-l"):
+                    self._reply(conn, b"OKAY", DEVICES.encode())
+                elif request.endswith(":features"):
+                    self._reply(conn, b"OKAY", b"shell_v2,cmd")
+                elif request.startswith("host:transport:"):
+                    serial = request[len("host:transport:"):]
+                    if serial != SERIAL:
+                        self._reply(conn, b"FAIL", f"device '{serial}' not found".encode())
+                        return
+                    conn.sendall(b"OKAY")
+                    self._device_service(conn, self._read_request(conn))
+                else:
+                    self._reply(conn, b"FAIL", f"unknown host service '{request}'".encode())
+            except (ConnectionError, OSError):
+                pass
+
+    def _device_service(self, conn: socket.socket, service: str):
+        if not service.startswith("shell,v2,raw:"):
+            self._reply(conn, b"FAIL", f"unsupported service '{service}'".encode())
+            return
+        conn.sendall(b"OKAY")
+        result = COMMANDS.get(service[len("shell,v2,raw:"):], (b"", b"sh: not found\n", 127))
+        if result is None:
+            return
+        stdout, stderr, code = result
+        for packet_id, data in ((SHELL_ID_STDOUT, stdout), (SHELL_ID_STDERR, stderr)):
+            if data:
+                conn.sendall(SHELL_HEADER.pack(packet_id, len(data)) + data)
+        conn.sendall(SHELL_HEADER.pack(SHELL_ID_EXIT, 1) + bytes([code]))
+
+
+@pytest.fixture
+def server():
+    fake = FakeADBServer()
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def adb(server, tmp_path, monkeypatch):
+    """An ADBWrapper talking to the fake server, with the adb binary fallback recorded"""
+    stub = tmp_path / "adb"
+    stub.write_text("#!/bin/sh\nexit 1\n")
+    stub.chmod(0o755)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setenv("ANDROID_ADB_SERVER_PORT", str(server.port))
+    monkeypatch.delenv("ANDROID_SERIAL", raising=False)
+    monkeypatch.delenv("ADBH_NO_SERVER", raising=False)
+    wrapper = ADBWrapper(persistent_shell=False)
+    wrapper.subprocess_calls = []
+    monkeypatch.setattr(wrapper, "_run_subprocess",
+                        lambda *args, **kwargs: wrapper.subprocess_calls.append(args) or ("", "", 0))
+    return wrapper
+
+
+def test_host_replies_are_length_framed(server):
+    client = ADBServerClient(port=server.port)
+    assert client.version() == 0x29
+    assert client.devices() == DEVICES
+    assert client.features(SERIAL) == {"shell_v2", "cmd"}
+
+
+def test_fail_reply_raises(server):
+    client = ADBServerClient(port=server.port)
+    with pytest.raises(ADBServerCommandError, match="device 'nope' not found"):
+        client.shell("echo hi", "nope")
+
+
+def test_fail_reply_reported_like_the_adb_binary(adb):
+    stdout, stderr, code = adb._run_command(["-s", "nope", "shell", "echo hi"])
+    assert (stdout, code) == ("", 1)
+    assert "device 'nope' not found" in stderr
+    assert not adb.subprocess_calls
+
+
+@pytest.mark.parametrize("command, expected", [
+    ("echo hi", ("hi\n", "", 0)),
+    ("ls /missing", ("", "ls: /missing: No such file or directory\n", 2)),
+    ("false", ("", "", 1)),
+])
+def test_shell_v2_exit_codes(adb, command, expected):
+    assert adb._run_command(["-s", SERIAL, "shell", command]) == expected
+    assert not adb.subprocess_calls
+
+
+def test_exec_out_reports_exit_code(adb):
+    assert adb._run_command(["exec-out", "false"], SERIAL) == ("", "", 1)
+    assert adb._run_command(["exec-out", "echo hi"], SERIAL) == ("hi\n", "", 0)
+
+
+def test_lost_connection_is_not_retried(adb, server):
+    with pytest.raises(ADBError, match="it may have run"):
+        adb._run_command(["shell", "reboot"], SERIAL)
+    assert not adb.subprocess_calls
+    assert server.requests.count("shell,v2,raw:reboot") == 1
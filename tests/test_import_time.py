@@ -0,0 +1,54 @@
+"""Import-time budget for the CLI entry point
+
+``adbh`` runs once per command, so every module imported at startup is paid
+on every invocation. Subcommand modules and rich must be imported lazily.
+"""
+
+import subprocess
+import sys
+
+# Cumulative microseconds allowed for ``import adbhelper.cli`` (click alone is ~40 ms)
+IMPORT_BUDGET_US = 150_000
+
+# Modules that must not be imported until a command needs them
+LAZY_PREFIXES = ("adbhelper.commands", "adbhelper.core", "adbhelper.features", "rich")
+
+RUNS = 3
+
+
+def _import_times():
+    """Run ``python -X importtime -c "import adbhelper.cli"`` and parse its report
+
+    Returns a dict of module name to cumulative import time in microseconds.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import adbhelper.cli"],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            # Header line
+            continue
+        times[fields[2].strip()] = int(fields[1])
+    return times
+
+
+def test_cli_import_within_budget():
+    # Best of a few runs; the first also warms the bytecode cache
+    cumulative = min(_import_times()["adbhelper.cli"] for _ in range(RUNS))
+    assert cumulative <= IMPORT_BUDGET_US, (
+        f"import adbhelper.cli took {cumulative / 1000:.1f} ms, "
+        f"budget is {IMPORT_BUDGET_US / 1000:.0f} ms"
+    )
+
+
+def test_cli_import_is_lazy():
+    eager = sorted(
+        name for name in _import_times()
+        if any(name == prefix or name.startswith(prefix + ".") for prefix in LAZY_PREFIXES)
+    )
+    assert not eager, f"imported eagerly by adbhelper.cli: {', '.join(eager)}"